@@ -0,0 +1,131 @@
+"""Latency of ogdch_autosuggest while a query is typed, one request per
+keystroke. Solr is replaced by a suggester over 2000 terms that takes at least
+5 ms to answer, so that the numbers show how many requests reach Solr.
+
+pytest --ckan-ini=test.ini -s benchmarks/bench_autosuggest.py
+"""
+
+import random
+import time
+from unittest.mock import MagicMock, patch
+
+import ckan.plugins.toolkit as tk
+import pytest
+from timing import measure, percentile, report
+
+import ckanext.switzerland.helpers.suggest_utils as ogdch_suggest_utils
+
+TERM_COUNT = 2000
+WORD_COUNT = 400
+SOLR_LATENCY = 0.005
+SYLLABLES = [
+    "ba",
+    "ber",
+    "dor",
+    "ge",
+    "lä",
+    "mein",
+    "na",
+    "rich",
+    "see",
+    "tal",
+    "wa",
+    "zü",
+]
+
+
+def _words(rnd):
+    words = set()
+    while len(words) < WORD_COUNT:
+        syllables = rnd.sample(SYLLABLES, rnd.randint(2, 4))
+        words.add("".join(syllables).capitalize())
+    return sorted(words)
+
+
+def _corpus():
+    """Return the suggested terms and queries that are typed, made up of two
+    words of the terms.
+    """
+    rnd = random.Random(17)
+    words = _words(rnd)
+    terms = [
+        " ".join(rnd.sample(words, rnd.randint(1, 4))) + f" {i}"
+        for i in range(TERM_COUNT)
+    ]
+    queries = [" ".join(rnd.sample(words, 2)).lower() for _ in range(20)]
+    return terms, queries
+
+
+class _StubSuggester:
+    """Answers like the BlendedInfix suggester, after at least SOLR_LATENCY
+    seconds.
+    """
+
+    def __init__(self, terms):
+        self.terms = terms
+        self.requests = 0
+
+    def search(self, q, search_handler, **kwargs):
+        self.requests += 1
+        start = time.perf_counter()
+        lang = search_handler.rsplit("_", 1)[1]
+        query = kwargs["suggest.q"]
+        normalized_q = ogdch_suggest_utils.normalize_query(query)
+        terms = [
+            term
+            for term in self.terms
+            if ogdch_suggest_utils.matches_query(term, normalized_q)
+        ][: kwargs["suggest.count"]]
+        time.sleep(max(0, SOLR_LATENCY - (time.perf_counter() - start)))
+
+        response = MagicMock()
+        response.raw_response = {
+            "suggest": {
+                f"ckanSuggester_{lang}": {
+                    query: {
+                        "numFound": len(terms),
+                        "suggestions": [{"term": term} for term in terms],
+                    }
+                }
+            }
+        }
+        return response
+
+
+def _type_queries(queries):
+    durations = []
+    for query in queries:
+        for end in range(1, len(query) + 1):
+            durations.extend(
+                measure(
+                    lambda: tk.get_action("ogdch_autosuggest")(
+                        {}, {"q": query[:end], "lang": "de"}
+                    ),
+                    repeat=1,
+                )
+            )
+    return durations
+
+
+@pytest.mark.ckan_config("ckan.plugins", "ogdch")
+@pytest.mark.usefixtures("with_plugins")
+def test_autosuggest_latency():
+    terms, queries = _corpus()
+    suggester = _StubSuggester(terms)
+
+    with patch(
+        "ckanext.switzerland.helpers.solr_utils.get_connection",
+        return_value=suggester,
+    ), patch.dict(tk.config, {"ckanext.switzerland.cache_backend": "memory"}):
+        for name, ttl in [("without cache", 0), ("with cache", 300)]:
+            with patch.dict(
+                tk.config, {"ckanext.switzerland.autosuggest_cache_ttl": ttl}
+            ):
+                ogdch_suggest_utils.get_suggestion_cache("de").clear()
+                suggester.requests = 0
+                durations = _type_queries(queries)
+
+            report(f"ogdch_autosuggest {name}", durations, unit="keystroke")
+            print(f"  p50: {percentile(durations, 50) * 1000:.2f} ms")
+            print(f"  p99: {percentile(durations, 99) * 1000:.2f} ms")
+            print(f"  requests to Solr: {suggester.requests}")
@@ -0,0 +1,63 @@
+"""Latency of ogdch_counts without cache, compared to computing the same
+numbers with group_list, package_search and organization_list.
+
+Needs a database and Solr:
+
+pytest --ckan-ini=test.ini -s benchmarks/bench_counts.py
+"""
+
+from copy import copy
+
+import ckan.plugins.toolkit as tk
+import pytest
+from timing import measure, percentile, report
+
+from ckanext.switzerland.tests.conftest import (  # noqa: F401
+    dataset_dict,
+    get_context,
+    groups,
+    org,
+)
+
+DATASET_COUNT = 200
+
+
+def _previous_counts():
+    req_context = {"user": get_context()["user"]}
+    groups = tk.get_action("group_list")(req_context, {"all_fields": True})
+
+    def dataset_count(dataset_type):
+        fq = f"+dataset_type:{dataset_type}"
+        return tk.get_action("package_search")(req_context, {"fq": fq})["count"]
+
+    return {
+        "total_dataset_count": dataset_count("dataset"),
+        "showcase_count": dataset_count("showcase"),
+        "groups": {group["name"]: group["package_count"] for group in groups},
+        "organization_count": len(tk.get_action("organization_list")(req_context, {})),
+    }
+
+
+@pytest.mark.ckan_config(
+    "ckan.plugins",
+    "ogdch ogdch_pkg ogdch_group ogdch_org scheming_datasets fluent",
+)
+@pytest.mark.ckan_config("ckanext.switzerland.counts_cache_ttl", 0)
+@pytest.mark.usefixtures("with_plugins", "clean_db", "clean_index")
+def test_ogdch_counts_latency(org, groups):
+    for i in range(DATASET_COUNT):
+        data = copy(dataset_dict)
+        data["name"] = f"dataset-{i}"
+        data["identifier"] = f"dataset-{i}@test-org"
+        data["groups"] = [{"name": groups[i % len(groups)]["name"]}]
+        tk.get_action("package_create")(get_context(), data)
+
+    assert tk.get_action("ogdch_counts")({}, {}) == _previous_counts()
+
+    for name, func in [
+        ("group_list + package_search + organization_list", _previous_counts),
+        ("ogdch_counts", lambda: tk.get_action("ogdch_counts")({}, {})),
+    ]:
+        durations = measure(func, repeat=50)
+        report(name, durations)
+        print(f"  p95: {percentile(durations, 95) * 1000:.1f} ms")
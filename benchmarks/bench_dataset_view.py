@@ -0,0 +1,84 @@
+"""Cost of parsing and localizing a dataset with 200 resources in
+before_dataset_view, compared to parsing and localizing every value.
+
+pytest --ckan-ini=test.ini -s benchmarks/bench_dataset_view.py
+"""
+
+import copy
+import json
+
+import pytest
+from corpus import make_dataset, multilingual
+from timing import measure, report
+
+import ckanext.switzerland.helpers.localize_utils as ogdch_loc_utils
+import ckanext.switzerland.helpers.schema_utils as ogdch_schema_utils
+
+RESOURCE_COUNT = 200
+REPEAT = 200
+
+
+def _dataset():
+    """A dataset as it is passed to before_dataset_view: the groups come
+    straight from the database, with their titles as json strings.
+    """
+    dataset = make_dataset(0, resource_count=RESOURCE_COUNT)
+    dataset["groups"] = [
+        {
+            "name": name,
+            "title": json.dumps(multilingual(name)),
+            "display_name": json.dumps(multilingual(name)),
+            "description": json.dumps(multilingual(name)),
+        }
+        for name in ["agriculture", "energy", "territory"]
+    ]
+    return dataset
+
+
+def _previous_localization(pkg_dict, lang_code):
+    pkg_dict = ogdch_loc_utils.parse_json_attributes(ckan_dict=pkg_dict)
+    pkg_dict = ogdch_loc_utils.localize_ckan_sub_dict(pkg_dict, lang_code)
+    pkg_dict["resources"] = [
+        ogdch_loc_utils.localize_ckan_sub_dict(resource, lang_code)
+        for resource in pkg_dict["resources"]
+    ]
+    pkg_dict["groups"] = [
+        ogdch_loc_utils.localize_ckan_sub_dict(group, lang_code)
+        for group in pkg_dict["groups"]
+    ]
+    pkg_dict["organization"] = ogdch_loc_utils.localize_ckan_sub_dict(
+        pkg_dict["organization"], lang_code
+    )
+    return pkg_dict
+
+
+@pytest.mark.ckan_config(
+    "ckan.plugins",
+    "ogdch ogdch_pkg scheming_datasets scheming_groups scheming_organizations "
+    "fluent",
+)
+@pytest.mark.usefixtures("with_plugins")
+def test_localize_dataset_with_200_resources():
+    dataset = _dataset()
+    localizer = ogdch_schema_utils.get_dataset_localizer("dataset")
+    # the copies are made up front, so that only the localization is measured
+    copies = [copy.deepcopy(dataset) for _ in range(REPEAT * 5)]
+
+    assert _previous_localization(copy.deepcopy(dataset), "fr") == localizer.localize(
+        localizer.parse(copy.deepcopy(dataset)), "fr"
+    )
+
+    for name, localize in [
+        ("parse and localize every value", _previous_localization),
+        (
+            "DatasetLocalizer",
+            lambda pkg_dict, lang: localizer.localize(localizer.parse(pkg_dict), lang),
+        ),
+    ]:
+        pkg_dicts = iter(list(copies))
+
+        def run():
+            for _ in range(REPEAT):
+                localize(next(pkg_dicts), "fr")
+
+        report(name, measure(run), unit_count=REPEAT, unit="dataset")
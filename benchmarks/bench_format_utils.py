@@ -0,0 +1,109 @@
+"""Per-resource cost of resolving formats and media types.
+
+pytest --ckan-ini=test.ini -s benchmarks/bench_format_utils.py
+"""
+
+import os
+import random
+from urllib.parse import urlparse
+
+from corpus import make_resource
+from timing import measure, report
+
+import ckanext.switzerland.helpers.format_utils as ogdch_format_utils
+
+RESOURCE_COUNT = 10000
+
+
+def _resources():
+    rnd = random.Random(0)
+    return [make_resource(i, rnd) for i in range(RESOURCE_COUNT)]
+
+
+def _uncached_resolver():
+    return ogdch_format_utils.FormatResolver(
+        ogdch_format_utils.format_mapping,
+        ogdch_format_utils.media_type_mapping,
+        cache_size=0,
+    )
+
+
+def _list_based_map_to_valid_format(format, try_to_clean=False):
+    if format in list(ogdch_format_utils.format_mapping.keys()):
+        return format
+    if format in list(ogdch_format_utils.reverse_format_mapping.keys()):
+        return ogdch_format_utils.reverse_format_mapping[format]
+    if try_to_clean:
+        cleaned = ogdch_format_utils._get_cleaned_format_or_media_type(format)
+        if cleaned in list(ogdch_format_utils.reverse_format_mapping.keys()):
+            return ogdch_format_utils.reverse_format_mapping[cleaned]
+    return ""
+
+
+def _list_based_get_resource_format(media_type, format, download_url):
+    """The lookup as it was before FormatResolver: every membership test
+    builds a list of all keys of the mapping."""
+    if media_type:
+        cleaned = ogdch_format_utils._get_cleaned_format_or_media_type(media_type)
+        result = _list_based_map_to_valid_format(cleaned)
+        if result:
+            return result
+    if format:
+        result = _list_based_map_to_valid_format(format, try_to_clean=True)
+        if result:
+            return result
+    if download_url:
+        ext = os.path.splitext(urlparse(download_url).path)[1]
+        result = (
+            _list_based_map_to_valid_format(ext.replace(".", "").lower()) if ext else ""
+        )
+        if result:
+            return result
+        return cleaned if media_type else ""
+    return "SERVICE"
+
+
+def _run(get_resource_format, resources):
+    def run():
+        for r in resources:
+            get_resource_format(r["media_type"], r["format"], r["download_url"])
+
+    return run
+
+
+def test_get_resource_format_per_resource():
+    resources = _resources()
+
+    report(
+        "get_resource_format, list lookups",
+        measure(_run(_list_based_get_resource_format, resources)),
+        unit_count=RESOURCE_COUNT,
+        unit="resource",
+    )
+    report(
+        "get_resource_format, FormatResolver without cache",
+        measure(_run(_uncached_resolver().get_resource_format, resources)),
+        unit_count=RESOURCE_COUNT,
+        unit="resource",
+    )
+    report(
+        "get_resource_format, FormatResolver with cache",
+        measure(_run(ogdch_format_utils.get_resource_format, resources)),
+        unit_count=RESOURCE_COUNT,
+        unit="resource",
+    )
+
+
+def test_prepare_resource_format_per_resource():
+    resources = _resources()
+
+    def run():
+        for resource in resources:
+            ogdch_format_utils.prepare_resource_format(dict(resource))
+
+    report(
+        "prepare_resource_format",
+        measure(run),
+        unit_count=RESOURCE_COUNT,
+        unit="resource",
+    )
@@ -0,0 +1,74 @@
+"""Highlighting the query in batches of 10 suggestions, as returned by
+ogdch_autosuggest for one keystroke. Queries are typed one character at a
+time, and mostly get the same suggestions on the following keystrokes.
+
+pytest --ckan-ini=test.ini -s benchmarks/bench_highlight.py
+"""
+
+import random
+import re
+
+from timing import measure, report
+from unidecode import unidecode
+
+import ckanext.switzerland.helpers.suggest_utils as ogdch_suggest_utils
+
+QUERY_COUNT = 100
+BATCH_SIZE = 10
+WORDS = [
+    "Bevölkerung",
+    "Gemeinde",
+    "Gewässer",
+    "Luftqualität",
+    "Straßenverkehr",
+    "Wald",
+    "Zürich",
+    "données",
+    "qualité",
+    "Open",
+    "Data",
+]
+
+
+def _batches():
+    rnd = random.Random(19)
+    batches = []
+    for _ in range(QUERY_COUNT):
+        query = " ".join(rnd.sample(WORDS, 2)).lower()
+        terms = [
+            " ".join(rnd.sample(WORDS, rnd.randint(2, 5))) for _ in range(BATCH_SIZE)
+        ]
+        batches.extend((query[:end], terms) for end in range(1, len(query) + 1))
+    return batches
+
+
+def _previous_highlight(term, q):
+    if "<b>" in term:
+        return term
+    clean_q = unidecode(q)
+    clean_term = unidecode(term)
+
+    re_q = re.escape(clean_q)
+    m = re.search(re_q, clean_term, re.I)
+    if m:
+        replace_text = term[m.start() : m.end()]
+        term = term.replace(replace_text, f"<b>{replace_text}</b>")
+    return term
+
+
+def test_highlight_batches():
+    batches = _batches()
+
+    def previous():
+        for q, terms in batches:
+            [_previous_highlight(term, q) for term in terms]
+
+    def highlighter():
+        for q, terms in batches:
+            highlighter = ogdch_suggest_utils.Highlighter(q)
+            [highlighter.highlight(term) for term in terms]
+
+    for name, func in [("previous highlight", previous), ("Highlighter", highlighter)]:
+        report(
+            name, measure(func, repeat=10), unit_count=len(batches), unit="keystroke"
+        )
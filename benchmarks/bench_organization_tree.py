@@ -0,0 +1,91 @@
+"""Rendering the tree of all organizations on the organization index page,
+for a hierarchy of 800 organizations on three levels.
+
+pytest --ckan-ini=test.ini -s benchmarks/bench_organization_tree.py
+"""
+
+import copy
+import json
+from unittest.mock import patch
+
+import ckan.plugins.toolkit as tk
+from corpus import multilingual
+from timing import measure, report
+
+import ckanext.switzerland.helpers.frontend_helpers as ogdch_frontend_helpers
+
+# 8 organizations with 9 children each, which have 10 children each
+LEVELS = [8, 9, 10]
+
+
+def _organization_tree(levels=LEVELS, prefix="org"):
+    if not levels:
+        return []
+    return [
+        {
+            "id": f"{prefix}-{i}",
+            "name": f"{prefix}-{i}",
+            "title": json.dumps(multilingual(f"Organisation {prefix}-{i}")),
+            "children": _organization_tree(levels[1:], f"{prefix}-{i}"),
+        }
+        for i in range(levels[0])
+    ]
+
+
+def _count(nodes):
+    return sum(1 + _count(node["children"]) for node in nodes)
+
+
+def _previous_render_tree():
+    """Rendering as it was before the tree was cached: the titles are
+    localized and sorted on every call, and the html is concatenated.
+    """
+
+    def render_node(node):
+        html = '<div class="organization-row">'
+        html += f"<a href=\"/{lang}/organization/{node['name']}\">{node['title']}</a>"
+        html += "</div>"
+        if node["children"]:
+            html += "<ul>"
+            for child in node["children"]:
+                html += render_node(child)
+            html += "</ul>"
+        return f"<li id=\"node_{node['name']}\" class=\"organization\">{html}</li>"
+
+    lang = "fr"
+    html = '<ul id="organizations-list">'
+    for node in ogdch_frontend_helpers.ogdch_group_tree():
+        html += render_node(node)
+    return f"{html}</ul>"
+
+
+def test_render_organization_tree():
+    tree = _organization_tree()
+    assert _count(tree) == 800
+
+    def group_tree(context, data_dict):
+        return copy.deepcopy(tree)
+
+    with patch("ckan.plugins.toolkit.get_action", return_value=group_tree), patch(
+        "ckan.lib.i18n.get_lang", return_value="fr"
+    ), patch.dict(
+        tk.config,
+        {
+            "ckanext.switzerland.cache_backend": "memory",
+            "ckanext.switzerland.organization_tree_cache_ttl": 3600,
+        },
+    ):
+        ogdch_frontend_helpers.invalidate_organization_tree_cache()
+        assert ogdch_frontend_helpers.ogdch_render_tree() == _previous_render_tree()
+
+        report("previous rendering", measure(_previous_render_tree, repeat=20))
+
+        def render_uncached():
+            ogdch_frontend_helpers.invalidate_organization_tree_cache()
+            ogdch_frontend_helpers.ogdch_render_tree()
+
+        report("ogdch_render_tree, cache miss", measure(render_uncached, repeat=20))
+        report(
+            "ogdch_render_tree, cache hit",
+            measure(ogdch_frontend_helpers.ogdch_render_tree, repeat=20),
+        )
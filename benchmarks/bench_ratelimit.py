@@ -0,0 +1,103 @@
+"""Cost of the rate limit of ogdch_showcase_submit while it is spammed, compared
+to the list-based rate limit it replaced. Creating the showcases is stubbed,
+so that the numbers show the cost of the rate limit.
+
+pytest --ckan-ini=test.ini -s benchmarks/bench_ratelimit.py
+"""
+
+import functools
+import random
+from datetime import datetime, timedelta
+from unittest.mock import MagicMock, patch
+
+import ckan.plugins.toolkit as tk
+import pytest
+from ckan.lib.redis import connect_to_redis
+from redis.exceptions import RedisError
+from timing import measure, percentile, report
+
+import ckanext.switzerland.helpers.ratelimit_utils as ogdch_ratelimit_utils
+from ckanext.switzerland import logic as ogdch_logic
+
+CALL_COUNT = 20000
+EMAIL_COUNT = 500
+
+
+def _previous_ratelimit(func):
+    """The rate limit before it used ratelimit_utils, with the default limits."""
+    limit_timedelta = timedelta(seconds=300)
+    limit_call_count = 2
+    api_calls_per_time_and_email = []
+
+    @functools.wraps(func)
+    def inner(context, data_dict):
+        author_email = data_dict.get("author_email")
+        now = datetime.now()
+        api_calls_per_time_and_email.append((author_email, now))
+        for m, t in api_calls_per_time_and_email:
+            if t + limit_timedelta < now:
+                api_calls_per_time_and_email.remove((m, t))
+        count = len([m for m, _ in api_calls_per_time_and_email if m == author_email])
+        if count > limit_call_count:
+            context["ratelimit_exceeded"] = True
+            context["limit_call_count"] = limit_call_count
+            context["limit_timedelta"] = limit_timedelta
+            context["ratelimit_key"] = author_email
+        return func(context, data_dict)
+
+    return inner
+
+
+def _submit(submit, email):
+    try:
+        submit({}, {"author_email": email, "title": "Spam"})
+    except tk.ValidationError:
+        pass
+
+
+def _spam(submit):
+    rnd = random.Random(3)
+    emails = [f"spammer{i}@example.org" for i in range(EMAIL_COUNT)]
+    durations = []
+    for _ in range(CALL_COUNT):
+        email = rnd.choice(emails)
+        durations.extend(measure(lambda: _submit(submit, email), repeat=1))
+    return durations
+
+
+def _redis_available():
+    try:
+        return connect_to_redis().ping()
+    except RedisError:
+        return False
+
+
+@pytest.mark.ckan_config("ckan.plugins", "ogdch")
+@pytest.mark.usefixtures("with_plugins")
+def test_showcase_submit_under_spam():
+    submits = [
+        (
+            "list-based rate limit",
+            _previous_ratelimit(ogdch_logic.ogdch_showcase_submit.__wrapped__),
+            None,
+        ),
+        ("memory backend", ogdch_logic.ogdch_showcase_submit, "memory"),
+    ]
+    if _redis_available():
+        submits.append(("redis backend", ogdch_logic.ogdch_showcase_submit, "redis"))
+
+    with patch.object(ogdch_logic.tk, "get_action", return_value=MagicMock()):
+        for name, submit, backend in submits:
+            with patch.dict(
+                tk.config, {"ckanext.switzerland.api_limit_backend": backend}
+            ):
+                ogdch_ratelimit_utils.get_rate_limiter(
+                    "ogdch_showcase_submit", 2, 300
+                ).clear()
+                durations = _spam(submit)
+
+            report(f"ogdch_showcase_submit, {name}", durations)
+            print(f"  p50: {percentile(durations, 50) * 1e6:.1f} us")
+            print(f"  p99: {percentile(durations, 99) * 1e6:.1f} us")
+            last = durations[-1000:]
+            print(f"  p50 of the last 1000 calls: {percentile(last, 50) * 1e6:.1f} us")
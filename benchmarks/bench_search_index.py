@@ -0,0 +1,29 @@
+"""Throughput of ogdch_prepare_search_data_for_index for a synthetic corpus.
+
+pytest --ckan-ini=test.ini -s benchmarks/bench_search_index.py
+"""
+
+from corpus import make_search_data
+from timing import measure, report
+
+import ckanext.switzerland.helpers.plugin_utils as ogdch_plugin_utils
+
+DATASET_COUNT = 1000
+RESOURCES_PER_DATASET = 8
+
+
+def test_prepare_search_data_for_index_throughput():
+    corpus = [make_search_data(i, RESOURCES_PER_DATASET) for i in range(DATASET_COUNT)]
+
+    def run():
+        # before_dataset_index mutates search_data, so work on fresh copies.
+        batch = (dict(search_data) for search_data in corpus)
+        for _ in ogdch_plugin_utils.ogdch_prepare_search_data_for_index_batch(batch):
+            pass
+
+    report(
+        f"prepare_search_data_for_index ({RESOURCES_PER_DATASET} resources)",
+        measure(run, repeat=3),
+        unit_count=DATASET_COUNT,
+        unit="dataset",
+    )
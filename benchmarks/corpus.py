@@ -0,0 +1,83 @@
+"""Synthetic datasets for benchmarks."""
+
+import json
+import random
+
+FORMATS = [
+    ("CSV", "text/csv", "http://download.url/data.csv"),
+    ("XLSX", None, "http://download.url/data.xlsx"),
+    (None, "application/json", "http://download.url/data.json"),
+    ("RDF Turtle", "text/turtle", "http://download.url/data.ttl"),
+    ("SPARQL", None, None),
+    ("pc-axis file", None, "http://download.url/Download.aspx?file=px-x-01"),
+    (None, None, "http://download.url/unknown"),
+]
+LICENSES = [
+    "https://opendata.swiss/terms-of-use#terms_open",
+    "https://opendata.swiss/terms-of-use#terms_by",
+    "https://opendata.swiss/terms-of-use#terms_by_ask",
+    None,
+]
+
+
+def multilingual(text):
+    return {lang: f"{text} ({lang.upper()})" for lang in ["de", "fr", "it", "en"]}
+
+
+def make_resource(index, rnd):
+    format, media_type, download_url = rnd.choice(FORMATS)
+    return {
+        "id": f"resource-{index}",
+        "title": multilingual(f"Resource {index}"),
+        "description": multilingual(f"Description of resource {index}"),
+        "format": format,
+        "media_type": media_type,
+        "download_url": download_url,
+        "url": "http://download.url",
+        "license": rnd.choice(LICENSES),
+        "issued": f"20{rnd.randint(10, 24)}-01-01T00:00:00",
+        "modified": f"20{rnd.randint(10, 24)}-06-30T12:00:00",
+        "documentation": [],
+    }
+
+
+def make_dataset(index, resource_count=8, seed=None):
+    rnd = random.Random(seed if seed is not None else index)
+    return {
+        "id": f"dataset-id-{index}",
+        "name": f"dataset-{index}",
+        "type": "dataset",
+        "identifier": f"dataset-{index}@test-org",
+        "title": multilingual(f"Dataset {index}"),
+        "description": multilingual(f"Description of dataset {index}"),
+        "keywords": {
+            "de": ["umwelt", "wald"],
+            "fr": ["environnement", "foret"],
+            "it": ["ambiente"],
+            "en": ["environment"],
+        },
+        "organization": {
+            "name": "test-org",
+            "title": multilingual("Test Org"),
+            "political_level": "confederation",
+        },
+        "groups": [
+            {"name": "agriculture", "display_name": multilingual("Agriculture")}
+        ],
+        "publisher": json.dumps({"name": "Publisher", "url": "http://publisher"}),
+        "see_alsos": [],
+        "resources": [make_resource(i, rnd) for i in range(resource_count)],
+    }
+
+
+def make_search_data(index, resource_count=8):
+    """Return a search_data dict as passed to before_dataset_index."""
+    dataset = make_dataset(index, resource_count)
+    return {
+        "name": dataset["name"],
+        "type": "dataset",
+        "metadata_created": "2020-01-01T00:00:00",
+        "metadata_modified": "2024-01-01T00:00:00",
+        "modified": "2024-01-01T00:00:00",
+        "validated_data_dict": json.dumps(dataset),
+    }
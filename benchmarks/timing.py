@@ -0,0 +1,29 @@
+"""Small timing helpers shared by the benchmarks."""
+
+import statistics
+import time
+
+
+def measure(func, repeat=5):
+    """Call func repeat times and return the durations in seconds."""
+    durations = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        durations.append(time.perf_counter() - start)
+    return durations
+
+
+def percentile(durations, percent):
+    ordered = sorted(durations)
+    index = min(len(ordered) - 1, int(round(percent / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def report(name, durations, unit_count=1, unit="call"):
+    """Print the median time per unit and the throughput."""
+    median = statistics.median(durations)
+    print(
+        f"\n{name}: {median / unit_count * 1e6:.1f} us/{unit}, "
+        f"{unit_count / median:.0f} {unit}s/s (median of {len(durations)} runs)"
+    )
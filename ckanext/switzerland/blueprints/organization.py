@@ -33,13 +33,43 @@ def xml_upload(name):
             "data": dict(request.files),
             "organization": org["id"],
         }
-        get_action("ogdch_xml_upload")({}, data_dict)
+        try:
+            result = get_action("ogdch_xml_upload")({}, data_dict)
+        except ValidationError as e:
+            h.flash_error(" ".join(e.error_summary.values()))
+        else:
+            return redirect_to(
+                "ogdch_organization.xml_import", name=name, job_id=result["job_id"]
+            )
     else:
         h.flash_error("Error uploading file: no data received.")
 
     return redirect_to("organization.read", id=name)
 
 
+def xml_import(name, job_id):
+    """Show the progress of an import of datasets from an xml file, and the
+    result for every dataset once it has finished.
+    """
+    context: Context = {"user": current_user.name}
+    try:
+        group_dict = get_action("organization_show")(context, {"id": name})
+        import_status = get_action("ogdch_xml_import_status")(context, {"id": job_id})
+    except NotFound:
+        base.abort(404, _("Import not found"))
+    except NotAuthorized:
+        base.abort(403, _("Not authorized to see this page"))
+
+    return base.render(
+        "organization/xml_import.html",
+        {
+            "group_dict": group_dict,
+            "group_type": "organization",
+            "import_status": import_status,
+        },
+    )
+
+
 def index() -> str:
     """Copied from ckan.views.group.index to remove pagination on the organization
     index page, as it doesn't work well with the ckanext-hierarchy display.
@@ -111,4 +141,5 @@ def index() -> str:
 
 
 org.add_url_rule("/xml_upload/<name>", view_func=xml_upload, methods=["POST"])
+org.add_url_rule("/xml_import/<name>/<job_id>", view_func=xml_import)
 org.add_url_rule("/", view_func=index, strict_slashes=False)
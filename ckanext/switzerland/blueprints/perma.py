@@ -1,12 +1,12 @@
 import logging
 
-import ckan.logic as logic
-from ckan.plugins.toolkit import _, abort, get_action, redirect_to
+from ckan.plugins.toolkit import _, abort, config, redirect_to, request
 from flask import Blueprint
 
-log = logging.getLogger(__name__)
+import ckanext.switzerland.helpers.identifier_utils as ogdch_identifier_utils
+from ckanext.switzerland.middleware import CACHE_MAX_AGE_KEY
 
-NotFound = logic.NotFound
+log = logging.getLogger(__name__)
 
 perma = Blueprint("perma", __name__, url_prefix="/perma")
 
@@ -14,16 +14,18 @@ perma = Blueprint("perma", __name__, url_prefix="/perma")
 def read(id):
     """
     This action redirects requests to /perma/{identifier} to
-    the corresponding /dataset/{slug} route
+    the corresponding /dataset/{slug} route.
+
+    Only the name of the dataset is looked up, and the redirect may be cached
+    by clients for ckanext.switzerland.perma_max_age seconds.
     """
-    try:
-        dataset = get_action("ogdch_dataset_by_identifier")(
-            {"for_view": True}, {"identifier": id}
-        )
-        # redirect to dataset detail page
-        return redirect_to("dataset.read", id=dataset["name"])
-    except NotFound:
+    name = ogdch_identifier_utils.get_dataset_name(id)
+    if name is None:
         abort(404, _("Dataset not found"))
 
+    request.environ[CACHE_MAX_AGE_KEY] = config.get("ckanext.switzerland.perma_max_age")
+    # redirect to dataset detail page
+    return redirect_to("dataset.read", id=name)
+
 
 perma.add_url_rule("/<id>", view_func=read)
@@ -2,19 +2,38 @@ import ckan.lib.base as base
 from ckan.plugins.toolkit import get_action
 from flask import Blueprint
 
+import ckanext.switzerland.helpers.frontend_helpers as ogdch_frontend_helpers
+
 user = Blueprint("ogdch_user", __name__, url_prefix="/user")
 
 
+def _add_capacities(organization_tree, capacities):
+    """Add the capacity of the user to each organization of the tree. Parent
+    organizations that the user is not a member of have no capacity.
+    """
+    for organization in organization_tree:
+        organization["capacity"] = capacities.get(organization["name"])
+        _add_capacities(organization["children"], capacities)
+
+
 def list_for_user(id):
     user_dict = get_action("user_show")({}, {"id": id, "include_num_followers": True})
 
     organizations_available = get_action("organization_list_for_user")(
         {"user": user_dict.get("id")}, {"permission": "read"}
     )
+    organization_tree = ogdch_frontend_helpers.ogdch_group_tree_selective(
+        organizations_available
+    )
+    _add_capacities(
+        organization_tree,
+        {org["name"]: org.get("capacity") for org in organizations_available},
+    )
 
     extra_vars = {
         "user_dict": user_dict,
         "organizations_available": organizations_available,
+        "organization_tree": organization_tree,
     }
 
     return base.render("user/organizations.html", extra_vars=extra_vars)
@@ -0,0 +1,239 @@
+"""Command line interface of the ogdch plugin"""
+
+import logging
+import multiprocessing
+import time
+
+import ckan.lib.search.index as search_index
+import ckan.model as model
+import ckan.plugins.toolkit as tk
+import click
+from ckan.lib.search import commit, query_for
+
+import ckanext.switzerland.helpers.identifier_utils as ogdch_identifier_utils
+import ckanext.switzerland.helpers.solr_utils as ogdch_solr_utils
+
+log = logging.getLogger(__name__)
+
+DEFAULT_BATCH_SIZE = 100
+DEFAULT_COMMIT_INTERVAL = 10000
+DEFAULT_SHARD_SIZE = 500
+
+
+def _init_worker(batch_size):
+    """Prepare a (forked) worker process for indexing. Connections to the
+    database must not be shared with the parent process, and every worker
+    gets its own batching Solr connection.
+    """
+    model.Session.remove()
+    model.meta.engine.dispose(close=False)
+    search_index.make_connection = ogdch_solr_utils.BatchingSolrConnection(batch_size)
+
+
+def _index_shard(package_ids):
+    """Index a shard of datasets and return the number of datasets that were
+    sent to Solr, and the ids of the datasets that could not be indexed.
+    """
+    connection = search_index.make_connection
+    package_index = search_index.PackageSearchIndex()
+    context = {"ignore_auth": True, "validate": False, "use_cache": False}
+    failed = []
+    indexed = 0
+
+    for package_id in package_ids:
+        try:
+            pkg_dict = tk.get_action("package_show")(context.copy(), {"id": package_id})
+            package_index.update_dict(pkg_dict, defer_commit=True)
+        except Exception as e:
+            log.error(f"Error while indexing dataset {package_id}: {repr(e)}")
+            failed.append(package_id)
+        if connection.pending_count() >= connection.batch_size:
+            indexed += _flush(connection, failed)
+
+    indexed += _flush(connection, failed)
+    model.Session.remove()
+
+    return indexed, failed
+
+
+def _flush(connection, failed):
+    try:
+        return connection.flush()
+    except Exception as e:
+        log.error(f"Error while sending a batch of datasets to Solr: {repr(e)}")
+        failed.extend(connection.pending_ids())
+        connection.discard()
+        return 0
+
+
+def _get_package_ids(only_missing=False):
+    packages = model.Session.query(model.Package.id)
+    if tk.config.get("ckan.search.remove_deleted_packages"):
+        packages = packages.filter(model.Package.state != "deleted")
+    package_ids = [r[0] for r in packages.all()]
+
+    if only_missing:
+        indexed_ids = set(
+            query_for(model.Package).get_all_entity_ids(max_results=len(package_ids))
+        )
+        package_ids = [id_ for id_ in package_ids if id_ not in indexed_ids]
+
+    return package_ids
+
+
+def _shards(package_ids, shard_size):
+    for i in range(0, len(package_ids), shard_size):
+        yield package_ids[i : i + shard_size]
+
+
+def get_commands():
+    return [ogdch]
+
+
+@click.group()
+def ogdch():
+    """Commands of the ogdch plugin"""
+    pass
+
+
+@ogdch.command("search-index-rebuild")
+@click.option(
+    "-w",
+    "--workers",
+    type=click.IntRange(min=1),
+    default=multiprocessing.cpu_count,
+    show_default="number of cpus",
+    help="Number of worker processes. With 1, datasets are indexed in-process.",
+)
+@click.option(
+    "-b",
+    "--batch-size",
+    type=click.IntRange(min=1),
+    default=DEFAULT_BATCH_SIZE,
+    show_default=True,
+    help="Number of documents sent to Solr in one add request.",
+)
+@click.option(
+    "-c",
+    "--commit-interval",
+    type=click.IntRange(min=0),
+    default=DEFAULT_COMMIT_INTERVAL,
+    show_default=True,
+    help="Commit the index after this many documents. 0 only commits at the end.",
+)
+@click.option(
+    "-s",
+    "--shard-size",
+    type=click.IntRange(min=1),
+    default=DEFAULT_SHARD_SIZE,
+    show_default=True,
+    help="Number of datasets handed to a worker at a time.",
+)
+@click.option(
+    "-o",
+    "--only-missing",
+    is_flag=True,
+    help="Index only datasets that are not in the search index yet.",
+)
+def search_index_rebuild(
+    workers, batch_size, commit_interval, shard_size, only_missing
+):
+    """Rebuild the search index of all datasets in parallel.
+
+    The datasets are split into shards that are indexed by a pool of worker
+    processes. The documents are sent to Solr in batches and committed in
+    intervals, instead of one request and commit per dataset.
+    """
+    package_ids = _get_package_ids(only_missing=only_missing)
+    total = len(package_ids)
+    if not total:
+        click.echo("No datasets to index.")
+        return
+
+    click.echo(f"Indexing {total} datasets with {workers} worker(s)...")
+    start = time.monotonic()
+    indexed = 0
+    uncommitted = 0
+    failed = []
+
+    if workers == 1:
+        original_make_connection = search_index.make_connection
+        search_index.make_connection = ogdch_solr_utils.BatchingSolrConnection(
+            batch_size
+        )
+        results = map(_index_shard, _shards(package_ids, shard_size))
+        pool = None
+    else:
+        # Forked workers must not inherit open database connections.
+        model.Session.remove()
+        model.meta.engine.dispose()
+        pool = multiprocessing.get_context("fork").Pool(
+            processes=workers, initializer=_init_worker, initargs=(batch_size,)
+        )
+        results = pool.imap_unordered(_index_shard, _shards(package_ids, shard_size))
+
+    try:
+        for shard_indexed, shard_failed in results:
+            indexed += shard_indexed
+            uncommitted += shard_indexed
+            failed.extend(shard_failed)
+            if commit_interval and uncommitted >= commit_interval:
+                commit()
+                uncommitted = 0
+            click.echo(f"Indexed {indexed + len(failed)}/{total} datasets")
+    finally:
+        if pool is None:
+            search_index.make_connection = original_make_connection
+        else:
+            pool.close()
+            pool.join()
+
+    commit()
+    click.secho(
+        f"Indexed {indexed} datasets in {time.monotonic() - start:.1f}s",
+        fg="green",
+    )
+
+    if failed:
+        for package_id in failed:
+            click.echo(f"Failed to index dataset {package_id}", err=True)
+        tk.error_shout(f"{len(failed)} datasets could not be indexed")
+        raise click.exceptions.Exit(1)
+
+
+@ogdch.command("identifier-index-rebuild")
+def identifier_index_rebuild():
+    """Fill the identifier index with the identifiers of all datasets.
+
+    The identifier index is kept up to date when datasets are created or
+    updated, and the migration that creates it adds the datasets that existed
+    before. This is only needed to repair the index if identifier-index-check
+    found differences.
+    """
+    count = ogdch_identifier_utils.rebuild_index()
+    click.secho(f"Indexed the identifiers of {count} datasets", fg="green")
+
+
+@ogdch.command("identifier-index-check")
+def identifier_index_check():
+    """Compare the identifier index with the search index.
+
+    Lists the datasets whose identifier is missing from the identifier index
+    or differs from the one in the search index, and the datasets that are
+    in the identifier index but can not be found in the search index.
+    """
+    differences = ogdch_identifier_utils.check_index()
+    messages = {
+        "missing": "Identifier of dataset {} is missing",
+        "different": "Identifier of dataset {} differs from the search index",
+        "not_searchable": "Dataset {} is not in the search index",
+    }
+    for difference, package_ids in differences.items():
+        for package_id in package_ids:
+            click.echo(messages[difference].format(package_id), err=True)
+
+    count = sum(len(package_ids) for package_ids in differences.values())
+    if count:
+        tk.error_shout(f"Found {count} differences between the indexes")
+        raise click.exceptions.Exit(1)
+    click.secho("The identifier index matches the search index", fg="green")
@@ -14,6 +14,7 @@ from ckan.lib.helpers import url_for
 from ckan.plugins.toolkit import _
 
 import ckanext.switzerland.helpers.localize_utils as ogdch_localize_utils
+import ckanext.switzerland.helpers.request_utils as ogdch_request_utils
 from ckanext.harvest.helpers import harvester_types
 from ckanext.hierarchy.helpers import group_tree
 from ckanext.switzerland.helpers.frontend_helpers import (
@@ -54,7 +55,7 @@ def create_showcase_types():
     """
     Create tags and vocabulary for showcase types, if they don't exist already.
     """
-    user = tk.get_action("get_site_user")({"ignore_auth": True}, ())
+    user = ogdch_request_utils.get_site_user()
     context = {"user": user["name"]}
     try:
         data = {"id": "showcase_types"}
@@ -133,7 +134,7 @@ def get_localized_group_list(lang_code):
     Returns a list of dicts containing the id, name and localized title
     for each group.
     """
-    user = tk.get_action("get_site_user")({"ignore_auth": True}, {})
+    user = ogdch_request_utils.get_site_user()
     req_context = {"user": user["name"]}
     groups = tk.get_action("group_list")(req_context, {"all_fields": True})
     group_list = []
@@ -149,14 +150,16 @@ def get_localized_group_list(lang_code):
         )
 
     group_list.sort(
-        key=lambda group: ogdch_localize_utils.strip_accents(group["title"].lower()),
+        key=lambda group: ogdch_localize_utils.get_collation_key(
+            group["title"], lang_code
+        ),
         reverse=False,
     )
     return group_list
 
 
 def ogdch_get_organization_field_list(field):
-    user = tk.get_action("get_site_user")({"ignore_auth": True}, {})
+    user = ogdch_request_utils.get_site_user()
     req_context = {"user": user["name"]}
     orgs = tk.get_action("organization_list")(req_context, {"all_fields": True})
 
@@ -376,7 +379,7 @@ def get_contact_point_for_dataset(id):
     """
     Return the contact points for a dataset.
     """
-    user = tk.get_action("get_site_user")({"ignore_auth": True}, {})
+    user = ogdch_request_utils.get_site_user()
     context = {"user": user["name"]}
 
     try:
@@ -400,9 +403,13 @@ def strxfrm(next_helper, s):
     Overrides ckan.lib.helpers.strxfrm, which expects a string, not a dict.
 
     ckan.lib.helpers.strxfrm is (so far) only used for alphabetizing user lists and
-    group lists when dictizing.
+    group lists when dictizing. Strings are sorted with the cached collation
+    keys of the current language.
     """
+    lang_code = i18n.get_lang()
     if isinstance(s, dict):
-        s = ogdch_localize_utils.get_localized_value_from_json(s, i18n.get_lang())
+        s = ogdch_localize_utils.get_localized_value_from_json(s, lang_code)
+    if isinstance(s, str):
+        return ogdch_localize_utils.get_collation_key(s, lang_code)
 
     return next_helper(s)
@@ -0,0 +1,177 @@
+"""
+Caches for results that are expensive to compute, e.g. aggregated counts
+over all datasets. The backend is set with ckanext.switzerland.cache_backend:
+
+- memory: a TTL cache per process. Invalidating it only affects the process
+  that handles the change; other processes see it once the TTL runs out.
+- redis: a cache shared by all processes, using the Redis instance that CKAN
+  is already configured with.
+
+Cached values are usually invalidated in plugin hooks that run before the
+change is committed. A request in between can cache the old value again, so
+invalidate_after_commit() repeats the invalidation after the commit.
+"""
+
+import copy
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+import ckan.model as model
+import ckan.plugins.toolkit as tk
+from ckan.lib.redis import connect_to_redis
+from redis.exceptions import RedisError
+from sqlalchemy import event
+
+log = logging.getLogger(__name__)
+
+BACKEND_MEMORY = "memory"
+BACKEND_REDIS = "redis"
+
+# Key in Session.info for the invalidations to repeat after the commit
+_AFTER_COMMIT_KEY = "ogdch_invalidate_after_commit"
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+class MemoryCache:
+    """A thread-safe TTL cache that holds at most max_size entries and
+    evicts the least recently used one when it is full.
+
+    Values are copied when they are stored and returned, so that callers can
+    not change the cached value by accident.
+    """
+
+    def __init__(self, namespace, ttl, max_size=1024):
+        self.namespace = namespace
+        self.ttl = ttl
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+        return copy.deepcopy(value)
+
+    def set(self, key, value):
+        if not self.ttl:
+            return
+        value = copy.deepcopy(value)
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class RedisCache:
+    """A TTL cache in Redis, shared by all CKAN processes. Values are stored
+    as JSON.
+
+    All keys of a namespace contain a version number, so that the whole
+    namespace can be invalidated at once by incrementing it. If Redis is not
+    available, every lookup is a miss.
+    """
+
+    def __init__(self, namespace, ttl):
+        self.namespace = namespace
+        self.ttl = ttl
+        site_id = tk.config.get("ckan.site_id")
+        self._prefix = f"ckanext-switzerland:{site_id}:cache:{namespace}"
+        self._version_key = f"{self._prefix}:version"
+
+    def get(self, key):
+        try:
+            redis = connect_to_redis()
+            value = redis.get(self._key(redis, key))
+        except RedisError as e:
+            log.warning(f"Could not read {key} from cache {self.namespace}: {e}")
+            return None
+        if value is None:
+            return None
+        return json.loads(value)
+
+    def set(self, key, value):
+        if not self.ttl:
+            return
+        try:
+            redis = connect_to_redis()
+            redis.set(self._key(redis, key), json.dumps(value), ex=self.ttl)
+        except RedisError as e:
+            log.warning(f"Could not write {key} to cache {self.namespace}: {e}")
+
+    def delete(self, key):
+        try:
+            redis = connect_to_redis()
+            redis.delete(self._key(redis, key))
+        except RedisError as e:
+            log.warning(f"Could not delete {key} from cache {self.namespace}: {e}")
+
+    def clear(self):
+        try:
+            connect_to_redis().incr(self._version_key)
+        except RedisError as e:
+            log.warning(f"Could not clear cache {self.namespace}: {e}")
+
+    def _key(self, redis, key):
+        version = int(redis.get(self._version_key) or 0)
+        return f"{self._prefix}:{version}:{key}"
+
+
+def get_cache(namespace, ttl, backend=None):
+    """Return the cache for the namespace, using the given backend or the
+    configured one. A ttl of 0 disables caching: nothing is stored and every
+    lookup is a miss.
+    """
+    if backend is None:
+        backend = tk.config.get("ckanext.switzerland.cache_backend")
+    if backend == BACKEND_REDIS:
+        cache_class = RedisCache
+    else:
+        cache_class = MemoryCache
+
+    with _caches_lock:
+        cache = _caches.get(namespace)
+        if type(cache) is not cache_class or cache.ttl != ttl:
+            cache = cache_class(namespace, ttl)
+            _caches[namespace] = cache
+    return cache
+
+
+def invalidate_after_commit(invalidate, *args):
+    """Call invalidate(*args) now, and once more after the current database
+    transaction has been committed. After a rollback, it is not called again.
+    """
+    invalidate(*args)
+    model.Session.info.setdefault(_AFTER_COMMIT_KEY, {})[(invalidate, args)] = None
+
+
+@event.listens_for(model.Session, "after_commit")
+def _invalidate_after_commit(session):
+    invalidations = session.info.pop(_AFTER_COMMIT_KEY, None)
+    for invalidate, args in invalidations or []:
+        invalidate(*args)
+
+
+@event.listens_for(model.Session, "after_rollback")
+def _forget_invalidations(session):
+    session.info.pop(_AFTER_COMMIT_KEY, None)
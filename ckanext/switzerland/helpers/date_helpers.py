@@ -4,7 +4,7 @@ from datetime import datetime
 import ckan.plugins.toolkit as tk
 import isodate
 from ckan.lib.formatters import localised_nice_date
-from dateutil.parser import ParserError, parse
+from dateutil.parser import ParserError
 
 DATE_PICKER_FORMAT = tk.config.get("ckanext.switzerland.date_picker_format", "%d.%m.%Y")
 ALLOWED_DATE_FORMATS = ["%d.%m.%Y", "%d.%m.%y"]
@@ -16,8 +16,24 @@ VALID_EMPTY_DATE = ""
 EMPTY_DATE_VALUES = [INVALID_EMPTY_DATE, VALID_EMPTY_DATE, None]
 
 
+def _parse_isodatetime(value):
+    """Parse an isoformat datetime string with the fast datetime.fromisoformat,
+    falling back to isodate for formats that it does not support.
+    """
+    try:
+        return datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        return isodate.parse_datetime(value)
+
+
 def display_if_isodate(value):
     """If the value is already in isoformat, return it as-is."""
+    if isinstance(value, str) and "T" in value:
+        try:
+            datetime.fromisoformat(value)
+            return value
+        except ValueError:
+            pass
     try:
         dt = isodate.parse_datetime(value)
         if isinstance(dt, datetime):
@@ -150,7 +166,7 @@ def transform_date_for_solr(date):
     date = transform_any_date_to_isodate(date)
 
     try:
-        datetime_without_tz = parse(date, ignoretz=True)
+        datetime_without_tz = _parse_isodatetime(date).replace(tzinfo=None)
         isodate_without_tz = isodate.datetime_isoformat(datetime_without_tz)
         return f"{isodate_without_tz}Z"
     except Exception as e:
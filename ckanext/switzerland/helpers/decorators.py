@@ -1,71 +1,66 @@
 import functools
 import logging
-from datetime import datetime, timedelta
+from datetime import timedelta
 
-from ckan.plugins.toolkit import config
+from ckan.plugins.toolkit import aslist, config
+
+import ckanext.switzerland.helpers.ratelimit_utils as ogdch_ratelimit_utils
+import ckanext.switzerland.helpers.request_utils as ogdch_request_utils
 
 log = logging.getLogger(__name__)
 
 
 def ratelimit(func):
-    """limits the rate of calls with the same email
+    """limits the rate of calls with the same email or from the same client
     Can be used for any logic function that has an author_email
     in the data_dict as mandatory field and wants to limit the
     number of calls within a given time interval.
-    - the timeinterval and limit of calls can be set in the ckan config
-    - in case of an exceeded limit the context is set accorfingly, so
+    - the timeinterval, limit of calls, what calls are counted by (email
+    and/or ip address) and whether they are counted per process or for all
+    processes together can be set in the ckan config
+    - in case of an exceeded limit the context is set accordingly, so
     that the api function can react on it
     """
 
     @functools.wraps(func)
     def inner(context, data_dict):
-        author_email = data_dict.get("author_email")
-        if author_email:
-            _add_new_call_and_remove_old_calls(
-                api_calls_per_time_and_email,
-                author_email,
-                limit_timedelta,
-            )
-            count_of_calls_per_email = _get_call_count_for_author_email(
-                api_calls_per_time_and_email,
-                author_email,
-            )
-            if count_of_calls_per_email > limit_call_count:
-                context["ratelimit_exceeded"] = True
-                context["limit_call_count"] = limit_call_count
-                context["limit_timedelta"] = limit_timedelta
-                context["count_of_calls_per_email"] = count_of_calls_per_email
+        limit_timedelta, limit_call_count = _get_limits_from_config()
+        limiter = ogdch_ratelimit_utils.get_rate_limiter(
+            func.__name__, limit_call_count, limit_timedelta.total_seconds()
+        )
+        # Every key is counted, even if the limit is exceeded for another one
+        exceeded_keys = [
+            key
+            for key in _get_ratelimit_keys(data_dict)
+            if limiter.hit(key) > limit_call_count
+        ]
+        if exceeded_keys:
+            context["ratelimit_exceeded"] = True
+            context["limit_call_count"] = limit_call_count
+            context["limit_timedelta"] = limit_timedelta
+            context["ratelimit_key"] = exceeded_keys[0].split(":", 1)[1]
         return func(context, data_dict)
 
-    limit_timedelta, limit_call_count = _get_limits_from_config()
-    api_calls_per_time_and_email = []
     return inner
 
 
-def _add_new_call_and_remove_old_calls(
-    api_calls_per_time_and_email, author_email, limit_timedelta
-):
-    """
-    Adds the new call for author_email and remove calls that are
-    outside the considered timedelta to the list of api calls
-    """
-    now = datetime.now()
-    this_call_tuple = (author_email, datetime.now())
-    api_calls_per_time_and_email.append(this_call_tuple)
-    for m, t in api_calls_per_time_and_email:
-        tuple_expired = t + limit_timedelta < now
-        if tuple_expired:
-            api_calls_per_time_and_email.remove((m, t))
-
-
-def _get_call_count_for_author_email(api_calls_per_time_and_email, author_email):
+def _get_ratelimit_keys(data_dict):
     """
-    Returns number of calls for an author_email in the caller list
+    Returns the keys that a call is counted by, depending on
+    ckanext.switzerland.api_limit_keys
     """
-    calls_with_same_email_as_author_email = [
-        (m, t) for (m, t) in api_calls_per_time_and_email if m == author_email
-    ]
-    return len(calls_with_same_email_as_author_email)
+    keys = []
+    for key_type in aslist(config.get("ckanext.switzerland.api_limit_keys", "email")):
+        if key_type == "email":
+            value = (data_dict.get("author_email") or "").strip().lower()
+        elif key_type == "ip":
+            value = ogdch_request_utils.get_client_ip()
+        else:
+            log.warning(f"Unknown rate limit key {key_type}")
+            continue
+        if value:
+            keys.append(f"{key_type}:{value}")
+    return keys
 
 
 def _get_limits_from_config():
@@ -4,20 +4,23 @@ belong in this file
 """
 
 import os
+from functools import lru_cache
 from urllib.parse import urlparse
 
 import yaml
 
 __location__ = os.path.realpath(os.path.join(os.getcwd(), os.path.dirname(__file__)))
 
-LINKED_DATA_FORMATS = [
-    "JSON-LD",
-    "N3",
-    "RDF N-Triples",
-    "RDF Turtle",
-    "RDF XML",
-    "SPARQL",
-]
+LINKED_DATA_FORMATS = frozenset(
+    [
+        "JSON-LD",
+        "N3",
+        "RDF N-Triples",
+        "RDF Turtle",
+        "RDF XML",
+        "SPARQL",
+    ]
+)
 
 
 class FormatMappingNotLoadedError(Exception):
@@ -30,10 +33,7 @@ def ogdch_get_format_mapping(mapping_type):
     try:
         with open(mapping_path, "r") as mapping_file:
             mapping = yaml.safe_load(mapping_file)
-            reverse_mapping = {}
-            for key, format_list in list(mapping.items()):
-                for format in format_list:
-                    reverse_mapping[format] = key
+            reverse_mapping = _reverse(mapping)
     except (IOError, yaml.YAMLError) as exception:
         raise FormatMappingNotLoadedError(
             f"Loading Format-Mapping from Path: ({mapping_path}) failed with "
@@ -43,22 +43,118 @@ def ogdch_get_format_mapping(mapping_type):
     return mapping, reverse_mapping
 
 
+class FormatResolver:
+    """Resolve resource formats and IANA media types from the format and
+    media type mappings.
+
+    The mappings are turned into hash-based lookups once, and the results of
+    get_resource_format are memoized in a bounded LRU cache, as the same
+    combinations of media_type, format and download_url occur over and over.
+    """
+
+    def __init__(self, format_mapping, media_type_mapping, cache_size=4096):
+        self.formats = frozenset(format_mapping)
+        self.format_aliases = _reverse(format_mapping)
+        self.media_types = frozenset(media_type_mapping)
+        self.media_type_aliases = _reverse(media_type_mapping)
+        self._get_resource_format_cached = lru_cache(maxsize=cache_size)(
+            self._get_resource_format
+        )
+
+    def get_resource_format(self, media_type, format, download_url):
+        try:
+            return self._get_resource_format_cached(media_type, format, download_url)
+        except TypeError:
+            # unhashable input, e.g. a list of formats from a harvester
+            return self._get_resource_format(media_type, format, download_url)
+
+    def get_iana_media_type(self, media_type):
+        if not media_type:
+            return ""
+
+        cleaned_media_type = _get_cleaned_format_or_media_type(media_type)
+        if cleaned_media_type in self.media_types:
+            return cleaned_media_type
+
+        return self.media_type_aliases.get(cleaned_media_type, "")
+
+    def map_to_valid_format(self, format, try_to_clean=False):
+        """Check whether the format is in the format mapping, either as a key
+        or as a value, or if it can be derived after cleaning the input format
+        string
+        """
+        if format in self.formats:
+            return format
+
+        if format in self.format_aliases:
+            return self.format_aliases[format]
+        if try_to_clean:
+            cleaned_format = _get_cleaned_format_or_media_type(format)
+            return self.format_aliases.get(cleaned_format, "")
+        return ""
+
+    def cache_info(self):
+        return self._get_resource_format_cached.cache_info()
+
+    def cache_clear(self):
+        self._get_resource_format_cached.cache_clear()
+
+    def _get_resource_format(self, media_type, format, download_url):
+        if media_type:
+            cleaned_media_type = _get_cleaned_format_or_media_type(media_type)
+            format_from_media_type = self.map_to_valid_format(cleaned_media_type)
+            if format_from_media_type:
+                return format_from_media_type
+
+        if format:
+            format_from_format = self.map_to_valid_format(format, try_to_clean=True)
+            if format_from_format:
+                return format_from_format
+
+        if download_url:
+            format_from_file_extension = self._get_format_from_path(download_url)
+            if format_from_file_extension:
+                return format_from_file_extension
+            elif media_type:
+                return cleaned_media_type
+            return ""
+
+        return "SERVICE"
+
+    def _get_format_from_path(self, download_url):
+        """check whether the format can be derived from the file
+        extension"""
+        path = urlparse(download_url).path
+        ext = os.path.splitext(path)[1]
+        if ext:
+            resource_format = ext.replace(".", "").lower()
+            return self.map_to_valid_format(resource_format)
+        return ""
+
+
+def _reverse(mapping):
+    return {alias: key for key, alias_list in mapping.items() for alias in alias_list}
+
+
 format_mapping, reverse_format_mapping = ogdch_get_format_mapping(mapping_type="format")
 media_type_mapping, reverse_media_type_mapping = ogdch_get_format_mapping(
     mapping_type="media_type"
 )
+format_resolver = FormatResolver(format_mapping, media_type_mapping)
 
 
 def prepare_resource_format(resource):
     """Determine resource format depending on media_type, format and
     download_url. Then convert media_type to its IANA value.
     """
-    resource["format"] = get_resource_format(
+    resource["format"] = format_resolver.get_resource_format(
         media_type=resource.get("media_type"),
         format=resource.get("format"),
         download_url=resource.get("download_url"),
     )
-    resource["media_type"] = get_iana_media_type(resource.get("media_type"))
+    resource["media_type"] = format_resolver.get_iana_media_type(
+        resource.get("media_type")
+    )
     return resource
 
 
@@ -75,43 +171,14 @@ def get_resource_format(media_type, format, download_url):
              set it as blank
     - case 4 no download url: set the format to SERVICE
     """
-    if media_type:
-        cleaned_media_type = _get_cleaned_format_or_media_type(media_type)
-        format_from_media_type = _map_to_valid_format(cleaned_media_type)
-        if format_from_media_type:
-            return format_from_media_type
-
-    if format:
-        format_from_format = _map_to_valid_format(format, try_to_clean=True)
-        if format_from_format:
-            return format_from_format
-
-    if download_url:
-        format_from_file_extension = _get_format_from_path(download_url)
-        if format_from_file_extension:
-            return format_from_file_extension
-        elif media_type:
-            return cleaned_media_type
-        return ""
-
-    return "SERVICE"
+    return format_resolver.get_resource_format(media_type, format, download_url)
 
 
 def get_iana_media_type(media_type):
     """Get a value for media_type that belongs to the IANA Media Types
     vocabulary, if there is one
     """
-    if not media_type:
-        return ""
-
-    cleaned_media_type = _get_cleaned_format_or_media_type(media_type)
-    if cleaned_media_type in list(media_type_mapping.keys()):
-        return cleaned_media_type
-
-    if cleaned_media_type in list(reverse_media_type_mapping.keys()):
-        return reverse_media_type_mapping[cleaned_media_type]
-
-    return ""
+    return format_resolver.get_iana_media_type(media_type)
 
 
 def prepare_formats_for_index(resources, linked_data_only=False):
@@ -131,22 +198,6 @@ def prepare_formats_for_index(resources, linked_data_only=False):
     return list(formats)
 
 
-def _map_to_valid_format(format, try_to_clean=False):
-    """Check whether the format is in the format mapping, either as a key or
-    as a value, or if it can be derived after cleaning the input format string
-    """
-    if format in list(format_mapping.keys()):
-        return format
-
-    if format in list(reverse_format_mapping.keys()):
-        return reverse_format_mapping[format]
-    if try_to_clean:
-        cleaned_format = _get_cleaned_format_or_media_type(format)
-        if cleaned_format in list(reverse_format_mapping.keys()):
-            return reverse_format_mapping[cleaned_format]
-    return ""
-
-
 def _get_cleaned_format_or_media_type(format):
     """clean the format"""
     if format:
@@ -154,14 +205,3 @@ def _get_cleaned_format_or_media_type(format):
         if cleaned_format:
             return cleaned_format
     return ""
-
-
-def _get_format_from_path(download_url):
-    """check whether the format can be derived from the file
-    extension"""
-    path = urlparse(download_url).path
-    ext = os.path.splitext(path)[1]
-    if ext:
-        resource_format = ext.replace(".", "").lower()
-        return _map_to_valid_format(resource_format)
-    return ""
@@ -5,6 +5,7 @@ are used in frontend templates
 
 import json
 import logging
+import uuid
 from collections import OrderedDict
 
 import ckan.lib.i18n as i18n
@@ -13,12 +14,15 @@ from babel import numbers
 from ckan.lib.helpers import lang, localised_number
 from ckan.plugins.toolkit import _
 
+import ckanext.switzerland.helpers.cache_utils as ogdch_cache_utils
 import ckanext.switzerland.helpers.localize_utils as ogdch_loc_utils
+import ckanext.switzerland.helpers.request_utils as ogdch_request_utils
 import ckanext.switzerland.helpers.terms_of_use_utils as ogdch_term_utils
-from ckanext.hierarchy.helpers import group_tree
 
 log = logging.getLogger(__name__)
 
+ORGANIZATION_TREE_VERSION_KEY = "version"
+
 # these bookmarks can be used in the wordpress page
 # for the terms of use
 mapping_terms_of_use_to_pagemark = {
@@ -33,7 +37,7 @@ def get_group_count():
     """
     Return the number of groups
     """
-    user = tk.get_action("get_site_user")({"ignore_auth": True}, {})
+    user = ogdch_request_utils.get_site_user()
     req_context = {"user": user["name"]}
     groups = tk.get_action("group_list")(req_context, {})
     return len(groups)
@@ -337,38 +341,63 @@ def ogdch_localised_number(number):
 def ogdch_render_tree(organizations=None):
     """
     Returns HTML for a hierarchy of given organizations
+
+    The tree of all organizations is cached for each language, until an
+    organization is changed.
     """
+    lang_code = i18n.get_lang()
     if organizations:
-        top_nodes = ogdch_group_tree_selective(
-            organizations, group_tree(type_="organization")
-        )
-    else:
-        top_nodes = ogdch_group_tree()
-    return _render_tree(top_nodes)
+        top_nodes = ogdch_group_tree_selective(organizations)
+        return _render_tree(top_nodes, lang_code)
+
+    cache = get_organization_tree_cache()
+    html = cache.get(lang_code)
+    if html is None:
+        html = _render_tree(ogdch_group_tree(), lang_code)
+        cache.set(lang_code, html)
+    return html
+
+
+def get_organization_tree_cache():
+    return ogdch_cache_utils.get_cache(
+        "organization_tree",
+        ttl=tk.config.get("ckanext.switzerland.organization_tree_cache_ttl"),
+    )
 
 
-def _render_tree(top_nodes):
+def invalidate_organization_tree_cache():
+    ogdch_cache_utils.invalidate_after_commit(_clear_organization_tree_cache)
+
+
+def _clear_organization_tree_cache():
+    get_organization_tree_cache().clear()
+
+
+def _render_tree(top_nodes, lang_code):
     """
     Renders a tree of nodes. 10x faster than Jinja/organization_tree.html
     Note: avoids the slow url_for routine.
     """
-    html = '<ul id="organizations-list">'
+    parts = ['<ul id="organizations-list">']
     for node in top_nodes:
-        html += _render_tree_node(node)
-    return f"{html}</ul>"
+        _render_tree_node(node, lang_code, parts)
+    parts.append("</ul>")
+    return "".join(parts)
 
 
-def _render_tree_node(node):
-    html = '<div class="organization-row">'
-    html += f"<a href=\"/{i18n.get_lang()}/organization/{node['name']}\">{node['title']}</a>"
-    html += "</div>"
+def _render_tree_node(node, lang_code, parts):
+    parts.append(
+        f"<li id=\"node_{node['name']}\" class=\"organization\">"
+        '<div class="organization-row">'
+        f"<a href=\"/{lang_code}/organization/{node['name']}\">{node['title']}</a>"
+        "</div>"
+    )
     if node["children"]:
-        html += "<ul>"
+        parts.append("<ul>")
         for child in node["children"]:
-            html += _render_tree_node(child)
-        html += "</ul>"
-    html = f"<li id=\"node_{node['name']}\" class=\"organization\">{html}</li>"
-    return html
+            _render_tree_node(child, lang_code, parts)
+        parts.append("</ul>")
+    parts.append("</li>")
 
 
 def ogdch_group_tree(type_="organization"):
@@ -377,43 +406,96 @@ def ogdch_group_tree(type_="organization"):
     return organizations
 
 
-def ogdch_group_tree_selective(organizations, group_tree_list):
+class OrganizationTreeIndex(object):
+    """
+    Index of an organization tree as returned by the group_tree action, with
+    the nodes and the name of the parent of each node by organization name.
+    """
+
+    def __init__(self, tree):
+        self.tree = tree
+        self.nodes = {}
+        self.parents = {}
+        stack = [(node, None) for node in tree]
+        while stack:
+            node, parent_name = stack.pop()
+            self.nodes[node["name"]] = node
+            self.parents[node["name"]] = parent_name
+            stack.extend((child, node["name"]) for child in node["children"])
+
+    def prune(self, names):
+        """
+        Return a copy of the tree that only contains the given organizations,
+        at any depth, and their parents. The indexed tree is not changed.
+        """
+        selected = set()
+        for name in names:
+            while name in self.nodes and name not in selected:
+                selected.add(name)
+                name = self.parents[name]
+        return self._copy_selected(self.tree, selected)
+
+    def _copy_selected(self, nodes, selected):
+        return [
+            dict(node, children=self._copy_selected(node["children"], selected))
+            for node in nodes
+            if node["name"] in selected
+        ]
+
+
+_organization_tree_index = (None, None)
+
+
+def get_organization_tree_index():
+    """
+    Return the index of the tree of all organizations. It is built once for
+    every version of the tree, i.e. until an organization is changed.
+    """
+    global _organization_tree_index
+
+    cache = get_organization_tree_cache()
+    version = cache.get(ORGANIZATION_TREE_VERSION_KEY)
+    if version is None:
+        version = uuid.uuid4().hex
+        cache.set(ORGANIZATION_TREE_VERSION_KEY, version)
+
+    index_version, index = _organization_tree_index
+    if index_version != version:
+        tree = tk.get_action("group_tree")({}, {"type": "organization"})
+        index = OrganizationTreeIndex(tree)
+        _organization_tree_index = (version, index)
+    return index
+
+
+def ogdch_group_tree_selective(organizations, group_tree_list=None):
     """
     Return a group tree filtered to include the given organizations.
-    If a sub-organization should be included, its parent is included too.
+    If a sub-organization should be included, its parents are included too.
     """
+    if group_tree_list is None:
+        index = get_organization_tree_index()
+    else:
+        index = OrganizationTreeIndex(group_tree_list)
 
-    def filter(group_tree_list, name_list):
-        new_group_tree_list = []
-        for tree in group_tree_list:
-            new_children = []
-            for child in tree.get("children", []):
-                if child.get("name", "") in name_list:
-                    new_children.append(child)
-            if tree.get("name", "") in name_list or len(new_children) > 0:
-                tree["children"] = new_children
-                new_group_tree_list.append(tree)
-        return new_group_tree_list
-
-    selected_names = [o.get("name", None) for o in organizations]
-
-    group_tree_list = list(filter(group_tree_list, selected_names))
+    group_tree_list = index.prune(o.get("name") for o in organizations)
     group_tree_list = get_sorted_orgs_by_translated_title(group_tree_list)
     return group_tree_list
 
 
-def get_sorted_orgs_by_translated_title(organizations):
+def get_sorted_orgs_by_translated_title(organizations, lang_code=None):
+    if lang_code is None:
+        lang_code = i18n.get_lang()
     for organization in organizations:
         organization["title"] = ogdch_loc_utils.get_localized_value_from_json(
-            organization["title"], i18n.get_lang()
+            organization["title"], lang_code
         )
         if organization["children"]:
             organization["children"] = get_sorted_orgs_by_translated_title(
-                organization["children"]
+                organization["children"], lang_code
             )
 
     organizations.sort(
-        key=lambda org: ogdch_loc_utils.strip_accents(org["title"].lower()),
+        key=lambda org: ogdch_loc_utils.get_collation_key(org["title"], lang_code),
         reverse=False,
     )
     return organizations
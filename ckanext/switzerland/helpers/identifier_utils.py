@@ -0,0 +1,253 @@
+"""
+Looking up datasets by identifier in the table ogdch_pkg_identifier, instead of
+searching for them in Solr.
+
+The table is kept up to date by OgdchPackagePlugin whenever a dataset is
+created or updated, in the same transaction as the dataset itself. The
+identifiers of datasets that existed before are added by the migration that
+creates the table. `ckan ogdch identifier-index-check` compares the table with
+the search index, and `ckan ogdch identifier-index-rebuild` fills it again.
+
+The package ids that were found are kept in a small LRU cache per process.
+Other processes do not notice when they become outdated, so a cached id is
+only used if the dataset that is loaded with it still matches the lookup.
+
+Permalinks only need the name of the dataset. It is cached with the
+configured cache backend until the dataset is changed or deleted, and removed
+once more after the change has been committed.
+"""
+
+import json
+import logging
+
+import ckan.model as model
+import ckan.plugins.toolkit as tk
+
+import ckanext.switzerland.helpers.cache_utils as ogdch_cache_utils
+import ckanext.switzerland.helpers.solr_utils as ogdch_solr_utils
+from ckanext.switzerland.model import DatasetIdentifier
+
+log = logging.getLogger(__name__)
+
+CHECK_PAGE_SIZE = 1000
+
+
+def _get_cache():
+    return ogdch_cache_utils.get_cache(
+        "dataset_identifier",
+        ttl=tk.config.get("ckanext.switzerland.identifier_cache_ttl"),
+        backend=ogdch_cache_utils.BACKEND_MEMORY,
+    )
+
+
+def _get_name_cache():
+    return ogdch_cache_utils.get_cache(
+        "dataset_name_by_identifier",
+        ttl=tk.config.get("ckanext.switzerland.perma_cache_ttl"),
+    )
+
+
+def _cache_keys(identifier):
+    return [json.dumps([identifier, private]) for private in (False, True)]
+
+
+def index_dataset(package_id, identifier):
+    """Store the identifier of a dataset. This has to be called in the
+    transaction that saves the dataset.
+    """
+    row = model.Session.get(DatasetIdentifier, package_id)
+    if row is not None:
+        _invalidate(row.identifier)
+    _invalidate(identifier)
+
+    if not identifier:
+        if row is not None:
+            model.Session.delete(row)
+    elif row is None:
+        model.Session.add(
+            DatasetIdentifier(package_id=package_id, identifier=identifier)
+        )
+    else:
+        row.identifier = identifier
+
+
+def invalidate_dataset(package_id):
+    """Remove the cached lookups for the identifier of a dataset, e.g. when
+    it is deleted.
+    """
+    row = model.Session.get(DatasetIdentifier, package_id)
+    if row is not None:
+        _invalidate(row.identifier)
+
+
+def _invalidate(identifier):
+    if not identifier:
+        return
+    cache = _get_cache()
+    for key in _cache_keys(identifier):
+        cache.delete(key)
+    ogdch_cache_utils.invalidate_after_commit(_delete_name, identifier)
+
+
+def _delete_name(identifier):
+    _get_name_cache().delete(identifier)
+
+
+def get_package_ids(identifiers, include_private=False, include_drafts=False):
+    """Return the ids of the active datasets with the given identifiers, by
+    identifier. If several datasets have the same identifier, the one that
+    was modified last is returned.
+    """
+    identifiers = list(set(identifiers))
+    if not identifiers:
+        return {}
+
+    states = ["active", "draft"] if include_drafts else ["active"]
+    query = (
+        model.Session.query(DatasetIdentifier.identifier, DatasetIdentifier.package_id)
+        .join(model.Package, model.Package.id == DatasetIdentifier.package_id)
+        .filter(DatasetIdentifier.identifier.in_(identifiers))
+        .filter(model.Package.state.in_(states))
+    )
+    if not include_private:
+        query = query.filter(model.Package.private.is_(False))
+
+    # Later rows overwrite earlier ones
+    return dict(query.order_by(model.Package.metadata_modified).all())
+
+
+def _matches(dataset, identifier, include_private):
+    return (
+        dataset.get("identifier") == identifier
+        and dataset.get("state") == "active"
+        and (include_private or not dataset.get("private"))
+    )
+
+
+def get_dataset(context, identifier, include_private=False):
+    """Return the active dataset with the identifier, as package_show returns
+    it with the given context. Raises NotFound if there is none.
+    """
+    cache = _get_cache()
+    key = json.dumps([identifier, include_private])
+
+    package_id = cache.get(key)
+    if package_id is not None:
+        try:
+            dataset = tk.get_action("package_show")(context.copy(), {"id": package_id})
+            if _matches(dataset, identifier, include_private):
+                return dataset
+        except tk.ObjectNotFound:
+            pass
+        cache.delete(key)
+
+    package_id = get_package_ids([identifier], include_private).get(identifier)
+    if package_id is None:
+        raise tk.ObjectNotFound
+    cache.set(key, package_id)
+
+    return tk.get_action("package_show")(context.copy(), {"id": package_id})
+
+
+def get_dataset_name(identifier):
+    """Return the name of the active, public dataset with the identifier, or
+    None if there is none. Only the name is loaded from the database.
+    """
+    cache = _get_name_cache()
+    name = cache.get(identifier)
+    if name is not None:
+        return name
+
+    name = (
+        model.Session.query(model.Package.name)
+        .join(DatasetIdentifier, DatasetIdentifier.package_id == model.Package.id)
+        .filter(DatasetIdentifier.identifier == identifier)
+        .filter(model.Package.state == "active")
+        .filter(model.Package.private.is_(False))
+        .order_by(model.Package.metadata_modified.desc())
+        .limit(1)
+        .scalar()
+    )
+    if name is not None:
+        cache.set(identifier, name)
+    return name
+
+
+def rebuild_index():
+    """Replace the contents of the table with the identifiers of all datasets
+    in the database, and return their number.
+    """
+    rows = (
+        model.Session.query(model.PackageExtra.package_id, model.PackageExtra.value)
+        .filter(model.PackageExtra.key == "identifier")
+        .filter(model.PackageExtra.state == "active")
+        .filter(model.PackageExtra.value != "")
+        .all()
+    )
+    model.Session.query(DatasetIdentifier).delete()
+    model.Session.bulk_insert_mappings(
+        DatasetIdentifier,
+        [
+            {"package_id": package_id, "identifier": identifier}
+            for package_id, identifier in rows
+        ],
+    )
+    model.Session.commit()
+    clear_caches()
+
+    return len(rows)
+
+
+def clear_caches():
+    _get_cache().clear()
+    _get_name_cache().clear()
+
+
+def _get_indexed_identifiers():
+    """Return the identifiers of all datasets in the search index, by id."""
+    connection = ogdch_solr_utils.get_connection()
+    fq = f'+site_id:"{tk.config.get("ckan.site_id")}" +entity_type:package'
+    identifiers = {}
+    start = 0
+    while True:
+        results = connection.search(
+            "identifier:*",
+            fq=fq,
+            fl="id,identifier",
+            sort="id asc",
+            start=start,
+            rows=CHECK_PAGE_SIZE,
+        )
+        for doc in results.docs:
+            identifiers[doc["id"]] = doc["identifier"]
+        start += CHECK_PAGE_SIZE
+        if start >= results.hits:
+            return identifiers
+
+
+def check_index():
+    """Compare the table with the search index. Returns the ids of the
+    datasets that are in the search index but not in the table (missing), that
+    have a different identifier in both (different) and that are in the table
+    but not in the search index (not_searchable). Deleted datasets are
+    ignored.
+    """
+    rows = (
+        model.Session.query(DatasetIdentifier.package_id, DatasetIdentifier.identifier)
+        .join(model.Package, model.Package.id == DatasetIdentifier.package_id)
+        .filter(model.Package.state != "deleted")
+        .all()
+    )
+    table_identifiers = dict(rows)
+    search_identifiers = _get_indexed_identifiers()
+
+    return {
+        "missing": sorted(set(search_identifiers) - set(table_identifiers)),
+        "different": sorted(
+            package_id
+            for package_id, identifier in search_identifiers.items()
+            if package_id in table_identifiers
+            and table_identifiers[package_id] != identifier
+        ),
+        "not_searchable": sorted(set(table_identifiers) - set(search_identifiers)),
+    }
@@ -4,15 +4,28 @@ localization functions that don't need the request object
 
 import json
 import unicodedata
+from collections.abc import Mapping
+from functools import lru_cache
+from types import MappingProxyType
+
+try:
+    # PyICU is optional. Without it, strings are sorted without their accents.
+    import icu
+except ImportError:
+    icu = None
 
 LANGUAGES = {"de", "fr", "it", "en"}
+# json objects and lists start with one of these characters
+JSON_PREFIXES = ("{", "[")
+PARSED_JSON_CACHE_SIZE = 4096
+COLLATION_KEY_CACHE_SIZE = 16384
 
 
-def parse_json_attributes(ckan_dict):
+def parse_json_attributes(ckan_dict, json_fields=None):
     """turn attribute values from json
     to python structures"""
     for key, value in ckan_dict.items():
-        ckan_dict[key] = parse_json(value)
+        ckan_dict[key] = parse_json_field(key, value, json_fields)
     return ckan_dict
 
 
@@ -39,6 +52,63 @@ def parse_json(value, default_value=None):
         return value
 
 
+@lru_cache(maxsize=PARSED_JSON_CACHE_SIZE)
+def _parse_json_cached(value):
+    return _freeze(parse_json(value))
+
+
+def _freeze(value):
+    if isinstance(value, dict):
+        return MappingProxyType({k: _freeze(v) for k, v in value.items()})
+    if isinstance(value, list):
+        return tuple(_freeze(v) for v in value)
+    return value
+
+
+def _thaw(value):
+    if isinstance(value, Mapping):
+        return {k: _thaw(v) for k, v in value.items()}
+    if isinstance(value, tuple):
+        return [_thaw(v) for v in value]
+    return value
+
+
+def parse_json_cached(value):
+    """Same as parse_json, for strings that are parsed over and over, e.g. the
+    multilingual titles of groups and organizations. The results are cached,
+    so they are returned as read-only mappings and tuples instead of dicts and
+    lists.
+    """
+    if not isinstance(value, str):
+        return value
+    return _parse_json_cached(value)
+
+
+def parsed_json_cache_info():
+    """Return the hits, misses and size of the cache of parse_json_cached."""
+    return _parse_json_cached.cache_info()
+
+
+def parsed_json_cache_clear():
+    _parse_json_cached.cache_clear()
+
+
+def parse_json_field(key, value, json_fields=None):
+    """Parse the value of a field if it holds json. json_fields maps the names
+    of the fields declared in a schema to whether they hold json (see
+    schema_utils). The values of other fields are only parsed if they look
+    like a json object or list.
+    """
+    if not isinstance(value, str):
+        return value
+    is_json = json_fields.get(key) if json_fields else None
+    if is_json is None:
+        is_json = value.startswith(JSON_PREFIXES)
+    if is_json:
+        return parse_json(value)
+    return value
+
+
 def lang_to_string(data_dict, attribute):
     """make a long string with all 4 languages of an attribute"""
     value_dict = data_dict.get(attribute, {})
@@ -58,21 +128,68 @@ def lang_to_string(data_dict, attribute):
     return ""
 
 
-def localize_ckan_sub_dict(ckan_dict, lang_code):
+def localize_ckan_sub_dict(ckan_dict, lang_code, json_fields=None):
     """localize groups orgs and resources"""
     localized_dict = {}
     for k, v in list(ckan_dict.items()):
-        py_v = parse_json(v)
+        py_v = parse_json_field(k, v, json_fields)
         localized_dict[k] = get_localized_value_from_dict(py_v, lang_code)
     return localized_dict
 
 
+class DatasetLocalizer:
+    """Parses and localizes a dataset dict together with its resources, groups
+    and organization, walking the dict only once and changing it in place.
+
+    The json fields of each part of the dataset are given as in
+    parse_json_field, so that json.loads is only called for fields that hold
+    json.
+    """
+
+    def __init__(
+        self,
+        dataset_fields=None,
+        resource_fields=None,
+        group_fields=None,
+        organization_fields=None,
+    ):
+        self.dataset_fields = dataset_fields
+        self.resource_fields = resource_fields
+        self.group_fields = group_fields
+        self.organization_fields = organization_fields
+
+    def parse(self, pkg_dict):
+        """Parse the json fields of the dataset itself."""
+        return parse_json_attributes(pkg_dict, self.dataset_fields)
+
+    def localize(self, pkg_dict, lang_code):
+        """Localize the dataset, its resources, groups and organization."""
+        _localize_fields(pkg_dict, self.dataset_fields, lang_code)
+        for resource in pkg_dict.get("resources") or []:
+            _localize_fields(resource, self.resource_fields, lang_code)
+        for group in pkg_dict.get("groups") or []:
+            _localize_fields(group, self.group_fields, lang_code)
+        if pkg_dict.get("organization"):
+            _localize_fields(
+                pkg_dict["organization"], self.organization_fields, lang_code
+            )
+        return pkg_dict
+
+
+def _localize_fields(ckan_dict, json_fields, lang_code):
+    for key, value in ckan_dict.items():
+        value = parse_json_field(key, value, json_fields)
+        if isinstance(value, dict):
+            value = get_localized_value_from_dict(value, lang_code)
+        ckan_dict[key] = value
+
+
 def get_localized_value_from_dict(value, lang_code, default=""):
     """localizes language dict and
     returns value if it is not a language dict"""
-    if not isinstance(value, dict):
+    if not isinstance(value, Mapping):
         return value
-    elif not LANGUAGES.issubset(set(value.keys())):
+    elif not LANGUAGES.issubset(value.keys()):
         return value
     desired_lang_value = value.get(lang_code)
     if desired_lang_value:
@@ -83,7 +200,11 @@ def get_localized_value_from_dict(value, lang_code, default=""):
 def get_localized_value_from_json(value, lang_code):
     """localizes language dict from json and
     returns value if it is not a language dict"""
-    return get_localized_value_from_dict(parse_json(value), lang_code)
+    localized_value = get_localized_value_from_dict(parse_json_cached(value), lang_code)
+    if isinstance(localized_value, str):
+        return localized_value
+    # anything else is returned as a copy that the caller can change
+    return _thaw(localized_value)
 
 
 def localize_by_language_order(multi_language_field, default=""):
@@ -114,3 +235,26 @@ def strip_accents(s):
     return "".join(
         c for c in unicodedata.normalize("NFD", s) if unicodedata.category(c) != "Mn"
     )
+
+
+@lru_cache(maxsize=None)
+def _get_collator(lang_code):
+    return icu.Collator.createInstance(icu.Locale(lang_code))
+
+
+@lru_cache(maxsize=COLLATION_KEY_CACHE_SIZE)
+def get_collation_key(s, lang_code=None):
+    """Return a key to sort strings in the given language. The keys are cached,
+    as the same titles are sorted over and over.
+
+    If PyICU is installed, the key is the sort key of the locale's collator.
+    Otherwise, the string is lowercased and its accents are stripped. Only
+    keys for the same language can be compared with each other.
+    """
+    if icu is not None and lang_code:
+        return _get_collator(lang_code).getSortKey(s)
+    return strip_accents(s.lower())
+
+
+def collation_key_cache_info():
+    return get_collation_key.cache_info()
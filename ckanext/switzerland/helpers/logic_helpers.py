@@ -4,23 +4,109 @@ helpers for the plugin logic
 
 import ckan.plugins.toolkit as tk
 from ckan import model as model
+from ckan.lib import datapreview
+from ckan.lib.search.query import solr_literal
+from ckan.model.types import make_uuid
+
+import ckanext.switzerland.helpers.cache_utils as ogdch_cache_utils
+import ckanext.switzerland.helpers.request_utils as ogdch_request_utils
+import ckanext.switzerland.helpers.solr_utils as ogdch_solr_utils
+
+COUNTS_CACHE_KEY = "counts"
+
+
+def get_counts_cache():
+    return ogdch_cache_utils.get_cache(
+        "ogdch_counts", ttl=tk.config.get("ckanext.switzerland.counts_cache_ttl")
+    )
+
+
+def invalidate_counts_cache():
+    """Drop the cached result of ogdch_counts, e.g. after a dataset, group or
+    organization has been created, changed or deleted.
+    """
+    ogdch_cache_utils.invalidate_after_commit(_delete_counts)
+
+
+def _delete_counts():
+    get_counts_cache().delete(COUNTS_CACHE_KEY)
 
 
 def get_org_count():
-    user = tk.get_action("get_site_user")({"ignore_auth": True}, {})
-    req_context = {"user": user["name"]}
-    orgs = tk.get_action("organization_list")(req_context, {})
-    return len(orgs)
+    """Count the active organizations (including all levels of the hierarchy)"""
+    return (
+        model.Session.query(model.Group.id)
+        .filter(model.Group.is_organization.is_(True))
+        .filter(model.Group.type == "organization")
+        .filter(model.Group.state == "active")
+        .count()
+    )
+
+
+def get_dataset_and_group_counts():
+    """Get the number of datasets per dataset type and per group from a
+    single Solr request.
+
+    The numbers per dataset type match package_search, i.e. only public
+    datasets are counted. The numbers per group match the package_count of
+    group_list, which includes private datasets: the capacity filter is
+    excluded when faceting on groups.
+    """
+    site_id = solr_literal(tk.config.get("ckan.site_id"))
+    results = ogdch_solr_utils.get_connection().search(
+        "*:*",
+        fq=[
+            f"+site_id:{site_id}",
+            "+state:active",
+            "{!tag=capacity}+capacity:public",
+        ],
+        rows=0,
+        facet="true",
+        **{
+            "facet.field": ["dataset_type", "{!ex=capacity}groups"],
+            "facet.limit": -1,
+            "facet.mincount": 1,
+        },
+    )
+    facet_fields = results.facets["facet_fields"]
+
+    def to_dict(facet_list):
+        # Solr returns facets as a flat list: [value, count, value, count...]
+        return dict(zip(facet_list[::2], facet_list[1::2]))
+
+    return to_dict(facet_fields["dataset_type"]), to_dict(facet_fields["groups"])
 
 
 def get_dataset_count(dataset_type="dataset"):
-    user = tk.get_action("get_site_user")({"ignore_auth": True}, {})
+    user = ogdch_request_utils.get_site_user()
     req_context = {"user": user["name"]}
     fq = f"+dataset_type:{dataset_type}"
     packages = tk.get_action("package_search")(req_context, {"fq": fq})
     return packages["count"]
 
 
+def get_resource_ids_with_views(resource_ids):
+    """Return the ids of those resources that have at least one view, whose
+    view plugin is enabled. This gives the same result as calling
+    resource_view_list for every resource, but with a single query.
+    """
+    if not resource_ids:
+        return set()
+
+    views = (
+        model.Session.query(
+            model.ResourceView.resource_id, model.ResourceView.view_type
+        )
+        .filter(model.ResourceView.resource_id.in_(resource_ids))
+        .distinct()
+    )
+    return {
+        resource_id
+        for resource_id, view_type in views
+        if datapreview.get_view_plugin(view_type)
+    }
+
+
 def get_showcases_for_dataset(id):
     """
     Return a list of showcases a dataset is associated with
@@ -49,3 +135,102 @@ def map_existing_resources_to_new_dataset(new_dataset, existing_dataset):
         res_uri = resource.get("uri")
         if res_uri and res_uri in resource_mapping:
             resource["id"] = resource_mapping[res_uri]
+
+
+def _get_group_ids(group_id=None):
+    if group_id:
+        group = model.Group.get(group_id)
+        if group is None or group.is_organization:
+            raise tk.ObjectNotFound("Group was not found.")
+        return [group.id]
+
+    groups = (
+        model.Session.query(model.Group.id)
+        .filter(model.Group.is_organization.is_(False))
+        .filter(model.Group.type == "group")
+        .filter(model.Group.state == "active")
+    )
+    return [group_id for group_id, in groups]
+
+
+def _get_user_ids(user_id=None):
+    if user_id:
+        user = model.User.get(user_id)
+        if user is None:
+            raise tk.ObjectNotFound("User was not found.")
+        return [user.id]
+
+    users = (
+        model.Session.query(model.User.id)
+        .filter(model.User.state != "deleted")
+        .filter(model.User.sysadmin.is_(False))
+    )
+    return [user_id for user_id, in users]
+
+
+def add_users_to_groups(user_id=None, group_id=None):
+    """Make the user with user_id, or all users that are not sysadmins,
+    members of the group with group_id, or of all groups. Returns the number
+    of memberships that were added.
+
+    The memberships of the users are loaded with one query, and only the
+    missing ones are added, with one insert. Existing memberships are not
+    changed, so that group admins and editors keep their role. Memberships
+    that were removed are activated again.
+    """
+    user_ids = _get_user_ids(user_id)
+    group_ids = _get_group_ids(group_id)
+    if not user_ids or not group_ids:
+        return 0
+
+    memberships = (
+        model.Session.query(
+            model.Member.id,
+            model.Member.table_id,
+            model.Member.group_id,
+            model.Member.state,
+        )
+        .filter(model.Member.table_name == "user")
+        .filter(model.Member.group_id.in_(group_ids))
+    )
+    if user_id:
+        memberships = memberships.filter(model.Member.table_id.in_(user_ids))
+
+    active = set()
+    removed = {}
+    for member_id, member_user_id, member_group_id, state in memberships:
+        if state == "active":
+            active.add((member_user_id, member_group_id))
+        else:
+            removed[(member_user_id, member_group_id)] = member_id
+
+    missing = {
+        (member_user_id, member_group_id)
+        for member_user_id in user_ids
+        for member_group_id in group_ids
+    } - active
+    if not missing:
+        return 0
+
+    removed_ids = [removed[pair] for pair in missing if pair in removed]
+    if removed_ids:
+        model.Session.query(model.Member).filter(
+            model.Member.id.in_(removed_ids)
+        ).update({"state": "active", "capacity": "member"}, synchronize_session=False)
+    new_memberships = [
+        {
+            "id": make_uuid(),
+            "table_name": "user",
+            "table_id": member_user_id,
+            "group_id": member_group_id,
+            "capacity": "member",
+            "state": "active",
+        }
+        for member_user_id, member_group_id in missing
+        if (member_user_id, member_group_id) not in removed
+    ]
+    if new_memberships:
+        model.Session.execute(model.member_table.insert(), new_memberships)
+    model.Session.commit()
+
+    return len(missing)
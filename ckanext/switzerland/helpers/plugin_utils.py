@@ -2,13 +2,17 @@
 helpers of the plugins.py
 """
 
+import copy
 import json
 import logging
 import re
 
+import ckan.model as model
 import ckan.plugins.toolkit as tk
 from ckan.lib.munge import munge_title_to_name
+from sqlalchemy import event
 
+import ckanext.switzerland.helpers.cache_utils as ogdch_cache_utils
 import ckanext.switzerland.helpers.date_helpers as ogdch_date_utils
 import ckanext.switzerland.helpers.format_utils as ogdch_format_utils
 import ckanext.switzerland.helpers.localize_utils as ogdch_loc_utils
@@ -76,9 +80,6 @@ def ogdch_prepare_search_data_for_index(search_data):
     _prepare_resource_fields_for_indexing(search_data, validated_dict)
     _prepare_lang_specific_fields_for_indexing(search_data, validated_dict)
 
-    search_data["linked_data"] = ogdch_format_utils.prepare_formats_for_index(
-        resources=validated_dict["resources"], linked_data_only=True
-    )
     search_data["title_string"] = ogdch_loc_utils.lang_to_string(
         validated_dict, "title"
     )
@@ -123,6 +124,15 @@ def ogdch_prepare_search_data_for_index(search_data):
     return search_data
 
 
+def ogdch_prepare_search_data_for_index_batch(search_data_list):
+    """Prepare an iterable of datasets for indexing, e.g. during a full
+    rebuild of the search index. The datasets are processed lazily, so the
+    whole batch never has to be held in memory at once.
+    """
+    for search_data in search_data_list:
+        yield ogdch_prepare_search_data_for_index(search_data)
+
+
 def _flatten_fluent_fields_for_indexing(search_data):
     # Fix for Solr 9.x compatibility: Remove any remaining fluent fields
     # that have not been flattened to prevent Solr from interpreting
@@ -149,14 +159,10 @@ def _flatten_fluent_fields_for_indexing(search_data):
 
 def _prepare_lang_specific_fields_for_indexing(search_data, validated_dict):
     for lang_code in ogdch_loc_utils.get_language_priorities():
-        search_data[f"title_{lang_code}"] = (
-            ogdch_loc_utils.get_localized_value_from_dict(
-                validated_dict["title"], lang_code
-            )
-        )
         title = ogdch_loc_utils.get_localized_value_from_dict(
             validated_dict["title"], lang_code
         )
+        search_data[f"title_{lang_code}"] = title
         if not isinstance(title, str):
             title = ""
             log.info(
@@ -186,45 +192,57 @@ def _prepare_lang_specific_fields_for_indexing(search_data, validated_dict):
 
 
 def _prepare_resource_fields_for_indexing(search_data, validated_dict):
-    search_data["res_name"] = [
-        ogdch_loc_utils.lang_to_string(r, "title") for r in validated_dict["resources"]
-    ]
-
-    search_data["res_description"] = [
-        ogdch_loc_utils.lang_to_string(r, "description")
-        for r in validated_dict["resources"]
-    ]
-
-    for lang_code in ogdch_loc_utils.get_language_priorities():
-        search_data[f"res_name_{lang_code}"] = [
-            ogdch_loc_utils.get_localized_value_from_dict(r["title"], lang_code)
-            for r in validated_dict["resources"]
-        ]
-        search_data[f"res_description_{lang_code}"] = [
-            ogdch_loc_utils.get_localized_value_from_dict(r["description"], lang_code)
-            for r in validated_dict["resources"]
-        ]
+    """Compute all resource-derived search fields in a single pass over the
+    resources of the dataset.
+    """
+    lang_codes = ogdch_loc_utils.get_language_priorities()
+    res_name = []
+    res_description = []
+    res_name_by_lang = {lang_code: [] for lang_code in lang_codes}
+    res_description_by_lang = {lang_code: [] for lang_code in lang_codes}
+    res_format = set()
+    linked_data = set()
+    res_license = []
+    res_issued = []
+    res_modified = []
+
+    for resource in validated_dict["resources"]:
+        res_name.append(ogdch_loc_utils.lang_to_string(resource, "title"))
+        res_description.append(ogdch_loc_utils.lang_to_string(resource, "description"))
+        for lang_code in lang_codes:
+            res_name_by_lang[lang_code].append(
+                ogdch_loc_utils.get_localized_value_from_dict(
+                    resource["title"], lang_code
+                )
+            )
+            res_description_by_lang[lang_code].append(
+                ogdch_loc_utils.get_localized_value_from_dict(
+                    resource["description"], lang_code
+                )
+            )
 
-    search_data["res_format"] = ogdch_format_utils.prepare_formats_for_index(
-        resources=validated_dict["resources"]
-    )
-    search_data["res_license"] = [
-        ogdch_term_utils.get_resource_terms_of_use(r)
-        for r in validated_dict["resources"]
-    ]
-    search_data["res_latest_issued"] = ogdch_date_utils.get_latest_isodate(
-        [
-            (r["issued"])
-            for r in validated_dict["resources"]
-            if "issued" in list(r.keys())
-        ]
-    )
+        resource_format = ogdch_format_utils.prepare_resource_format(resource)["format"]
+        res_format.add(resource_format or "N/A")
+        if resource_format in ogdch_format_utils.LINKED_DATA_FORMATS:
+            linked_data.add(resource_format)
+
+        res_license.append(ogdch_term_utils.get_resource_terms_of_use(resource))
+        if "issued" in resource:
+            res_issued.append(resource["issued"])
+        if "modified" in resource:
+            res_modified.append(resource["modified"])
+
+    search_data["res_name"] = res_name
+    search_data["res_description"] = res_description
+    for lang_code in lang_codes:
+        search_data[f"res_name_{lang_code}"] = res_name_by_lang[lang_code]
+        search_data[f"res_description_{lang_code}"] = res_description_by_lang[lang_code]
+    search_data["res_format"] = list(res_format)
+    search_data["linked_data"] = list(linked_data)
+    search_data["res_license"] = res_license
+    search_data["res_latest_issued"] = ogdch_date_utils.get_latest_isodate(res_issued)
     search_data["res_latest_modified"] = ogdch_date_utils.get_latest_isodate(
-        [
-            (r["modified"])
-            for r in validated_dict["resources"]
-            if "modified" in list(r.keys())
-        ]
+        res_modified
     )
 
 
@@ -286,18 +304,77 @@ def ogdch_prepare_pkg_dict_for_api(pkg_dict):
     # load organization from API to get all fields defined in schema
     # by default, CKAN loads organizations only from the database
     if pkg_dict["owner_org"] is not None:
-        pkg_dict["organization"] = tk.get_action("organization_show")(
-            {},
+        pkg_dict["organization"] = get_organization(pkg_dict["owner_org"])
+
+    if ogdch_request_utils.request_is_api_request():
+        _transform_publisher(pkg_dict)
+    return pkg_dict
+
+
+def get_organization_cache():
+    # Cached organizations are only used by the process that loaded them, so
+    # that invalidating them takes effect immediately for that process.
+    return ogdch_cache_utils.get_cache(
+        "organization_show",
+        ttl=tk.config.get("ckanext.switzerland.organization_cache_ttl"),
+        backend=ogdch_cache_utils.BACKEND_MEMORY,
+    )
+
+
+def invalidate_organization_cache(org_id=None):
+    """Drop the cached organization, or all cached organizations if no id is
+    given, e.g. after an organization has been changed.
+    """
+    ogdch_cache_utils.invalidate_after_commit(_delete_organization, org_id)
+
+
+def _delete_organization(org_id):
+    if org_id is None:
+        get_organization_cache().clear()
+    else:
+        get_organization_cache().delete(org_id)
+
+
+@event.listens_for(model.Package.owner_org, "set", active_history=True)
+def _invalidate_previous_organization(target, value, oldvalue, initiator):
+    # When a dataset is moved to another organization, after_dataset_update
+    # only gets the new one, but the package_count of both has changed.
+    if isinstance(oldvalue, str) and oldvalue != value:
+        invalidate_organization_cache(oldvalue)
+
+
+def get_organization(org_id):
+    """Get an organization with all fields defined in the schema. The result
+    of organization_show is cached, as datasets are often shown many times in
+    a row for the same few organizations, e.g. in search results or while
+    indexing. Within a request, it is reused even if the cache is disabled.
+    """
+    organization = ogdch_request_utils.get_request_cached(
+        ("organization_show", org_id),
+        lambda: _get_cached_organization(org_id),
+    )
+    # every dataset gets its own copy, as the dataset dict may be changed
+    return copy.deepcopy(organization)
+
+
+def _get_cached_organization(org_id):
+    cache = get_organization_cache()
+    organization = cache.get(org_id)
+    if organization is None:
+        # The organization is shown as an anonymous user would see it, as
+        # it is cached for all users. Otherwise the package_count would
+        # include private datasets if a member of the organization filled
+        # the cache.
+        organization = tk.get_action("organization_show")(
+            {"user": ""},
             {
-                "id": pkg_dict["owner_org"],
+                "id": org_id,
                 "include_users": False,
                 "include_followers": False,
             },
         )
-
-    if ogdch_request_utils.request_is_api_request():
-        _transform_publisher(pkg_dict)
-    return pkg_dict
+        cache.set(org_id, organization)
+    return organization
 
 
 def ogdch_adjust_search_params(search_params):
@@ -0,0 +1,136 @@
+"""
+Sliding window rate limits, e.g. for API calls with the same email address.
+The backend is set with ckanext.switzerland.api_limit_backend:
+
+- memory: the calls are counted per process. With several worker processes,
+  every process allows the full number of calls.
+- redis: the calls are counted by all processes together, using the Redis
+  instance that CKAN is already configured with.
+
+A limiter only remembers the last limit + 1 calls per key, which is enough to
+tell whether the limit is exceeded. The cost of a call does not depend on how
+many calls were made before, and the memory it needs is bounded.
+"""
+
+import logging
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+
+import ckan.plugins.toolkit as tk
+from ckan.lib.redis import connect_to_redis
+from redis.exceptions import RedisError
+
+log = logging.getLogger(__name__)
+
+BACKEND_MEMORY = "memory"
+BACKEND_REDIS = "redis"
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+class MemoryRateLimiter:
+    """A thread-safe rate limiter that keeps the times of the recent calls
+    per key in a deque, for at most max_keys keys. When there are more, the
+    key that was used least recently is dropped.
+    """
+
+    def __init__(self, namespace, limit, interval, max_keys=10000):
+        self.namespace = namespace
+        self.limit = limit
+        self.interval = interval
+        self.max_keys = max_keys
+        self._calls = OrderedDict()
+        self._lock = threading.Lock()
+
+    def hit(self, key):
+        """Count a call for the key and return the number of calls in the
+        current interval, including this one, up to limit + 1.
+        """
+        now = time.monotonic()
+        with self._lock:
+            calls = self._calls.get(key)
+            if calls is None:
+                calls = self._calls[key] = deque(maxlen=self.limit + 1)
+            else:
+                self._calls.move_to_end(key)
+
+            while calls and calls[0] <= now - self.interval:
+                calls.popleft()
+            calls.append(now)
+
+            while len(self._calls) > self.max_keys:
+                self._calls.popitem(last=False)
+
+            return len(calls)
+
+    def clear(self):
+        with self._lock:
+            self._calls.clear()
+
+
+class RedisRateLimiter:
+    """A rate limiter that keeps the times of the recent calls per key in a
+    sorted set in Redis, shared by all CKAN processes. The sets expire after
+    the interval. If Redis is not available, calls are not limited.
+    """
+
+    def __init__(self, namespace, limit, interval):
+        self.namespace = namespace
+        self.limit = limit
+        self.interval = interval
+        site_id = tk.config.get("ckan.site_id")
+        self._prefix = f"ckanext-switzerland:{site_id}:ratelimit:{namespace}"
+
+    def hit(self, key):
+        """Count a call for the key and return the number of calls in the
+        current interval, including this one, up to limit + 1.
+        """
+        now = time.time()
+        redis_key = f"{self._prefix}:{key}"
+        try:
+            pipeline = connect_to_redis().pipeline()
+            pipeline.zremrangebyscore(redis_key, "-inf", now - self.interval)
+            pipeline.zadd(redis_key, {f"{now}:{uuid.uuid4().hex}": now})
+            pipeline.zremrangebyrank(redis_key, 0, -(self.limit + 2))
+            pipeline.zcard(redis_key)
+            pipeline.pexpire(redis_key, int(self.interval * 1000) + 1)
+            return pipeline.execute()[3]
+        except RedisError as e:
+            log.warning(f"Could not count call for {key} in {self.namespace}: {e}")
+            return 0
+
+    def clear(self):
+        try:
+            redis = connect_to_redis()
+            keys = list(redis.scan_iter(f"{self._prefix}:*"))
+            if keys:
+                redis.delete(*keys)
+        except RedisError as e:
+            log.warning(f"Could not clear rate limits of {self.namespace}: {e}")
+
+
+def get_rate_limiter(namespace, limit, interval, backend=None):
+    """Return the rate limiter for the namespace that allows limit calls per
+    interval (in seconds) and key, using the given backend or the configured
+    one.
+    """
+    if backend is None:
+        backend = tk.config.get("ckanext.switzerland.api_limit_backend")
+    if backend == BACKEND_REDIS:
+        limiter_class = RedisRateLimiter
+    else:
+        limiter_class = MemoryRateLimiter
+
+    with _limiters_lock:
+        limiter = _limiters.get(namespace)
+        if (
+            type(limiter) is not limiter_class
+            or limiter.limit != limit
+            or limiter.interval != interval
+        ):
+            limiter = limiter_class(namespace, limit, interval)
+            _limiters[namespace] = limiter
+    return limiter
@@ -1,7 +1,12 @@
 """utils used for requests"""
 
+import contextvars
+from contextlib import contextmanager
+
 import ckan.plugins.toolkit as tk
 
+_job_cache = contextvars.ContextVar("ogdch_job_cache", default=None)
+
 
 def get_current_language():
     """If we are in a request context, get the request language
@@ -37,3 +42,80 @@ def request_is_api_request():
     except (RuntimeError, TypeError):
         # we get here if there is no request (i.e. on the command line)
         return False
+
+
+def _get_request_cache():
+    """Return the cache of the current request, or of the current job if it
+    runs inside job_cache(). Outside of both, there is no cache.
+    """
+    try:
+        cache = getattr(tk.g, "ogdch_request_cache", None)
+        if cache is None:
+            cache = tk.g.ogdch_request_cache = {}
+        return cache
+    except (RuntimeError, TypeError):
+        # we get here if there is no app context (i.e. on the command line or
+        # in a background job)
+        return _job_cache.get()
+
+
+def get_request_cached(key, factory):
+    """Return the value cached under key for the current request or job.
+    If there is none yet, it is created by calling factory. Outside of a
+    request or job_cache(), factory is called every time.
+    """
+    cache = _get_request_cache()
+    if cache is None:
+        return factory()
+    if key not in cache:
+        cache[key] = factory()
+    return cache[key]
+
+
+@contextmanager
+def job_cache():
+    """Use a fresh request cache for the code running inside this context,
+    e.g. a background job. The cache is dropped when the context is left.
+    """
+    token = _job_cache.set({})
+    try:
+        yield
+    finally:
+        _job_cache.reset(token)
+
+
+def clear_request_cache():
+    """Drop all values cached for the current request or job"""
+    cache = _get_request_cache()
+    if cache is not None:
+        cache.clear()
+
+
+def get_site_user():
+    """Get the site user once per request or job, instead of querying the
+    database for every action that runs as the site user.
+    """
+    return get_request_cached(
+        "site_user",
+        lambda: tk.get_action("get_site_user")({"ignore_auth": True}, {}),
+    )
+
+
+def get_client_ip():
+    """Return the ip address of the client of the current request, or None if
+    there is no request. If CKAN runs behind ckanext.switzerland.
+    trusted_proxy_count reverse proxies, the address that the outermost one
+    added to the X-Forwarded-For header is used. Addresses that clients sent
+    in the header themselves are ignored.
+    """
+    try:
+        remote_addr = tk.request.remote_addr
+        forwarded_for = tk.request.headers.get("X-Forwarded-For", "")
+    except (RuntimeError, TypeError, AttributeError):
+        # we get here if there is no request (i.e. on the command line)
+        return None
+
+    route = [addr.strip() for addr in forwarded_for.split(",") if addr.strip()]
+    route.append(remote_addr)
+    proxy_count = int(tk.config.get("ckanext.switzerland.trusted_proxy_count") or 0)
+    return route[max(0, len(route) - 1 - proxy_count)]
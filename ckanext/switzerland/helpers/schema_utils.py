@@ -0,0 +1,120 @@
+"""
+Registry of the fields that the scheming schemas declare as multilingual or
+json fields, i.e. fields whose values are stored as json strings. It is built
+from the schemas the first time it is used, so that values only need to be
+parsed from json if their field holds json.
+"""
+
+import ckanext.switzerland.helpers.localize_utils as ogdch_loc_utils
+from ckanext.scheming.helpers import (
+    scheming_get_dataset_schema,
+    scheming_get_group_schema,
+    scheming_get_organization_schema,
+)
+
+# Validators that store the value of a field as json
+JSON_VALIDATORS = {
+    "fluent_text",
+    "fluent_tags",
+    "ogdch_fluent_tags",
+    "harvest_list_of_dicts",
+    "multiple_text",
+    "scheming_multiple_choice",
+    "ogdch_language",
+    "ogdch_validate_temporals",
+}
+# Output validators that turn the stored json back into a python structure
+JSON_OUTPUT_VALIDATORS = {
+    "fluent_core_translated_output",
+    "fluent_tags_output",
+    "multilingual_text_output",
+    "multiple_text_output",
+    "scheming_multiple_choice_output",
+    "temporals_display",
+}
+
+_registry = {}
+
+
+def _get_validator_names(validators):
+    return {validator.split("(")[0] for validator in validators.split()}
+
+
+def get_json_fields(fields):
+    """Return a dict that maps the names of a list of (expanded) scheming
+    fields to whether they hold json, or None if there are no fields because
+    there is no schema.
+    """
+    if fields is None:
+        return None
+
+    json_fields = {}
+    for field in fields:
+        validators = _get_validator_names(field.get("validators", ""))
+        output_validators = _get_validator_names(field.get("output_validators", ""))
+        json_fields[field["field_name"]] = bool(
+            validators & JSON_VALIDATORS or output_validators & JSON_OUTPUT_VALIDATORS
+        )
+    return json_fields
+
+
+def _get_registered(key, schema, build):
+    """Build the registry entry for a schema once, and rebuild it only if the
+    schema is replaced, e.g. when the plugins are reloaded.
+    """
+    registered = _registry.get(key)
+    if registered is not None and registered[0] is schema:
+        return registered[1]
+    value = build(schema)
+    _registry[key] = (schema, value)
+    return value
+
+
+def _get_schema_json_fields(key, schema, section):
+    return _get_registered(
+        key,
+        schema,
+        lambda schema: get_json_fields(schema.get(section) if schema else None),
+    )
+
+
+def get_dataset_json_fields(dataset_type="dataset"):
+    return _get_schema_json_fields(
+        ("dataset", dataset_type),
+        scheming_get_dataset_schema(dataset_type),
+        "dataset_fields",
+    )
+
+
+def get_resource_json_fields(dataset_type="dataset"):
+    return _get_schema_json_fields(
+        ("resource", dataset_type),
+        scheming_get_dataset_schema(dataset_type),
+        "resource_fields",
+    )
+
+
+def get_group_json_fields(group_type="group"):
+    return _get_schema_json_fields(
+        ("group", group_type), scheming_get_group_schema(group_type), "fields"
+    )
+
+
+def get_organization_json_fields(organization_type="organization"):
+    return _get_schema_json_fields(
+        ("organization", organization_type),
+        scheming_get_organization_schema(organization_type),
+        "fields",
+    )
+
+
+def get_dataset_localizer(dataset_type):
+    """Return a DatasetLocalizer for the dataset type, which only parses the
+    json fields of the dataset, resource, group and organization schemas.
+    """
+    return ogdch_loc_utils.DatasetLocalizer(
+        dataset_fields=get_dataset_json_fields(dataset_type),
+        resource_fields=get_resource_json_fields(dataset_type),
+        group_fields=get_group_json_fields(),
+        organization_fields=get_organization_json_fields(),
+    )
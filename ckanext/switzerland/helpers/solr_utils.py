@@ -0,0 +1,201 @@
+"""
+A Solr connection that is shared by the ogdch code that queries Solr directly.
+
+ckan.lib.search.common.make_connection() creates a new pysolr.Solr client, and
+with it a new http session, on every call. The connection returned here is
+created once per process. Its session keeps a pool of http connections open
+between requests, which is shared by all threads, and retries requests that
+failed because Solr was not reachable or not available for a moment. The
+timeouts, pool size and retries are set with:
+
+- ckanext.switzerland.solr_connect_timeout and solr_timeout (CKAN core)
+- ckanext.switzerland.solr_pool_size
+- ckanext.switzerland.solr_retries and ckanext.switzerland.solr_retry_backoff
+"""
+
+import os
+import threading
+from contextlib import contextmanager
+
+import ckan.lib.search.index as search_index
+import ckan.plugins.toolkit as tk
+import requests
+from ckan.lib.search import commit
+from ckan.lib.search.common import SolrSettings, make_connection
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+RETRY_STATUS_CODES = (502, 503, 504)
+DEFAULT_INDEX_BATCH_SIZE = 100
+
+_connection = None
+_connection_key = None
+_connection_lock = threading.Lock()
+
+
+def _get_settings():
+    return (
+        SolrSettings.get(),
+        tk.config.get("ckanext.switzerland.solr_connect_timeout"),
+        tk.config.get("solr_timeout"),
+        tk.config.get("ckanext.switzerland.solr_pool_size"),
+        tk.config.get("ckanext.switzerland.solr_retries"),
+        float(tk.config.get("ckanext.switzerland.solr_retry_backoff")),
+    )
+
+
+def _make_session(pool_size, retries, retry_backoff):
+    # Only idempotent requests are retried. pysolr sends searches as GET
+    # requests, unless the query is too long for the url.
+    retry = Retry(
+        total=retries,
+        backoff_factor=retry_backoff,
+        status_forcelist=RETRY_STATUS_CODES,
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=retry)
+    session = requests.Session()
+    session.stream = False
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def get_connection():
+    """Return the Solr connection of this process. A new one is made when the
+    Solr settings have changed, e.g. in tests, and in forked processes, which
+    must not share open http connections with their parent.
+    """
+    global _connection, _connection_key
+
+    settings = _get_settings()
+    key = (os.getpid(), settings)
+    with _connection_lock:
+        if _connection is None or _connection_key != key:
+            _, connect_timeout, read_timeout, pool_size, retries, backoff = settings
+            connection = make_connection()
+            connection.timeout = (connect_timeout, read_timeout)
+            connection.session = _make_session(pool_size, retries, backoff)
+            connection.session.verify = connection.verify
+            _connection = connection
+            _connection_key = key
+        return _connection
+
+
+def reset_connection():
+    """Close the connection of this process, so that the next call to
+    get_connection() makes a new one.
+    """
+    global _connection, _connection_key
+
+    with _connection_lock:
+        if _connection is not None and _connection_key[0] == os.getpid():
+            _connection.session.close()
+        _connection = None
+        _connection_key = None
+
+
+def get_connection_stats():
+    """Return how many requests the connection of this process has sent to
+    Solr, how many http connections it opened for them and how many requests
+    reused an open connection.
+    """
+    with _connection_lock:
+        connection = _connection
+    requests_count = 0
+    connections_count = 0
+    if connection is not None:
+        adapter = connection.session.get_adapter(connection.url)
+        pools = adapter.poolmanager.pools
+        for pool_key in pools.keys():
+            pool = pools.get(pool_key)
+            if pool is not None:
+                requests_count += pool.num_requests
+                connections_count += pool.num_connections
+
+    return {
+        "requests": requests_count,
+        "connections": connections_count,
+        "reused": requests_count - connections_count,
+    }
+
+
+class BatchingSolrConnection:
+    """Stands in for the Solr connection that CKAN's PackageSearchIndex uses.
+    Documents are collected and sent to Solr in batches, instead of making one
+    request per dataset. Committing is left to the caller. Documents can be
+    added from several threads.
+    """
+
+    def __init__(self, batch_size):
+        self.batch_size = batch_size
+        self._pending = []
+        self._lock = threading.Lock()
+        self.flush_failed = False
+        self.connection = get_connection()
+        self.url = self.connection.url
+
+    def __call__(self):
+        # PackageSearchIndex calls make_connection() for every dataset, so we
+        # hand out this instance instead of a new connection.
+        return self
+
+    def add(self, docs, commit=False, **kwargs):
+        with self._lock:
+            self._pending.extend(docs)
+
+    def pending_count(self):
+        with self._lock:
+            return len(self._pending)
+
+    def pending_ids(self):
+        """Return the ids of the documents that were not sent yet."""
+        with self._lock:
+            return [doc["id"] for doc in self._pending]
+
+    def flush(self):
+        """Send all pending documents to Solr and return how many were sent.
+        If Solr rejects them, they are kept until discard() is called.
+        """
+        with self._lock:
+            count = len(self._pending)
+            if count:
+                try:
+                    self.connection.add(docs=self._pending, commit=False)
+                except Exception:
+                    self.flush_failed = True
+                    raise
+                self._pending = []
+        return count
+
+    def discard(self):
+        """Drop all pending documents, e.g. after Solr rejected them."""
+        with self._lock:
+            self._pending = []
+            self.flush_failed = False
+
+    def __getattr__(self, name):
+        return getattr(self.connection, name)
+
+
+@contextmanager
+def deferred_indexing(batch_size=DEFAULT_INDEX_BATCH_SIZE):
+    """Collect the documents that CKAN indexes while the context is active,
+    instead of sending and committing each dataset on its own. The caller
+    sends them in batches by calling flush() on the yielded connection. When
+    the context is left, the remaining documents are sent and the index is
+    committed once. The documents of a failed flush() that were not
+    discarded are not sent again.
+    """
+    original_make_connection = search_index.make_connection
+    connection = BatchingSolrConnection(batch_size)
+    search_index.make_connection = connection
+    try:
+        yield connection
+    finally:
+        search_index.make_connection = original_make_connection
+        try:
+            if not connection.flush_failed:
+                connection.flush()
+        finally:
+            commit()
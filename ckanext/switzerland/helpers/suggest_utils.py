@@ -0,0 +1,184 @@
+"""
+Suggestions for the search field, loaded from the Solr suggesters and cached
+per language.
+
+The suggesters use the BlendedInfixLookupFactory with an analyzer that splits
+the text at whitespace, folds accents and lowercases it. A term is suggested
+for a query if every token of the query but the last one is a token of the
+term, and the last one is the beginning of a token of the term. When the query
+ends with a space, its last token has to be a token of the term as well.
+
+Because of that, the suggestions for a query are a subset of the suggestions
+for any beginning of it. Once Solr returned fewer suggestions for a query than
+were asked for, we know all of them, and the suggestions for the following
+keystrokes can be filtered from them without asking Solr again.
+"""
+
+import json
+import logging
+import re
+from functools import lru_cache
+
+import ckan.plugins.toolkit as tk
+from unidecode import unidecode
+
+import ckanext.switzerland.helpers.cache_utils as ogdch_cache_utils
+import ckanext.switzerland.helpers.solr_utils as ogdch_solr_utils
+
+log = logging.getLogger(__name__)
+
+SUGGEST_COUNT = 10
+HIGHLIGHT_TAGS = re.compile(r"</?b>")
+FOLD_CACHE_SIZE = 4096
+
+
+def normalize_query(q):
+    """Normalize a query the way the suggester analyzes it. A trailing space
+    is kept, because it changes which terms match.
+    """
+    tokens = unidecode(q).lower().split()
+    normalized_q = " ".join(tokens)
+    if tokens and q[-1].isspace():
+        normalized_q += " "
+    return normalized_q
+
+
+def matches_query(term, normalized_q):
+    """Whether the suggester suggests the term for the normalized query."""
+    term_tokens = unidecode(HIGHLIGHT_TAGS.sub("", term)).lower().split()
+    query_tokens = normalized_q.split()
+    if not query_tokens:
+        return False
+    if normalized_q.endswith(" "):
+        last_token = None
+    else:
+        last_token = query_tokens.pop()
+
+    if not all(token in term_tokens for token in query_tokens):
+        return False
+    if last_token is None:
+        return True
+    return any(token.startswith(last_token) for token in term_tokens)
+
+
+def get_suggestion_cache(lang):
+    return ogdch_cache_utils.get_cache(
+        f"autosuggest_{lang}",
+        ttl=tk.config.get("ckanext.switzerland.autosuggest_cache_ttl"),
+    )
+
+
+def _cache_key(normalized_q, fq):
+    return json.dumps([normalized_q, fq])
+
+
+def get_suggestions(q, lang, fq):
+    """Return the suggested terms for the query in the given language, for
+    datasets that match the filter query fq.
+
+    The terms are taken from the cache, filtered from the cached terms for a
+    beginning of the query or loaded from Solr, in that order.
+    """
+    normalized_q = normalize_query(q)
+    cache = get_suggestion_cache(lang)
+    key = _cache_key(normalized_q, fq)
+
+    suggestions = cache.get(key)
+    if suggestions is None:
+        suggestions = _derive_suggestions(cache, normalized_q, fq)
+        if suggestions is None:
+            suggestions = _load_suggestions(q, lang, fq)
+        cache.set(key, suggestions)
+
+    return suggestions["terms"]
+
+
+def _derive_suggestions(cache, normalized_q, fq):
+    """Filter the suggestions for the query from the cached suggestions for
+    the longest beginning of it, if we know all of them.
+    """
+    for end in range(len(normalized_q) - 1, 0, -1):
+        prefix = normalized_q[:end]
+        suggestions = cache.get(_cache_key(prefix, fq))
+        if suggestions is None or not suggestions["complete"]:
+            continue
+
+        log.debug(f"Filtering suggestions for {normalized_q} from {prefix}")
+        return {
+            # The highlighting of the shorter query does not apply any more
+            "terms": [
+                HIGHLIGHT_TAGS.sub("", term)
+                for term in suggestions["terms"]
+                if matches_query(term, normalized_q)
+            ],
+            "complete": True,
+        }
+
+    return None
+
+
+def _load_suggestions(q, lang, fq):
+    log.debug(f"Loading suggestions for {q} (lang: {lang}, fq: {fq})")
+    results = ogdch_solr_utils.get_connection().search(
+        "",
+        search_handler=f"/suggest_{lang}",
+        **{"suggest.q": q, "suggest.count": SUGGEST_COUNT, "suggest.cfq": fq},
+    )
+    suggester = results.raw_response["suggest"][f"ckanSuggester_{lang}"]
+    suggestions = list(suggester.values())[0]["suggestions"]
+
+    return {
+        "terms": [suggestion["term"] for suggestion in suggestions],
+        "complete": len(suggestions) < SUGGEST_COUNT,
+    }
+
+
+@lru_cache(maxsize=FOLD_CACHE_SIZE)
+def _fold_char(char):
+    return unidecode(char)
+
+
+@lru_cache(maxsize=FOLD_CACHE_SIZE)
+def fold_accents(text):
+    """Return the text with accents removed and other characters transliterated
+    to ascii, and for each character of the result the index of the character
+    of the text that it comes from.
+    """
+    if text.isascii():
+        return text, range(len(text))
+
+    folded_chars = [char if char.isascii() else _fold_char(char) for char in text]
+    folded = "".join(folded_chars)
+    # The lengths can match even if one character expands (ß -> ss) and
+    # another one is dropped (combining accents), so check every character.
+    if all(len(folded_char) == 1 for folded_char in folded_chars):
+        return folded, range(len(text))
+
+    offsets = []
+    for index, folded_char in enumerate(folded_chars):
+        offsets.extend([index] * len(folded_char))
+    return folded, tuple(offsets)
+
+
+class Highlighter:
+    """Highlights the first occurrence of the query in suggested terms,
+    ignoring case and accents. The query is folded and compiled once, so that
+    one instance can highlight all suggestions for it.
+    """
+
+    def __init__(self, q):
+        folded_q, _ = fold_accents(q)
+        self._pattern = re.compile(re.escape(folded_q), re.I)
+
+    def highlight(self, term):
+        # Terms that Solr already highlighted are returned as they are
+        if "<b>" in term:
+            return term
+        folded_term, offsets = fold_accents(term)
+        m = self._pattern.search(folded_term)
+        if m is None or m.start() == m.end():
+            return term
+
+        start = offsets[m.start()]
+        end = offsets[m.end() - 1] + 1
+        return f"{term[:start]}<b>{term[start:end]}</b>{term[end:]}"
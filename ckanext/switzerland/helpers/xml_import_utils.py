@@ -0,0 +1,474 @@
+"""
+Reading the datasets of an RDF/XML catalog one at a time, and creating or
+updating them, for the import of datasets from xml files.
+
+Parsing a whole catalog into one rdflib graph needs a lot of memory for large
+catalogs. Here, the file is read with iterparse instead, and every dcat:Dataset
+element is parsed into a graph of its own as soon as it has been read. Elements
+that were processed are dropped, so that only one dataset at a time is kept in
+memory.
+
+This requires that everything that belongs to a dataset (distributions, contact
+points etc.) is nested inside its element, as in the catalogs that the
+organizations export. The file is checked for that first, without building any
+graphs. Catalogs where datasets refer to nodes that are described elsewhere,
+e.g. flat RDF/XML or a publisher shared by several datasets, are parsed into
+one graph as a whole.
+"""
+
+import contextvars
+import logging
+import uuid
+import xml.etree.ElementTree as ET
+from concurrent.futures import ThreadPoolExecutor
+
+import ckan.lib.plugins as lib_plugins
+import ckan.model as model
+import ckan.plugins.toolkit as tk
+import rdflib
+
+import ckanext.switzerland.helpers.identifier_utils as ogdch_identifier_utils
+import ckanext.switzerland.helpers.request_utils as ogdch_request_utils
+from ckanext.dcatapchharvest.harvesters import SwissDCATRDFHarvester
+from ckanext.dcatapchharvest.profiles import SwissDCATAPProfile
+from ckanext.switzerland.helpers.logic_helpers import (
+    map_existing_resources_to_new_dataset,
+)
+
+log = logging.getLogger(__name__)
+
+DEFAULT_CHUNK_SIZE = 50
+
+RDF_NS = "http://www.w3.org/1999/02/22-rdf-syntax-ns#"
+DCAT_DATASET = "http://www.w3.org/ns/dcat#Dataset"
+
+_DATASET_TAG = "{http://www.w3.org/ns/dcat#}Dataset"
+_DESCRIPTION_TAG = f"{{{RDF_NS}}}Description"
+_RDF_TAG = f"{{{RDF_NS}}}RDF"
+_TYPE_TAG = f"{{{RDF_NS}}}type"
+_RESOURCE_ATTRIBUTE = f"{{{RDF_NS}}}resource"
+_ABOUT_ATTRIBUTE = f"{{{RDF_NS}}}about"
+_NODE_ID_ATTRIBUTE = f"{{{RDF_NS}}}nodeID"
+_PARSE_TYPE_ATTRIBUTE = f"{{{RDF_NS}}}parseType"
+
+# Kinds of elements in RDF/XML, which alternates between elements for nodes
+# and elements for their properties
+_NODE = "node"
+_PROPERTY = "property"
+_LITERAL = "literal"
+
+
+def _is_dataset(element):
+    if element.tag == _DATASET_TAG:
+        return True
+    if element.tag == _DESCRIPTION_TAG:
+        return any(
+            child.tag == _TYPE_TAG and child.get(_RESOURCE_ATTRIBUTE) == DCAT_DATASET
+            for child in element
+        )
+    return False
+
+
+def _parse_dataset_element(element):
+    """Parse a dataset element into a graph and return it with the reference
+    to the dataset in it.
+    """
+    root = ET.Element(f"{{{RDF_NS}}}RDF")
+    root.append(element)
+    graph = rdflib.Graph()
+    graph.parse(data=ET.tostring(root), format="xml")
+
+    dataset_refs = list(graph.subjects(rdflib.RDF.type, rdflib.URIRef(DCAT_DATASET)))
+    # Nested elements can be datasets as well, e.g. in dct:relation. The
+    # dataset that the element describes is the one no other subject refers to.
+    for dataset_ref in dataset_refs:
+        if not any(graph.subject_predicates(dataset_ref)):
+            return graph, dataset_ref
+    return graph, dataset_refs[0]
+
+
+def _new_node():
+    return {"is_dataset": False, "uri": None, "nodes": set(), "datasets": []}
+
+
+def _close_node(node, parent):
+    if node["is_dataset"]:
+        # Datasets nested in other datasets are part of them
+        for nested in node["datasets"]:
+            node["nodes"] |= nested["nodes"]
+        node["datasets"] = []
+        parent["datasets"].append(node)
+    else:
+        parent["nodes"] |= node["nodes"]
+        parent["datasets"].extend(node["datasets"])
+
+
+def _open_element(element, stack, outside):
+    """Add the element that iterparse started to the stack, and record the
+    node it describes or refers to.
+    """
+    if not stack:
+        kind = _PROPERTY if element.tag == _RDF_TAG else _NODE
+        parent_node = outside
+    else:
+        kind = stack[-1][0]
+        parent_node = stack[-1][1]
+
+    if kind == _LITERAL:
+        stack.append((_LITERAL, parent_node, kind, element))
+    elif kind == _NODE:
+        node = _new_node()
+        node["uri"] = element.get(_ABOUT_ATTRIBUTE)
+        node_id = element.get(_NODE_ID_ATTRIBUTE)
+        subject = node["uri"] or (node_id and f"_:{node_id}")
+        if subject:
+            node["nodes"].add(("described", subject))
+        node["is_dataset"] = element.tag == _DATASET_TAG
+        stack.append((_PROPERTY, node, kind, element))
+    else:
+        node_id = element.get(_NODE_ID_ATTRIBUTE)
+        resource = element.get(_RESOURCE_ATTRIBUTE)
+        reference = resource or (node_id and f"_:{node_id}")
+        if reference and parent_node is not outside:
+            parent_node["nodes"].add(("referenced", reference))
+        if element.tag == _TYPE_TAG and resource == DCAT_DATASET:
+            parent_node["is_dataset"] = True
+        parse_type = element.get(_PARSE_TYPE_ATTRIBUTE)
+        if parse_type == "Literal":
+            children_kind = _LITERAL
+        elif parse_type == "Resource":
+            children_kind = _PROPERTY
+        else:
+            children_kind = _NODE
+        stack.append((children_kind, parent_node, kind, element))
+
+
+def _are_self_contained(outside):
+    owners = {}
+    for _, subject in outside["nodes"]:
+        owners.setdefault(subject, set()).add(None)
+    for index, dataset in enumerate(outside["datasets"]):
+        for relation, subject in dataset["nodes"]:
+            if relation == "described":
+                owners.setdefault(subject, set()).add(index)
+
+    return all(
+        owners.get(subject, set()) <= {index}
+        for index, dataset in enumerate(outside["datasets"])
+        for _, subject in dataset["nodes"]
+    )
+
+
+def _scan_datasets(source):
+    """Read the RDF/XML catalog in source without building graphs. Return the
+    URIs of the datasets that are not nested in other datasets, in the order of
+    the file (None for blank nodes), and whether every one of them can be
+    parsed on its own: none of the nodes it describes or refers to may be
+    described outside of its element.
+    """
+    outside = _new_node()
+    # The kind of the children, the node that the element belongs to, the
+    # kind of the element and the element itself
+    stack = []
+    for event, element in ET.iterparse(source, events=("start", "end")):
+        if event == "start":
+            _open_element(element, stack, outside)
+            continue
+
+        _, node, kind, _ = stack.pop()
+        if kind == _NODE:
+            _close_node(node, stack[-1][1] if stack else outside)
+        element.clear()
+        if stack:
+            stack[-1][3].remove(element)
+
+    dataset_uris = [dataset["uri"] for dataset in outside["datasets"]]
+    return dataset_uris, _are_self_contained(outside)
+
+
+def _iter_whole_graph(source, dataset_uris):
+    graph = rdflib.Graph()
+    graph.parse(source, format="xml")
+
+    for uri in dataset_uris:
+        if uri is not None:
+            yield graph, rdflib.URIRef(uri)
+
+    if None in dataset_uris:
+        dataset_refs = set(graph.subjects(rdflib.RDF.type, rdflib.URIRef(DCAT_DATASET)))
+        for dataset_ref in dataset_refs:
+            if isinstance(dataset_ref, rdflib.BNode) and not any(
+                subject in dataset_refs
+                for subject, _ in graph.subject_predicates(dataset_ref)
+            ):
+                yield graph, dataset_ref
+
+
+def iter_datasets(source):
+    """Yield a graph and the reference to the dataset in it for every dataset
+    of the RDF/XML catalog in source, a file name or file object.
+
+    Raises xml.etree.ElementTree.ParseError if the file is not valid xml.
+    """
+    dataset_uris, self_contained = _scan_datasets(source)
+    if hasattr(source, "seek"):
+        source.seek(0)
+    if not self_contained:
+        log.info(
+            "The datasets of the catalog refer to nodes that are described "
+            "outside of them, parsing the whole catalog"
+        )
+        yield from _iter_whole_graph(source, dataset_uris)
+        return
+
+    parents = []
+    for event, element in ET.iterparse(source, events=("start", "end")):
+        if event == "start":
+            parents.append(element)
+            continue
+
+        parents.pop()
+        if not _is_dataset(element):
+            continue
+
+        # Datasets nested in other datasets are part of their graph
+        if any(_is_dataset(parent) for parent in parents):
+            continue
+
+        yield _parse_dataset_element(element)
+
+        element.clear()
+        if parents:
+            parents[-1].remove(element)
+
+
+def _chunks(iterable, size):
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+class DatasetImporter:
+    """Creates or updates the datasets of an xml import in an organization.
+
+    The datasets are handled in chunks. The existing datasets for all
+    identifiers of a chunk are looked up with one query of the identifier
+    index. Then the datasets are created or updated by a pool of threads, each
+    dataset in its own database transaction. The schemas are built once for
+    the whole import.
+
+    This is meant to be used inside solr_utils.deferred_indexing(): the search
+    index is updated in one batch after each chunk, and committed at the end.
+    If Solr rejects the batch of a chunk, its datasets are reported as failed,
+    as they are saved but can't be found, and the import goes on.
+    """
+
+    def __init__(self, org_id, workers, indexing_connection=None):
+        self.org_id = org_id
+        self.workers = workers
+        self.indexing_connection = indexing_connection
+        self.user_name = ogdch_request_utils.get_site_user()["name"]
+
+        package_plugin = lib_plugins.lookup_package_plugin("dataset")
+        self.create_schema = package_plugin.create_package_schema()
+        # We need to explicitly provide a package ID
+        self.create_schema["id"] = [tk.get_validator("unicode_safe")]
+        self.update_schema = package_plugin.update_package_schema()
+
+        self.harvester = SwissDCATRDFHarvester()
+        self._new_names = set()
+
+    def import_datasets(self, dataset_graphs, chunk_size=DEFAULT_CHUNK_SIZE):
+        """Import the datasets from an iterable of graphs and references to
+        the datasets in them, as returned by iter_datasets(). Yields the
+        status (created, updated or failed), name and a message for every
+        dataset, in the order of the file.
+        """
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            for chunk in _chunks(dataset_graphs, chunk_size):
+                datasets, results = self._import_chunk(executor, chunk)
+                if self.indexing_connection is not None:
+                    self._index_chunk(datasets, results)
+                yield from results
+
+    def _index_chunk(self, datasets, results):
+        """Send the search index documents of the datasets of a chunk to Solr.
+        If that fails, the results of the datasets are changed to failed.
+        """
+        try:
+            self.indexing_connection.flush()
+        except Exception as e:
+            log.error(f"Error while sending a batch of datasets to Solr: {repr(e)}")
+            not_indexed = set(self.indexing_connection.pending_ids())
+            self.indexing_connection.discard()
+            for index, dataset in datasets:
+                if (
+                    dataset.get("id") in not_indexed
+                    and results[index]["status"] != "failed"
+                ):
+                    results[index] = _failed(
+                        dataset,
+                        f"Dataset {dataset.get('name', '')} was saved, but could "
+                        f"not be added to the search index: {e}",
+                    )
+
+    def _import_chunk(self, executor, chunk):
+        results = [None] * len(chunk)
+        datasets = []
+        for index, (dataset_graph, dataset_ref) in enumerate(chunk):
+            dataset = {}
+            try:
+                SwissDCATAPProfile(dataset_graph).parse_dataset(dataset, dataset_ref)
+            except Exception as e:
+                results[index] = _failed(
+                    dataset, f"Error parsing dataset {dataset_ref}: {e}"
+                )
+                continue
+            dataset["owner_org"] = self.org_id
+            datasets.append((index, dataset))
+
+        first, repeated = _split_repeated_identifiers(datasets)
+        existing_ids = self._get_existing_ids(
+            dataset.get("identifier") for _, dataset in first
+        )
+        futures = [
+            (
+                index,
+                executor.submit(
+                    contextvars.copy_context().run,
+                    self._create_or_update_dataset,
+                    dataset,
+                    self._prepare(dataset, existing_ids),
+                ),
+            )
+            for index, dataset in first
+        ]
+        for index, future in futures:
+            results[index] = future.result()
+
+        # Datasets that are in the chunk twice are updated after the first one
+        # has been created.
+        for index, dataset in repeated:
+            existing_ids = self._get_existing_ids([dataset["identifier"]])
+            results[index] = self._create_or_update_dataset(
+                dataset, self._prepare(dataset, existing_ids)
+            )
+
+        return datasets, results
+
+    def _prepare(self, dataset, existing_ids):
+        """Return the id of the existing dataset for the dataset, or reserve a
+        name for it if there is none.
+        """
+        existing_id = existing_ids.get(dataset.get("identifier"))
+        if existing_id is None:
+            self._reserve_name(dataset)
+        return existing_id
+
+    def _get_existing_ids(self, identifiers):
+        """Return the ids of the existing datasets for the identifiers."""
+        return ogdch_identifier_utils.get_package_ids(
+            [identifier for identifier in identifiers if identifier],
+            include_private=True,
+            include_drafts=True,
+        )
+
+    def _reserve_name(self, dataset):
+        # Names are checked against the database, where the other new datasets
+        # of the chunk might not be yet.
+        name = self.harvester._gen_new_name(dataset.get("title", ""))
+        if name in self._new_names:
+            name = f"{name}-{uuid.uuid4().hex[:5]}"
+        self._new_names.add(name)
+        dataset["name"] = name
+
+    def _create_or_update_dataset(self, dataset, existing_id):
+        try:
+            if existing_id is None:
+                return self._create_dataset(dataset)
+            existing_dataset = tk.get_action("package_show")(
+                {"user": self.user_name}, {"id": existing_id}
+            )
+            return self._update_dataset(dataset, existing_dataset)
+        except tk.ValidationError as e:
+            model.Session.rollback()
+            return _failed(
+                dataset,
+                f"Error importing dataset {dataset.get('name', '')}: "
+                f"{e.error_summary!r}",
+            )
+        except Exception as e:
+            model.Session.rollback()
+            return _failed(
+                dataset, f"Error importing dataset {dataset.get('name', '')}: {e}"
+            )
+        finally:
+            # Each thread has its own database session
+            model.Session.remove()
+
+    def _create_dataset(self, dataset):
+        context = {
+            "user": self.user_name,
+            "schema": dict(self.create_schema),
+            "return_id_only": True,
+        }
+        dataset["id"] = str(uuid.uuid4())
+        # Create datasets as private initially
+        dataset["private"] = True
+
+        tk.get_action("package_create")(context, dataset)
+
+        return {
+            "status": "created",
+            "name": dataset["name"],
+            "message": f"Created dataset {dataset['name']}. "
+            f"The dataset visibility is private.",
+        }
+
+    def _update_dataset(self, dataset, existing_dataset):
+        context = {
+            "user": self.user_name,
+            "schema": dict(self.update_schema),
+            "return_id_only": True,
+        }
+        # Don't change the dataset name even if the title has changed
+        dataset["name"] = existing_dataset["name"]
+        dataset["id"] = existing_dataset["id"]
+        # Don't make a dataset public if it wasn't already
+        is_private = existing_dataset["private"]
+        dataset["private"] = is_private
+
+        map_existing_resources_to_new_dataset(dataset, existing_dataset)
+
+        tk.get_action("package_update")(context, dataset)
+
+        message = f"Updated dataset {dataset['name']}."
+        if is_private:
+            message += " The dataset visibility is private."
+
+        return {"status": "updated", "name": dataset["name"], "message": message}
+
+
+def _split_repeated_identifiers(datasets):
+    """Split the datasets into the first ones with each identifier, and the
+    ones with an identifier that occurred before.
+    """
+    first, repeated = [], []
+    seen = set()
+    for index, dataset in datasets:
+        identifier = dataset.get("identifier")
+        if identifier and identifier in seen:
+            repeated.append((index, dataset))
+        else:
+            first.append((index, dataset))
+            seen.add(identifier)
+    return first, repeated
+
+
+def _failed(dataset, message):
+    return {"status": "failed", "name": dataset.get("name", ""), "message": message}
@@ -2,21 +2,17 @@ import datetime
 import logging
 import os.path
 import random
-import re
 import string
-import uuid
 from collections import OrderedDict
 
 import ckan.lib.helpers as h
-import ckan.lib.plugins as lib_plugins
 import ckan.lib.uploader as uploader
 import ckan.plugins.toolkit as tk
 import pysolr
-import rdflib
-import rdflib.parser
-from ckan.lib import mailer
+import rq
+from ckan.lib import jobs, mailer
 from ckan.lib.munge import munge_title_to_name
-from ckan.lib.search.common import make_connection
+from ckan.lib.search.query import solr_literal
 from ckan.logic import (
     ActionError,
     NotAuthorized,
@@ -26,11 +22,12 @@ from ckan.logic import (
 )
 from ckan.logic.action.create import user_create as core_user_create
 from ckan.plugins.toolkit import config, get_or_bust, side_effect_free
-from rdflib.namespace import RDF, Namespace
-from unidecode import unidecode
 
-from ckanext.dcatapchharvest.harvesters import SwissDCATRDFHarvester
-from ckanext.dcatapchharvest.profiles import SwissDCATAPProfile
+import ckanext.switzerland.helpers.identifier_utils as ogdch_identifier_utils
+import ckanext.switzerland.helpers.request_utils as ogdch_request_utils
+import ckanext.switzerland.helpers.solr_utils as ogdch_solr_utils
+import ckanext.switzerland.helpers.suggest_utils as ogdch_suggest_utils
+import ckanext.switzerland.helpers.xml_import_utils as ogdch_xml_import_utils
 from ckanext.harvest.logic.dictization import harvest_job_dictize
 from ckanext.harvest.model import HarvestJob
 from ckanext.password_policy.helpers import custom_password_check, get_password_length
@@ -42,11 +39,15 @@ from ckanext.subscribe.action import (
 from ckanext.subscribe.email_auth import authenticate_with_code
 from ckanext.switzerland.helpers.backend_helpers import ogdch_get_switch_connectome_url
 from ckanext.switzerland.helpers.decorators import ratelimit
+from ckanext.switzerland.helpers.localize_utils import get_language_priorities
 from ckanext.switzerland.helpers.logic_helpers import (
-    get_dataset_count,
+    COUNTS_CACHE_KEY,
+    add_users_to_groups,
+    get_counts_cache,
+    get_dataset_and_group_counts,
     get_org_count,
+    get_resource_ids_with_views,
     get_showcases_for_dataset,
-    map_existing_resources_to_new_dataset,
 )
 from ckanext.switzerland.helpers.mail_helper import (
     send_registration_email,
@@ -62,8 +63,9 @@ RESULT_IDENTIFIER = "result"
 HARVEST_DATETIME_FORMAT = "%Y-%m-%d %H:%M:%S.%f"
 HARVEST_STATUS_RUNNING = "Running"
 
-DCAT = Namespace("http://www.w3.org/ns/dcat#")
 FIVE_MINUTES = 300
+RELATED_DATASETS_BATCH_SIZE = 100
+XML_IMPORT_RESULT_TTL = 7 * 24 * 60 * 60
 
 
 @side_effect_free
@@ -75,21 +77,28 @@ def ogdch_counts(context, data_dict):
     - total number of showcases
     - total number of organisations (including all levels of the hierarchy)
     """
-    user = tk.get_action("get_site_user")({"ignore_auth": True}, {})
+    cache = get_counts_cache()
+    counts = cache.get(COUNTS_CACHE_KEY)
+    if counts is not None:
+        return counts
+
+    user = ogdch_request_utils.get_site_user()
     req_context = {"user": user["name"]}
 
-    # group_list contains the number of datasets in the 'packages' field
-    groups = tk.get_action("group_list")(req_context, {"all_fields": True})
+    type_counts, group_counts = get_dataset_and_group_counts()
+    # group_list without all_fields only returns the names, in the same order
     group_count = OrderedDict()
-    for group in groups:
-        group_count[group["name"]] = group["package_count"]
+    for group_name in tk.get_action("group_list")(req_context, {}):
+        group_count[group_name] = group_counts.get(group_name, 0)
 
-    return {
-        "total_dataset_count": get_dataset_count("dataset"),
-        "showcase_count": get_dataset_count("showcase"),
+    counts = {
+        "total_dataset_count": type_counts.get("dataset", 0),
+        "showcase_count": type_counts.get("showcase", 0),
         "groups": group_count,
         "organization_count": get_org_count(),
     }
+    cache.set(COUNTS_CACHE_KEY, counts)
+    return counts
 
 
 @side_effect_free
@@ -97,7 +106,7 @@ def ogdch_package_show(context, data_dict):
     """Custom package_show logic that returns a dataset together
     with related datasets, showcases, terms of use and SWITCH Connectome url.
     """
-    user = tk.get_action("get_site_user")({"ignore_auth": True}, {})
+    user = ogdch_request_utils.get_site_user()
     context.update({"user": user["name"], "for_view": True})
     id = get_or_bust(data_dict, "id")
 
@@ -109,15 +118,17 @@ def ogdch_package_show(context, data_dict):
 
     result["showcases"] = get_showcases_for_dataset(id=id)
 
-    result["terms_of_use"] = tk.get_action("ogdch_dataset_terms_of_use")(
-        context, {"id": id}
-    )
+    # same as the ogdch_dataset_terms_of_use action, without loading the
+    # dataset again
+    result["terms_of_use"] = {
+        "dataset_license": get_dataset_terms_of_use(result),
+    }
 
+    resource_ids_with_views = get_resource_ids_with_views(
+        [resource["id"] for resource in result["resources"]]
+    )
     for resource in result["resources"]:
-        resource_views = tk.get_action("resource_view_list")(
-            context, {"id": resource["id"]}
-        )
-        resource["has_views"] = len(resource_views) > 0
+        resource["has_views"] = resource["id"] in resource_ids_with_views
 
     result["connectome_url"] = ogdch_get_switch_connectome_url(
         result.get("identifier", "")
@@ -133,54 +144,88 @@ def _map_related_datasets(context, result):
     See_alsos is deprecated since DCAT-AP CH v2, and qualified_relations
     replaces it, but older datasets will still have values for see_alsos.
     """
+    see_alsos = result.get("see_alsos") or []
+    qualified_relations = result.get("qualified_relations") or []
+    see_also_identifiers = [item.get("dataset_identifier") for item in see_alsos]
+    relation_identifiers = [
+        _get_identifier_from_permalink(item.get("relation"))
+        for item in qualified_relations
+    ]
+    datasets = _get_datasets_by_identifiers(
+        context, see_also_identifiers + relation_identifiers
+    )
+
     related_datasets = []
-    if result.get("see_alsos"):
-        for item in result.get("see_alsos"):
-            try:
-                related_dataset = tk.get_action("ogdch_dataset_by_identifier")(
-                    context, {"identifier": item.get("dataset_identifier")}
-                )
-                related_datasets.append(
-                    {
-                        "title": related_dataset["title"],
-                        "name": related_dataset["name"],
-                        "dataset_identifier": related_dataset["identifier"],
-                    }
-                )
-            except (ValidationError, NotFound) as e:
-                log.info(
-                    f"Error getting related dataset with identifier "
-                    f"{item.get('dataset_identifier')}: {e}"
-                )
-                continue
-    if result.get("qualified_relations"):
-        for item in result.get("qualified_relations"):
-            try:
-                related_dataset = tk.get_action("ogdch_dataset_by_permalink")(
-                    context, {"permalink": item.get("relation")}
-                )
-                related_datasets.append(
-                    {
-                        "title": related_dataset["title"],
-                        "name": related_dataset["name"],
-                        "dataset_identifier": related_dataset["identifier"],
-                    }
-                )
-            except (ValidationError, NotFound) as e:
-                log.info(
-                    f"Error getting related dataset with permalink "
-                    f"{item.get('relation')}: {e}"
-                )
-                related_datasets.append(
-                    {
-                        "dataset_identifier": item.get("relation"),
-                    }
-                )
-                continue
+    for identifier in see_also_identifiers:
+        if identifier in datasets:
+            related_datasets.append(dict(datasets[identifier]))
+        else:
+            log.info(f"Could not find related dataset with identifier {identifier}")
+    for item, identifier in zip(qualified_relations, relation_identifiers):
+        if identifier in datasets:
+            related_datasets.append(dict(datasets[identifier]))
+        else:
+            log.info(
+                f"Could not find related dataset with permalink "
+                f"{item.get('relation')}"
+            )
+            related_datasets.append(
+                {
+                    "dataset_identifier": item.get("relation"),
+                }
+            )
 
     result["related_datasets"] = related_datasets
 
 
+def _get_datasets_by_identifiers(context, identifiers):
+    """Get the name and title of the datasets with the given identifiers,
+    with one Solr request per RELATED_DATASETS_BATCH_SIZE identifiers.
+
+    Returns a dict that maps the identifiers that were found to a dict with the
+    title, name and dataset_identifier of the dataset.
+    """
+    identifiers = list(dict.fromkeys(i for i in identifiers if i))
+    title_fields = {lang: f"title_{lang}" for lang in get_language_priorities()}
+    datasets = {}
+
+    for i in range(0, len(identifiers), RELATED_DATASETS_BATCH_SIZE):
+        batch = identifiers[i : i + RELATED_DATASETS_BATCH_SIZE]
+        fq = " OR ".join(solr_literal(identifier) for identifier in batch)
+        search_result = tk.get_action("package_search")(
+            context,
+            {
+                "fq": f"identifier:({fq})",
+                "fl": ["name", "identifier"] + list(title_fields.values()),
+                "rows": config.get("ckan.search.rows_max"),
+                "sort": "metadata_modified desc",
+            },
+        )
+        for dataset in search_result["results"]:
+            # If an identifier is not unique, use the latest dataset, as
+            # package_search would return it first.
+            datasets.setdefault(
+                dataset["identifier"],
+                {
+                    "title": {
+                        lang: dataset.get(field, "")
+                        for lang, field in title_fields.items()
+                    },
+                    "name": dataset["name"],
+                    "dataset_identifier": dataset["identifier"],
+                },
+            )
+
+    return datasets
+
+
+def _get_identifier_from_permalink(permalink):
+    parts = (permalink or "").split("/perma/")
+    if len(parts) == 2:
+        return parts[1]
+    return None
+
+
 @side_effect_free
 def ogdch_content_headers(context, data_dict):
     """
@@ -203,7 +248,7 @@ def ogdch_dataset_terms_of_use(context, data_dict):
     Important : The property dct:license is now required
     for the terms of use instead of dct:rights
     """
-    user = tk.get_action("get_site_user")({"ignore_auth": True}, {})
+    user = ogdch_request_utils.get_site_user()
     req_context = {"user": user["name"]}
     pkg_id = get_or_bust(data_dict, "id")
     pkg = tk.get_action("package_show")(req_context, {"id": pkg_id})
@@ -215,27 +260,25 @@ def ogdch_dataset_terms_of_use(context, data_dict):
 
 @side_effect_free
 def ogdch_dataset_by_identifier(context, data_dict):
-    user = tk.get_action("get_site_user")({"ignore_auth": True}, {})
+    user = ogdch_request_utils.get_site_user()
     context.update({"user": user["name"]})
     identifier = data_dict.pop("identifier", None)
 
     if not identifier:
         raise ValidationError({"identifier": ["Missing value"]})
 
-    data_dict["fq"] = f'identifier:"{identifier}"'
-    result = tk.get_action("package_search")(context, data_dict)
-
-    try:
-        return result["results"][0]
-    except (KeyError, IndexError, TypeError):
-        raise NotFound
+    return ogdch_identifier_utils.get_dataset(
+        context,
+        identifier,
+        include_private=tk.asbool(data_dict.get("include_private", False)),
+    )
 
 
 def ogdch_dataset_by_permalink(context, data_dict):
     permalink = data_dict.pop("permalink", None)
-    parts = permalink.split("/perma/")
-    if len(parts) == 2:
-        return ogdch_dataset_by_identifier(context, {"identifier": parts[1]})
+    identifier = _get_identifier_from_permalink(permalink)
+    if identifier is not None:
+        return ogdch_dataset_by_identifier(context, {"identifier": identifier})
 
     raise NotFound
 
@@ -258,43 +301,22 @@ def ogdch_autosuggest(context, data_dict):
     if lang not in ["en", "it", "de", "fr"]:
         raise ValidationError("lang must be one of [en, it, de, fr]")
 
-    handler = f"/suggest_{lang}"
-    suggester = f"ckanSuggester_{lang}"
-
-    solr = make_connection()
     try:
-        log.debug(f"Loading suggestions for {q} (lang: {lang}, fq: {fq})")
-        results = solr.search(
-            "",
-            search_handler=handler,
-            **{"suggest.q": q, "suggest.count": 10, "suggest.cfq": fq},
-        )
-        suggestions = list(results.raw_response["suggest"][suggester].values())[0]
-
-        def highlight(term, q):
-            if "<b>" in term:
-                return term
-            clean_q = unidecode(q)
-            clean_term = unidecode(term)
-
-            re_q = re.escape(clean_q)
-            m = re.search(re_q, clean_term, re.I)
-            if m:
-                replace_text = term[m.start() : m.end()]
-                term = term.replace(replace_text, f"<b>{replace_text}</b>")
-            return term
-
-        terms = [
-            highlight(suggestion["term"], q)
-            for suggestion in suggestions["suggestions"]
-        ]
-        return list(set(terms))
+        terms = ogdch_suggest_utils.get_suggestions(q, lang, fq)
+        highlighter = ogdch_suggest_utils.Highlighter(q)
+        return list({highlighter.highlight(term) for term in terms})
     except pysolr.SolrError as e:
         log.exception(f"Could not load suggestions from solr: {e}")
     raise ActionError("Error retrieving suggestions from solr")
 
 
 def ogdch_xml_upload(context, data_dict):
+    """Save an uploaded RDF/XML file and import its datasets into the
+    organization in a background job.
+
+    Returns the id of the job, which can be passed to ogdch_xml_import_status
+    to follow the import.
+    """
     data = data_dict.get("data")
     org_id = data_dict.get("organization")
 
@@ -306,29 +328,125 @@ def ogdch_xml_upload(context, data_dict):
     dataset_filename = data.get("dataset_xml")
 
     if not dataset_filename:
-        h.flash_error("Error uploading file.")
-        return
+        raise ValidationError({"dataset_xml": ["Error uploading file."]})
 
     full_file_path = os.path.join(upload.storage_path, dataset_filename)
-    data_rdfgraph = rdflib.ConjunctiveGraph()
-    profile = SwissDCATAPProfile(data_rdfgraph)
+    job = tk.enqueue_job(
+        _import_xml_datasets,
+        kwargs={"file_path": full_file_path, "org_id": org_id},
+        title=f"Import of datasets from {dataset_filename}",
+        rq_kwargs={
+            "timeout": config.get("ckanext.switzerland.xml_import_timeout"),
+            "result_ttl": XML_IMPORT_RESULT_TTL,
+        },
+    )
+
+    return {"job_id": job.id}
+
+
+def _import_xml_datasets(file_path, org_id):
+    """Import the datasets from an RDF/XML file into the organization. This
+    runs as a background job.
+
+    The file is read one dataset at a time. The datasets are created or
+    updated by a DatasetImporter, and the search index is committed once at
+    the end. The numbers of created, updated and failed datasets are saved in the meta
+    data of the job after every dataset. At the end, the result for every
+    dataset is saved as well and returned.
+    """
+    job = rq.get_current_job()
+    summary = {
+        "created": 0,
+        "updated": 0,
+        "failed": 0,
+        "finished": False,
+        "error": None,
+        "datasets": [],
+    }
 
     try:
-        data_rdfgraph.parse(full_file_path, "xml")
+        with ogdch_request_utils.job_cache(), ogdch_solr_utils.deferred_indexing(
+            batch_size=config.get("ckanext.switzerland.xml_import_chunk_size")
+        ) as indexing_connection:
+            importer = ogdch_xml_import_utils.DatasetImporter(
+                org_id,
+                workers=config.get("ckanext.switzerland.xml_import_workers"),
+                indexing_connection=indexing_connection,
+            )
+            results = importer.import_datasets(
+                ogdch_xml_import_utils.iter_datasets(file_path),
+                chunk_size=config.get("ckanext.switzerland.xml_import_chunk_size"),
+            )
+            for result in results:
+                summary[result["status"]] += 1
+                summary["datasets"].append(result)
+                _save_xml_import_progress(job, summary, result)
     except Exception as e:
-        h.flash_error(f"Error parsing the RDF file during dataset import: {e}")
-        os.remove(full_file_path)
+        log.exception(f"Error importing datasets from {file_path}")
+        summary["error"] = f"Error parsing the RDF file during dataset import: {e}"
+    finally:
+        # Clean up the file as we have no further use for it.
+        os.remove(file_path)
+
+    summary["finished"] = True
+    _save_xml_import_progress(job, summary)
+
+    return summary
+
+
+def _save_xml_import_progress(job, summary, last_result=None):
+    if job is None:
         return
 
-    for dataset_ref in data_rdfgraph.subjects(RDF.type, DCAT.Dataset):
-        dataset_dict = {}
-        profile.parse_dataset(dataset_dict, dataset_ref)
-        dataset_dict["owner_org"] = org_id
+    # Saving the results for all datasets after each one would get slow for
+    # large files, so they are only saved at the end.
+    progress = {key: value for key, value in summary.items() if key != "datasets"}
+    if summary["finished"]:
+        progress["datasets"] = summary["datasets"]
+    else:
+        progress["last_dataset"] = last_result
+    job.meta["xml_import"] = progress
+    job.save_meta()
+
+
+@side_effect_free
+def ogdch_xml_import_status(context, data_dict):
+    """Return the status of an import of datasets from an xml file, started
+    with ogdch_xml_upload.
 
-        _create_or_update_dataset(dataset_dict)
+    While the import is running, this contains the numbers of created, updated
+    and failed datasets so far and the result for the last dataset. Once it
+    has finished, it contains the result for every dataset.
+    """
+    job_id = get_or_bust(data_dict, "id")
+    try:
+        job = jobs.job_from_id(job_id)
+    except KeyError:
+        raise NotFound(f"Import {job_id} not found")
+    if job.func_name != f"{__name__}._import_xml_datasets":
+        raise NotFound(f"Import {job_id} not found")
+
+    org_id = job.kwargs.get("org_id")
+    check_access("package_create", context, {"owner_org": org_id})
+
+    status = {
+        "created": 0,
+        "updated": 0,
+        "failed": 0,
+        "finished": False,
+        "error": None,
+    }
+    status.update(job.meta.get("xml_import") or {})
+    status.update(
+        {
+            "id": job.id,
+            "title": job.meta.get("title"),
+            "organization": org_id,
+            "job_status": job.get_status().value,
+        }
+    )
 
-    # Clean up the file as we have no further use for it.
-    os.remove(full_file_path)
+    return status
 
 
 @side_effect_free
@@ -338,7 +456,7 @@ def ogdch_showcase_search(context, data_dict):
     so that the ckanext-showcase before_view method is called. This includes
     the number of datasets in each showcase in the output.
     """
-    user = tk.get_action("get_site_user")({"ignore_auth": True}, {})
+    user = ogdch_request_utils.get_site_user()
     context.update({"user": user["name"], "for_view": True})
 
     if data_dict["fq"]:
@@ -366,8 +484,7 @@ def ogdch_showcase_submit(context, data_dict):
     if context.get("ratelimit_exceeded"):
         raise ValidationError(
             f"Rate limit of {context['limit_call_count']} calls per "
-            f"{context['limit_timedelta']} exceeded: for {author_email} there were "
-            f"{context['count_of_calls_per_email']} calls in that time interval"
+            f"{context['limit_timedelta']} exceeded for {context['ratelimit_key']}"
         )
     try:
         title = data_dict.get("title")
@@ -427,73 +544,6 @@ def ogdch_harvest_monitor(context, data_dict):
     return result
 
 
-def _create_or_update_dataset(dataset):
-    context = {}
-    user = tk.get_action("get_site_user")({"ignore_auth": True}, {})
-    context.update({"user": user["name"]})
-
-    harvester = SwissDCATRDFHarvester()
-    name = harvester._gen_new_name(dataset.get("title", ""))
-
-    package_plugin = lib_plugins.lookup_package_plugin("dataset")
-    data_dict = {
-        "identifier": dataset.get("identifier", ""),
-        "include_private": True,
-        "include_drafts": True,
-    }
-
-    try:
-        existing_dataset = tk.get_action("ogdch_dataset_by_identifier")(
-            context, data_dict
-        )
-        context["schema"] = package_plugin.update_package_schema()
-
-        # Don't change the dataset name even if the title has changed
-        dataset["name"] = existing_dataset["name"]
-        dataset["id"] = existing_dataset["id"]
-        # Don't make a dataset public if it wasn't already
-        is_private = existing_dataset["private"]
-        dataset["private"] = is_private
-
-        map_existing_resources_to_new_dataset(dataset, existing_dataset)
-
-        tk.get_action("package_update")(context, dataset)
-
-        success_message = f"Updated dataset {dataset['name']}."
-        if is_private:
-            success_message += " The dataset visibility is private."
-
-        h.flash_success(success_message)
-
-    except NotFound:
-        package_schema = package_plugin.create_package_schema()
-        context["schema"] = package_schema
-
-        # We need to explicitly provide a package ID
-        dataset["id"] = str(uuid.uuid4())
-        package_schema["id"] = [tk.get_validator("unicode_safe")]
-        dataset["name"] = name
-        # Create datasets as private initially
-        dataset["private"] = True
-
-        try:
-            tk.get_action("package_create")(context, dataset)
-        except ValidationError as e:
-            h.flash_error(
-                f"Error importing dataset {dataset.get('name', '')}: "
-                f"{e.error_summary!r}"
-            )
-
-            return
-
-        h.flash_success(
-            f"Created dataset {dataset['name']}. The dataset visibility is private."
-        )
-
-    except Exception as e:
-        h.flash_error(f"Error importing dataset {dataset.get('name', '')}: {e}")
-
-
 @side_effect_free
 def ogdch_add_users_to_groups(context, data_dict={}):
     """
@@ -505,54 +555,21 @@ def ogdch_add_users_to_groups(context, data_dict={}):
     :param group_id: (optional, default: ``None``)
     :return:
     """
-    user = tk.get_action("get_site_user")({"ignore_auth": True}, ())
-    context = {"user": user["name"]}
-
     group_id = data_dict.get("group_id")
     user_id = data_dict.get("user_id")
 
+    add_users_to_groups(user_id=user_id, group_id=group_id)
+
     if user_id and group_id:
-        _add_member_to_group(user_id, group_id, context)
         return f'Added user "{user_id}" to "{group_id}".'
     elif user_id:
-        _add_member_to_groups(user_id, context)
         return f"Added user {user_id} to all available groups."
     elif group_id:
-        _add_members_to_group(group_id, context)
         return f"Added all non-admin users as members to group {group_id}."
     else:
-        members = tk.get_action("user_list")(context, {})
-        groups = tk.get_action("group_list")(context, {})
-        for member in members:
-            if not member["sysadmin"]:
-                for group in groups:
-                    _add_member_to_group(member.get("id"), group, context)
-
         return "Added all non-admin users as members to all available groups."
 
 
-def _add_members_to_group(group, context):
-    members = tk.get_action("user_list")(context, {})
-    for member in members:
-        if not member["sysadmin"]:
-            _add_member_to_group(member.get("id"), group, context)
-
-
-def _add_member_to_groups(member, context):
-    groups = tk.get_action("group_list")(context, {})
-    for group in groups:
-        _add_member_to_group(member, group, context)
-
-
-def _add_member_to_group(member, group, context):
-    update_group_members_dict = {
-        "id": group,
-        "username": member,
-        "role": "member",
-    }
-    tk.get_action("group_member_create")(context, update_group_members_dict)
-
-
 def ogdch_user_create(context, data_dict):
     """overwrites the core user creation to send an email
     to new users"""
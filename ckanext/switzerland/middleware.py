@@ -2,6 +2,8 @@ import logging
 
 log = logging.getLogger(__name__)
 
+CACHE_MAX_AGE_KEY = "ckanext.switzerland.cache_max_age"
+
 
 class RobotsHeaderMiddleware(object):
     def __init__(self, app):
@@ -16,3 +18,32 @@ class RobotsHeaderMiddleware(object):
             return start_response(status, response_headers, exc_info)
 
         return self.app(environ, new_start_response)
+
+
+class CacheControlMiddleware(object):
+    """Set the Cache-Control header of responses whose view asked for it by
+    setting request.environ[CACHE_MAX_AGE_KEY]. CKAN sets its own header
+    after every view, so this can't be done in the view itself.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    def __call__(self, environ, start_response):
+
+        def new_start_response(status, response_headers, exc_info=None):
+            max_age = environ.get(CACHE_MAX_AGE_KEY)
+            # Responses that set cookies must not be shared
+            if max_age and not any(
+                name.lower() == "set-cookie" for name, _ in response_headers
+            ):
+                response_headers = [
+                    (name, value)
+                    for name, value in response_headers
+                    if name.lower() != "cache-control"
+                ]
+                response_headers.append(("Cache-Control", f"public, max-age={max_age}"))
+
+            return start_response(status, response_headers, exc_info)
+
+        return self.app(environ, new_start_response)
@@ -0,0 +1,46 @@
+"""Create the table ogdch_pkg_identifier, an index of the datasets by identifier.
+
+Revision ID: e6d90edd8124
+Revises:
+Create Date: 2026-10-18 10:12:41.308176
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "e6d90edd8124"
+down_revision: Union[str, None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "ogdch_pkg_identifier",
+        sa.Column(
+            "package_id",
+            sa.UnicodeText,
+            sa.ForeignKey("package.id", ondelete="CASCADE"),
+            primary_key=True,
+        ),
+        sa.Column("identifier", sa.UnicodeText, nullable=False),
+    )
+    op.create_index(
+        "ix_ogdch_pkg_identifier_identifier", "ogdch_pkg_identifier", ["identifier"]
+    )
+    # Add the identifiers of the existing datasets, so that they can be found
+    # as soon as the table exists
+    op.execute("""
+        INSERT INTO ogdch_pkg_identifier (package_id, identifier)
+        SELECT package_id, value FROM package_extra
+        WHERE key = 'identifier' AND state = 'active' AND value <> ''
+        """)
+
+
+def downgrade() -> None:
+    op.drop_index("ix_ogdch_pkg_identifier_identifier", "ogdch_pkg_identifier")
+    op.drop_table("ogdch_pkg_identifier")
@@ -0,0 +1,22 @@
+"""Database tables of the ogdch plugins. They are created with
+`ckan db upgrade -p <plugin>`.
+"""
+
+import ckan.plugins.toolkit as tk
+from sqlalchemy import Column, ForeignKey, types
+
+
+class DatasetIdentifier(tk.BaseModel):
+    """The identifier of a dataset, maintained by the ogdch_pkg plugin, so
+    that datasets can be looked up by identifier without a search in Solr.
+    Rows of purged datasets are deleted by the database.
+    """
+
+    __tablename__ = "ogdch_pkg_identifier"
+
+    package_id = Column(
+        types.UnicodeText,
+        ForeignKey("package.id", ondelete="CASCADE"),
+        primary_key=True,
+    )
+    identifier = Column(types.UnicodeText, nullable=False, index=True)
@@ -15,20 +15,27 @@ import ckanext.switzerland.helpers.dataset_form_helpers as ogdch_dataset_form_he
 import ckanext.switzerland.helpers.date_helpers as ogdch_date_helpers
 import ckanext.switzerland.helpers.format_utils as ogdch_format_utils
 import ckanext.switzerland.helpers.frontend_helpers as ogdch_frontend_helpers
+import ckanext.switzerland.helpers.identifier_utils as ogdch_identifier_utils
 import ckanext.switzerland.helpers.localize_utils as ogdch_localize_utils
+import ckanext.switzerland.helpers.logic_helpers as ogdch_logic_helpers
 import ckanext.switzerland.helpers.plugin_utils as ogdch_plugin_utils
 import ckanext.switzerland.helpers.request_utils as ogdch_request_utils
+import ckanext.switzerland.helpers.schema_utils as ogdch_schema_utils
 import ckanext.switzerland.helpers.terms_of_use_utils as ogdch_term_utils
 import ckanext.switzerland.helpers.validators as ogdch_validators
 from ckanext.activity.model import Activity
 from ckanext.hierarchy.plugin import HierarchyDisplay
 from ckanext.showcase.plugin import ShowcasePlugin
 from ckanext.subscribe.plugin import SubscribePlugin
+from ckanext.switzerland import cli as ogdch_cli
 from ckanext.switzerland import logic as ogdch_logic
 from ckanext.switzerland.blueprints.organization import org
 from ckanext.switzerland.blueprints.perma import perma
 from ckanext.switzerland.blueprints.user import user
-from ckanext.switzerland.middleware import RobotsHeaderMiddleware
+from ckanext.switzerland.middleware import (
+    CacheControlMiddleware,
+    RobotsHeaderMiddleware,
+)
 from ckanext.xloader import utils as xloader_utils
 from ckanext.xloader.plugin import (
     _remove_unsupported_resource_from_datastore,
@@ -53,6 +60,7 @@ class OgdchPlugin(plugins.SingletonPlugin, DefaultTranslation):
     plugins.implements(plugins.ITemplateHelpers)
     plugins.implements(plugins.IBlueprint)
     plugins.implements(plugins.ITranslation)
+    plugins.implements(plugins.IClick)
 
     # ITranslation
 
@@ -151,6 +159,7 @@ class OgdchPlugin(plugins.SingletonPlugin, DefaultTranslation):
             "ogdch_autosuggest": ogdch_logic.ogdch_autosuggest,
             "ogdch_package_show": ogdch_logic.ogdch_package_show,
             "ogdch_xml_upload": ogdch_logic.ogdch_xml_upload,
+            "ogdch_xml_import_status": ogdch_logic.ogdch_xml_import_status,
             "ogdch_showcase_search": ogdch_logic.ogdch_showcase_search,
             "ogdch_add_users_to_groups": ogdch_logic.ogdch_add_users_to_groups,
             "user_create": ogdch_logic.ogdch_user_create,
@@ -224,6 +233,11 @@ class OgdchPlugin(plugins.SingletonPlugin, DefaultTranslation):
     def get_blueprint(self):
         return [org, perma, user]
 
+    # IClick
+
+    def get_commands(self):
+        return ogdch_cli.get_commands()
+
 
 class OgdchGroupPlugin(plugins.SingletonPlugin):
     plugins.implements(plugins.IGroupController, inherit=True)
@@ -236,7 +250,12 @@ class OgdchGroupPlugin(plugins.SingletonPlugin):
         group_show). It is called in the course of our ogdch_package_show API,
         and in that case, the data is not localized.
         """
-        grp_dict = ogdch_localize_utils.parse_json_attributes(ckan_dict=grp_dict)
+        json_fields = ogdch_schema_utils.get_group_json_fields(
+            grp_dict.get("type", "group")
+        )
+        grp_dict = ogdch_localize_utils.parse_json_attributes(
+            ckan_dict=grp_dict, json_fields=json_fields
+        )
         grp_dict["display_name"] = grp_dict["title"]
 
         if ogdch_request_utils.request_is_api_request():
@@ -244,17 +263,29 @@ class OgdchGroupPlugin(plugins.SingletonPlugin):
 
         request_lang = ogdch_request_utils.get_current_language()
         grp_dict = ogdch_localize_utils.localize_ckan_sub_dict(
-            ckan_dict=grp_dict, lang_code=request_lang
+            ckan_dict=grp_dict, lang_code=request_lang, json_fields=json_fields
         )
         return grp_dict
 
+    def create(self, entity):
+        ogdch_logic_helpers.invalidate_counts_cache()
+
     def edit(self, grp_dict):
         """
         add all CKAN-users as members to the edited group.
+        This is done in a background job, so that editing a group does not
+        have to wait for it.
         :param grp_dict:
         :return:
         """
-        ogdch_logic.ogdch_add_users_to_groups(None, {})
+        tk.enqueue_job(
+            ogdch_logic_helpers.add_users_to_groups,
+            title="Add all users as members to all groups",
+        )
+        ogdch_logic_helpers.invalidate_counts_cache()
+
+    def delete(self, entity):
+        ogdch_logic_helpers.invalidate_counts_cache()
 
 
 class OgdchOrganizationPlugin(HierarchyDisplay):
@@ -277,7 +308,12 @@ class OgdchOrganizationPlugin(HierarchyDisplay):
         organization_show). It is called in the course of our
         ogdch_package_show API, and in that case, the data is not localized.
         """
-        org_dict = ogdch_localize_utils.parse_json_attributes(ckan_dict=org_dict)
+        json_fields = ogdch_schema_utils.get_organization_json_fields(
+            org_dict.get("type", "organization")
+        )
+        org_dict = ogdch_localize_utils.parse_json_attributes(
+            ckan_dict=org_dict, json_fields=json_fields
+        )
         org_dict["display_name"] = org_dict["title"]
 
         if ogdch_request_utils.request_is_api_request():
@@ -285,10 +321,25 @@ class OgdchOrganizationPlugin(HierarchyDisplay):
 
         request_lang = ogdch_request_utils.get_current_language()
         org_dict = ogdch_localize_utils.localize_ckan_sub_dict(
-            ckan_dict=org_dict, lang_code=request_lang
+            ckan_dict=org_dict, lang_code=request_lang, json_fields=json_fields
         )
         return org_dict
 
+    def create(self, entity):
+        ogdch_logic_helpers.invalidate_counts_cache()
+        ogdch_frontend_helpers.invalidate_organization_tree_cache()
+
+    def edit(self, entity):
+        ogdch_logic_helpers.invalidate_counts_cache()
+        # changes to the hierarchy affect other organizations as well
+        ogdch_plugin_utils.invalidate_organization_cache()
+        ogdch_frontend_helpers.invalidate_organization_tree_cache()
+
+    def delete(self, entity):
+        ogdch_logic_helpers.invalidate_counts_cache()
+        ogdch_plugin_utils.invalidate_organization_cache()
+        ogdch_frontend_helpers.invalidate_organization_tree_cache()
+
     # ITemplateHelpers (implemented in parent class HierarchyDisplay)
 
     def get_helpers(self):
@@ -332,7 +383,10 @@ class OgdchResourcePlugin(plugins.SingletonPlugin):
         resource_show). It is called in the course of our ogdch_package_show
         API, and in that case, the data is not localized.
         """
-        res_dict = ogdch_localize_utils.parse_json_attributes(ckan_dict=res_dict)
+        json_fields = ogdch_schema_utils.get_resource_json_fields()
+        res_dict = ogdch_localize_utils.parse_json_attributes(
+            ckan_dict=res_dict, json_fields=json_fields
+        )
         res_dict["display_name"] = res_dict["title"]
         res_dict = ogdch_format_utils.prepare_resource_format(resource=res_dict)
 
@@ -341,7 +395,7 @@ class OgdchResourcePlugin(plugins.SingletonPlugin):
 
         request_lang = ogdch_request_utils.get_current_language()
         res_dict = ogdch_localize_utils.localize_ckan_sub_dict(
-            ckan_dict=res_dict, lang_code=request_lang
+            ckan_dict=res_dict, lang_code=request_lang, json_fields=json_fields
         )
         return res_dict
 
@@ -359,12 +413,11 @@ class OgdchPackagePlugin(plugins.SingletonPlugin):
         package_show). It is called in the course of our ogdch_package_show
         API, and in that case, the data is not localized.
         """
-        pkg_dict = ogdch_localize_utils.parse_json_attributes(ckan_dict=pkg_dict)
+        localizer = ogdch_schema_utils.get_dataset_localizer(pkg_dict.get("type"))
+        pkg_dict = localizer.parse(pkg_dict)
         pkg_dict = ogdch_plugin_utils.package_map_ckan_default_fields(pkg_dict)
-        pkg_dict["resources"] = [
+        for resource in pkg_dict.get("resources"):
             ogdch_format_utils.prepare_resource_format(resource=resource)
-            for resource in pkg_dict.get("resources")
-        ]
         ogdch_plugin_utils.ogdch_map_resource_docs_to_dataset(pkg_dict)
 
         if ogdch_request_utils.request_is_api_request():
@@ -372,24 +425,7 @@ class OgdchPackagePlugin(plugins.SingletonPlugin):
 
         request_lang = ogdch_request_utils.get_current_language()
 
-        pkg_dict = ogdch_localize_utils.localize_ckan_sub_dict(pkg_dict, request_lang)
-        pkg_dict["resources"] = [
-            ogdch_localize_utils.localize_ckan_sub_dict(
-                ckan_dict=resource, lang_code=request_lang
-            )
-            for resource in pkg_dict.get("resources")
-        ]
-        pkg_dict["groups"] = [
-            ogdch_localize_utils.localize_ckan_sub_dict(
-                ckan_dict=grp, lang_code=request_lang
-            )
-            for grp in pkg_dict.get("groups")
-        ]
-        if pkg_dict.get("organization"):
-            pkg_dict["organization"] = ogdch_localize_utils.localize_ckan_sub_dict(
-                ckan_dict=pkg_dict["organization"], lang_code=request_lang
-            )
-        return pkg_dict
+        return localizer.localize(pkg_dict, request_lang)
 
     def after_dataset_show(self, context, pkg_dict):
         """
@@ -401,6 +437,34 @@ class OgdchPackagePlugin(plugins.SingletonPlugin):
         pkg_dict = ogdch_plugin_utils.ogdch_prepare_pkg_dict_for_api(pkg_dict)
         return pkg_dict
 
+    def after_dataset_create(self, context, pkg_dict):
+        ogdch_identifier_utils.index_dataset(pkg_dict["id"], pkg_dict.get("identifier"))
+        ogdch_logic_helpers.invalidate_counts_cache()
+        self._invalidate_organization_cache(pkg_dict)
+
+    def after_dataset_update(self, context, pkg_dict):
+        # pkg_dict["id"] can be the name of the dataset here
+        ogdch_identifier_utils.index_dataset(
+            context["package"].id, pkg_dict.get("identifier")
+        )
+        ogdch_logic_helpers.invalidate_counts_cache()
+        self._invalidate_organization_cache(pkg_dict)
+
+    def after_dataset_delete(self, context, pkg_dict):
+        ogdch_logic_helpers.invalidate_counts_cache()
+
+    def delete(self, entity):
+        # after_dataset_delete only gets the id or name that package_delete
+        # was called with, and the name may have been changed by now
+        ogdch_identifier_utils.invalidate_dataset(entity.id)
+        if entity.owner_org:
+            ogdch_plugin_utils.invalidate_organization_cache(entity.owner_org)
+
+    def _invalidate_organization_cache(self, pkg_dict):
+        # the package_count of the organization has changed
+        if pkg_dict.get("owner_org"):
+            ogdch_plugin_utils.invalidate_organization_cache(pkg_dict["owner_org"])
+
     def before_dataset_index(self, search_data):
         """
         Search data before index
@@ -796,6 +860,7 @@ class OgdchMiddlewarePlugin(plugins.SingletonPlugin):
 
     def make_middleware(self, app, config):
         app = RobotsHeaderMiddleware(app)
+        app = CacheControlMiddleware(app)
 
         return app
 
@@ -7,6 +7,7 @@ import ckan.plugins.toolkit as tk
 import pytest
 from ckan.tests import factories
 
+import ckanext.switzerland.helpers.identifier_utils as ogdch_identifier_utils
 from ckanext.switzerland.plugins import HARVEST_USER, MIGRATION_USER
 
 log = logging.getLogger(__name__)
@@ -60,10 +61,12 @@ def get_context():
 @pytest.fixture
 def clean_db(reset_db, migrate_db_for):
     reset_db()
-    plugins = ["activity", "ogdch_subscribe"]
+    plugins = ["activity", "ogdch_pkg", "ogdch_subscribe"]
     for plugin in plugins:
         if p.get_plugin(plugin):
             migrate_db_for(plugin)
+    # Lookups cached in earlier tests refer to datasets that are gone
+    ogdch_identifier_utils.clear_caches()
 
 
 @pytest.fixture
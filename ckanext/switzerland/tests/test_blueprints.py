@@ -1,6 +1,9 @@
+import ckan.plugins.toolkit as tk
 import pytest
 from ckan.lib.helpers import url_for
 
+from ckanext.switzerland.tests.conftest import get_context
+
 
 @pytest.mark.ckan_config(
     "ckan.plugins",
@@ -26,6 +29,26 @@ class TestBlueprints(object):
         # expect a 404 response
         app.get(url, status=404)
 
+    def test_redirect_after_rename(self, app, dataset):
+        url = url_for("perma.read", id=dataset["identifier"])
+        app.get(url)
+        tk.get_action("package_patch")(
+            get_context(), {"id": dataset["id"], "name": "renamed-dataset"}
+        )
+
+        response = app.get(url)
+        assert (
+            response.history[0].location
+            == "http://test.ckan.net/dataset/renamed-dataset"
+        )
+
+    def test_no_redirect_after_delete(self, app, dataset):
+        url = url_for("perma.read", id=dataset["identifier"])
+        app.get(url)
+        tk.get_action("package_delete")(get_context(), {"id": dataset["id"]})
+
+        app.get(url, status=404)
+
     def test_org_list_links(self, app, org):
         # no locale, should default to EN
         url = url_for("organization.index")
@@ -63,3 +86,31 @@ class TestBlueprints(object):
         response = app.get(url, status=200)
 
         assert "/fr/organization/test-org" in response
+
+    def test_user_organizations_as_tree(self, app, org, users):
+        child_org = tk.get_action("organization_create")(
+            get_context(),
+            {
+                "name": "child-org",
+                "title": {
+                    "de": "Child Org DE",
+                    "fr": "Child Org FR",
+                    "it": "Child Org IT",
+                    "en": "Child Org EN",
+                },
+                "political_level": "confederation",
+                "groups": [{"name": org["name"], "capacity": "parent"}],
+            },
+        )
+        tk.get_action("organization_member_create")(
+            get_context(),
+            {"id": child_org["id"], "username": "user0", "role": "editor"},
+        )
+
+        url = url_for("ogdch_user.list_for_user", id="user0")
+        response = app.get(url, status=200)
+
+        # the parent organization is shown, but the user is only a member of
+        # the child organization
+        assert response.body.index("Test Org EN") < response.body.index("Child Org EN")
+        assert response.body.count("( Editor )") == 1
@@ -0,0 +1,80 @@
+import ckan.model as model
+import ckan.plugins.toolkit as tk
+import pytest
+from ckan.lib.search import clear_all
+
+from ckanext.switzerland.cli import ogdch
+from ckanext.switzerland.model import DatasetIdentifier
+
+
+@pytest.mark.ckan_config(
+    "ckan.plugins",
+    "ogdch ogdch_pkg scheming_datasets fluent",
+)
+@pytest.mark.usefixtures("with_plugins", "clean_db", "clean_index")
+class TestSearchIndexRebuild(object):
+    def _search(self, q=""):
+        return tk.get_action("package_search")({}, {"q": q})
+
+    def test_rebuild(self, cli, dataset, extra_datasets):
+        clear_all()
+        assert self._search()["count"] == 0
+
+        result = cli.invoke(
+            ogdch,
+            ["search-index-rebuild", "--workers", "1", "--batch-size", "3"],
+        )
+
+        assert result.exit_code == 0, result.output
+        assert "Indexed 4 datasets" in result.output
+        assert self._search()["count"] == 4
+
+    def test_rebuild_runs_ogdch_index_preparation(self, cli, dataset, extra_datasets):
+        clear_all()
+
+        result = cli.invoke(
+            ogdch,
+            ["search-index-rebuild", "--workers", "1", "--commit-interval", "1"],
+        )
+
+        assert result.exit_code == 0, result.output
+        # title_de is only indexed by ogdch_prepare_search_data_for_index
+        results = self._search("title_de:DE")
+        assert "test-dataset" in [r["name"] for r in results["results"]]
+
+    def test_rebuild_only_missing(self, cli, dataset, extra_datasets):
+        result = cli.invoke(
+            ogdch,
+            ["search-index-rebuild", "--workers", "1", "--only-missing"],
+        )
+
+        assert result.exit_code == 0, result.output
+        assert "No datasets to index." in result.output
+
+
+@pytest.mark.ckan_config(
+    "ckan.plugins",
+    "ogdch ogdch_pkg scheming_datasets fluent",
+)
+@pytest.mark.usefixtures("with_plugins", "clean_db", "clean_index")
+class TestIdentifierIndex(object):
+    def test_rebuild(self, cli, dataset, extra_datasets):
+        result = cli.invoke(ogdch, ["identifier-index-rebuild"])
+
+        assert result.exit_code == 0, result.output
+        assert "Indexed the identifiers of 4 datasets" in result.output
+
+    def test_check(self, cli, dataset, extra_datasets):
+        result = cli.invoke(ogdch, ["identifier-index-check"])
+
+        assert result.exit_code == 0, result.output
+        assert "The identifier index matches the search index" in result.output
+
+    def test_check_finds_missing_identifier(self, cli, dataset):
+        model.Session.query(DatasetIdentifier).delete()
+        model.Session.commit()
+
+        result = cli.invoke(ogdch, ["identifier-index-check"])
+
+        assert result.exit_code == 1
+        assert f"Identifier of dataset {dataset['id']} is missing" in result.output
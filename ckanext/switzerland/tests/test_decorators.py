@@ -1,6 +1,8 @@
 from unittest import TestCase
+from unittest.mock import patch
 
 from ckan.logic import ValidationError
+from ckan.plugins.toolkit import config
 
 from ckanext.switzerland.helpers.decorators import _get_limits_from_config, ratelimit
 
@@ -23,3 +25,35 @@ class TestApiLimit(TestCase):
             assert api_call(context=context, data_dict=data_dict) is True
         with self.assertRaises(ValidationError):
             api_call(context=context, data_dict=data_dict)
+
+    def test_emails_are_counted_case_insensitively(self):
+        @ratelimit
+        def case_insensitive_call(context, data_dict):
+            return context.get("ratelimit_exceeded", False)
+
+        _, limit_call_count = _get_limits_from_config()
+        emails = ["Other@Mail.com", " other@mail.com"] * limit_call_count
+
+        results = [case_insensitive_call({}, {"author_email": e}) for e in emails]
+
+        self.assertEqual([False] * limit_call_count, results[:limit_call_count])
+        self.assertTrue(all(results[limit_call_count:]))
+
+    @patch.dict(config, {"ckanext.switzerland.api_limit_keys": "email ip"})
+    @patch(
+        "ckanext.switzerland.helpers.request_utils.get_client_ip",
+        return_value="10.0.0.1",
+    )
+    def test_calls_are_counted_by_ip_address(self, mock_get_client_ip):
+        @ratelimit
+        def ip_call(context, data_dict):
+            return context
+
+        _, limit_call_count = _get_limits_from_config()
+        for i in range(limit_call_count):
+            context = ip_call({}, {"author_email": f"user{i}@mail.com"})
+            self.assertNotIn("ratelimit_exceeded", context)
+
+        context = ip_call({}, {"author_email": "new-user@mail.com"})
+        self.assertTrue(context["ratelimit_exceeded"])
+        self.assertEqual("10.0.0.1", context["ratelimit_key"])
@@ -370,3 +370,50 @@ def test_prepare_formats_for_index(resources, linked_data_only, expected_formats
         resources, linked_data_only
     )
     assert sorted(prepared_formats) == sorted(expected_formats)
+
+
+class TestFormatResolver:
+    def setup_method(self):
+        self.resolver = ogdch_format_utils.FormatResolver(
+            ogdch_format_utils.format_mapping,
+            ogdch_format_utils.media_type_mapping,
+            cache_size=2,
+        )
+
+    @pytest.mark.parametrize("resource_data, expected_format", prepare_resource_data)
+    def test_get_resource_format(self, resource_data, expected_format):
+        assert expected_format == self.resolver.get_resource_format(
+            media_type=resource_data["media_type"],
+            format=resource_data["format"],
+            download_url=resource_data["download_url"],
+        )
+
+    def test_lookups_are_memoized(self):
+        self.resolver.get_resource_format("text/csv", None, None)
+        self.resolver.get_resource_format("text/csv", None, None)
+
+        cache_info = self.resolver.cache_info()
+        assert cache_info.hits == 1
+        assert cache_info.misses == 1
+
+    def test_cache_is_bounded(self):
+        for format in ["csv", "xml", "json", "html"]:
+            self.resolver.get_resource_format(None, format, None)
+
+        assert self.resolver.cache_info().currsize == 2
+
+    def test_unhashable_input_bypasses_cache(self):
+        assert "CSV" == self.resolver.get_resource_format("text/csv", None, ["a"])
+        assert self.resolver.cache_info().currsize == 0
+
+    @pytest.mark.parametrize(
+        "media_type, expected_media_type",
+        [
+            (None, ""),
+            ("text/csv", "text/csv"),
+            ("csv", "text/csv"),
+            ("text/foo", ""),
+        ],
+    )
+    def test_get_iana_media_type(self, media_type, expected_media_type):
+        assert expected_media_type == self.resolver.get_iana_media_type(media_type)
@@ -0,0 +1,94 @@
+"""Tests for helpers.cache_utils.py."""
+
+from unittest import TestCase
+from unittest.mock import MagicMock, patch
+
+import ckan.model as model
+
+import ckanext.switzerland.helpers.cache_utils as ogdch_cache_utils
+from ckanext.switzerland.helpers.cache_utils import MemoryCache
+
+
+class TestMemoryCache(TestCase):
+    def test_get_and_set(self):
+        cache = MemoryCache("test", ttl=60)
+        cache.set("key", {"count": 1})
+
+        self.assertEqual({"count": 1}, cache.get("key"))
+        self.assertIsNone(cache.get("other-key"))
+
+    def test_values_are_copied(self):
+        cache = MemoryCache("test", ttl=60)
+        value = {"groups": {"group1": 1}}
+        cache.set("key", value)
+
+        value["groups"]["group1"] = 2
+        cache.get("key")["groups"]["group1"] = 3
+
+        self.assertEqual({"groups": {"group1": 1}}, cache.get("key"))
+
+    @patch("ckanext.switzerland.helpers.cache_utils.time.monotonic")
+    def test_entries_expire(self, mock_monotonic):
+        cache = MemoryCache("test", ttl=60)
+        mock_monotonic.return_value = 1000
+        cache.set("key", "value")
+
+        mock_monotonic.return_value = 1060
+        self.assertEqual("value", cache.get("key"))
+        mock_monotonic.return_value = 1061
+        self.assertIsNone(cache.get("key"))
+
+    def test_least_recently_used_entry_is_evicted(self):
+        cache = MemoryCache("test", ttl=60, max_size=2)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.get("a")
+        cache.set("c", 3)
+
+        self.assertEqual(1, cache.get("a"))
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(3, cache.get("c"))
+
+    def test_delete_and_clear(self):
+        cache = MemoryCache("test", ttl=60)
+        cache.set("a", 1)
+        cache.set("b", 2)
+
+        cache.delete("a")
+        self.assertIsNone(cache.get("a"))
+        self.assertEqual(2, cache.get("b"))
+
+        cache.clear()
+        self.assertIsNone(cache.get("b"))
+
+    def test_ttl_0_disables_caching(self):
+        cache = MemoryCache("test", ttl=0)
+        cache.set("key", "value")
+
+        self.assertIsNone(cache.get("key"))
+
+
+class TestInvalidateAfterCommit(TestCase):
+    def setUp(self):
+        self.addCleanup(ogdch_cache_utils._forget_invalidations, model.Session())
+
+    def test_invalidation_is_repeated_after_commit(self):
+        invalidate = MagicMock()
+        ogdch_cache_utils.invalidate_after_commit(invalidate, "key")
+        ogdch_cache_utils.invalidate_after_commit(invalidate, "key")
+        self.assertEqual(2, invalidate.call_count)
+
+        ogdch_cache_utils._invalidate_after_commit(model.Session())
+        ogdch_cache_utils._invalidate_after_commit(model.Session())
+
+        self.assertEqual(3, invalidate.call_count)
+        invalidate.assert_called_with("key")
+
+    def test_invalidation_is_not_repeated_after_rollback(self):
+        invalidate = MagicMock()
+        ogdch_cache_utils.invalidate_after_commit(invalidate)
+
+        ogdch_cache_utils._forget_invalidations(model.Session())
+        ogdch_cache_utils._invalidate_after_commit(model.Session())
+
+        invalidate.assert_called_once_with()
@@ -1,6 +1,7 @@
 from copy import deepcopy
 from unittest.mock import patch
 
+import ckan.model as model
 import pytest
 
 import ckanext.switzerland.helpers.frontend_helpers as ogdch_frontend_helpers
@@ -147,3 +148,136 @@ class TestHelpers(object):
                     ogdch_frontend_helpers.get_localized_value_for_display(value)
                 )
                 assert expected[lang] == localized_value
+
+
+@pytest.mark.ckan_config("ckanext.switzerland.cache_backend", "memory")
+@pytest.mark.ckan_config("ckanext.switzerland.organization_tree_cache_ttl", 3600)
+class TestRenderTree(object):
+    def setup_method(self):
+        ogdch_frontend_helpers.invalidate_organization_tree_cache()
+
+    def _render_tree(self, lang_code="de"):
+        with patch("ckan.lib.i18n.get_lang", return_value=lang_code), patch(
+            "ckan.plugins.toolkit.get_action"
+        ) as get_action:
+            get_action.return_value.side_effect = lambda context, data_dict: deepcopy(
+                organizations
+            )
+            html = ogdch_frontend_helpers.ogdch_render_tree()
+        return html, get_action.return_value.call_count
+
+    def test_render_tree(self):
+        html, _ = self._render_tree("it")
+
+        assert html.startswith('<ul id="organizations-list">')
+        assert (
+            '<li id="node_swisstopo" class="organization">'
+            '<div class="organization-row">'
+            '<a href="/it/organization/swisstopo">Swisstopo IT</a></div>'
+            "<ul>"
+            '<li id="node_child-swiss-library" class="organization">'
+            '<div class="organization-row">'
+            '<a href="/it/organization/child-swiss-library">BBBBB (IT)</a></div>'
+            "</li>"
+        ) in html
+        # sorted by the translated title
+        assert html.index("AAAAA (IT)") < html.index("Swisstopo IT")
+        assert html.index("Swisstopo IT") < html.index("ZZZZZ (IT)")
+
+    def test_tree_is_cached_per_language(self):
+        html_de, group_tree_calls = self._render_tree("de")
+        assert group_tree_calls == 1
+
+        cached_html_de, group_tree_calls = self._render_tree("de")
+        assert group_tree_calls == 0
+        assert cached_html_de == html_de
+
+        html_fr, group_tree_calls = self._render_tree("fr")
+        assert group_tree_calls == 1
+        assert "Swisstopo FR" in html_fr
+
+    def test_invalidate_cache(self):
+        self._render_tree("de")
+        ogdch_frontend_helpers.invalidate_organization_tree_cache()
+
+        _, group_tree_calls = self._render_tree("de")
+        assert group_tree_calls == 1
+
+    def test_cache_is_invalidated_again_after_commit(self):
+        ogdch_frontend_helpers.invalidate_organization_tree_cache()
+        # As if another request had rendered the tree before the commit
+        self._render_tree("de")
+
+        model.Session.commit()
+
+        _, group_tree_calls = self._render_tree("de")
+        assert group_tree_calls == 1
+
+
+def _tree_node(name, children=None):
+    return {
+        "name": name,
+        "title": f"{name.capitalize()} DE",
+        "children": children or [],
+    }
+
+
+organization_tree = [
+    _tree_node(
+        "confederation",
+        [
+            _tree_node(
+                "department",
+                [_tree_node("office-a"), _tree_node("office-b")],
+            ),
+            _tree_node("other-department"),
+        ],
+    ),
+    _tree_node("canton", [_tree_node("municipality")]),
+]
+
+
+class TestOrganizationTreeIndex(object):
+    def _names(self, nodes):
+        return {node["name"]: self._names(node["children"]) for node in nodes}
+
+    def test_prune_to_deep_organization(self):
+        index = ogdch_frontend_helpers.OrganizationTreeIndex(organization_tree)
+
+        pruned = index.prune(["office-b"])
+
+        assert self._names(pruned) == {
+            "confederation": {"department": {"office-b": {}}}
+        }
+
+    def test_prune_to_several_organizations(self):
+        index = ogdch_frontend_helpers.OrganizationTreeIndex(organization_tree)
+
+        pruned = index.prune(["canton", "office-a", "department", "unknown"])
+
+        assert self._names(pruned) == {
+            "confederation": {"department": {"office-a": {}}},
+            "canton": {},
+        }
+
+    def test_prune_does_not_change_tree(self):
+        tree = deepcopy(organization_tree)
+        index = ogdch_frontend_helpers.OrganizationTreeIndex(tree)
+
+        pruned = index.prune(["municipality"])
+        pruned[0]["title"] = "changed"
+
+        assert tree == organization_tree
+
+    @patch("ckan.lib.i18n.get_lang", return_value="de")
+    def test_group_tree_selective(self, mock_get_lang):
+        tree = ogdch_frontend_helpers.ogdch_group_tree_selective(
+            [{"name": "municipality"}, {"name": "other-department"}],
+            deepcopy(organization_tree),
+        )
+
+        # sorted by title
+        assert self._names(tree) == {
+            "canton": {"municipality": {}},
+            "confederation": {"other-department": {}},
+        }
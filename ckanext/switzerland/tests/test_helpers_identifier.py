@@ -0,0 +1,163 @@
+"""Tests for helpers.identifier_utils.py."""
+
+from unittest.mock import patch
+
+import ckan.model as model
+import ckan.plugins.toolkit as tk
+import pytest
+
+import ckanext.switzerland.helpers.identifier_utils as ogdch_identifier_utils
+from ckanext.switzerland.model import DatasetIdentifier
+from ckanext.switzerland.tests.conftest import get_context
+
+
+def _by_identifier(identifier, **kwargs):
+    return tk.get_action("ogdch_dataset_by_identifier")(
+        {}, dict(kwargs, identifier=identifier)
+    )
+
+
+@pytest.mark.ckan_config("ckan.plugins", "ogdch ogdch_pkg scheming_datasets fluent")
+@pytest.mark.usefixtures("with_plugins", "clean_db", "clean_index")
+class TestIdentifierIndex(object):
+    def test_dataset_is_indexed_when_created(self, dataset):
+        row = model.Session.get(DatasetIdentifier, dataset["id"])
+
+        assert row.identifier == "test@test-org"
+        assert _by_identifier("test@test-org")["id"] == dataset["id"]
+
+    def test_lookup_does_not_search(self, dataset):
+        with patch("ckan.lib.search.query.PackageSearchQuery.run") as search:
+            assert _by_identifier("test@test-org")["name"] == "test-dataset"
+
+        search.assert_not_called()
+
+    def test_changed_identifier(self, dataset):
+        tk.get_action("package_patch")(
+            get_context(), {"id": dataset["name"], "identifier": "new@test-org"}
+        )
+
+        assert _by_identifier("new@test-org")["id"] == dataset["id"]
+        with pytest.raises(tk.ObjectNotFound):
+            _by_identifier("test@test-org")
+
+    def test_private_dataset(self, dataset):
+        _by_identifier("test@test-org")
+        tk.get_action("package_patch")(
+            get_context(), {"id": dataset["id"], "private": True}
+        )
+
+        with pytest.raises(tk.ObjectNotFound):
+            _by_identifier("test@test-org")
+        assert _by_identifier("test@test-org", include_private=True)["private"]
+
+    def test_deleted_dataset(self, dataset):
+        _by_identifier("test@test-org")
+        tk.get_action("package_delete")(get_context(), {"id": dataset["id"]})
+
+        with pytest.raises(tk.ObjectNotFound):
+            _by_identifier("test@test-org")
+
+    def test_purged_dataset_is_removed(self, dataset):
+        tk.get_action("dataset_purge")(get_context(), {"id": dataset["id"]})
+
+        assert model.Session.query(DatasetIdentifier).count() == 0
+
+    def test_outdated_cached_id_is_not_used(self, dataset, extra_datasets):
+        # As if another process had changed the identifiers since
+        cache = ogdch_identifier_utils._get_cache()
+        key = ogdch_identifier_utils._cache_keys("test@test-org")[0]
+        cache.set(key, extra_datasets[0]["id"])
+
+        assert _by_identifier("test@test-org")["id"] == dataset["id"]
+        assert cache.get(key) == dataset["id"]
+
+    def test_latest_dataset_is_used_for_repeated_identifier(
+        self, dataset, extra_datasets
+    ):
+        model.Session.query(DatasetIdentifier).filter_by(
+            package_id=extra_datasets[0]["id"]
+        ).update({"identifier": "test@test-org"})
+        model.Session.commit()
+
+        package_ids = ogdch_identifier_utils.get_package_ids(["test@test-org"])
+
+        assert package_ids == {"test@test-org": extra_datasets[0]["id"]}
+
+    def test_migration_adds_existing_datasets(
+        self, dataset, extra_datasets, migrate_db_for
+    ):
+        model.Session.remove()
+        migrate_db_for("ogdch_pkg", "base", forward=False)
+        migrate_db_for("ogdch_pkg")
+
+        assert model.Session.query(DatasetIdentifier).count() == 4
+        assert _by_identifier("dataset3@test-org")["name"] == "dataset3"
+
+    def test_rebuild_index(self, dataset, extra_datasets):
+        model.Session.query(DatasetIdentifier).delete()
+        model.Session.commit()
+
+        assert ogdch_identifier_utils.rebuild_index() == 4
+        assert _by_identifier("dataset3@test-org")["name"] == "dataset3"
+
+    def test_check_index(self, dataset, extra_datasets):
+        assert ogdch_identifier_utils.check_index() == {
+            "missing": [],
+            "different": [],
+            "not_searchable": [],
+        }
+
+        model.Session.query(DatasetIdentifier).filter_by(
+            package_id=dataset["id"]
+        ).delete()
+        model.Session.query(DatasetIdentifier).filter_by(
+            package_id=extra_datasets[0]["id"]
+        ).update({"identifier": "other@test-org"})
+        model.Session.commit()
+
+        assert ogdch_identifier_utils.check_index() == {
+            "missing": [dataset["id"]],
+            "different": [extra_datasets[0]["id"]],
+            "not_searchable": [],
+        }
+
+    def test_dataset_name_is_cached(self, dataset):
+        assert ogdch_identifier_utils.get_dataset_name("test@test-org") == (
+            "test-dataset"
+        )
+
+        with patch.object(model.Session, "query") as query:
+            name = ogdch_identifier_utils.get_dataset_name("test@test-org")
+
+        assert name == "test-dataset"
+        query.assert_not_called()
+
+    def test_dataset_name_of_private_dataset(self, dataset):
+        ogdch_identifier_utils.get_dataset_name("test@test-org")
+        tk.get_action("package_patch")(
+            get_context(), {"id": dataset["id"], "private": True}
+        )
+
+        assert ogdch_identifier_utils.get_dataset_name("test@test-org") is None
+
+    def test_dataset_name_cached_before_commit_is_removed(self, dataset):
+        index_dataset = ogdch_identifier_utils.index_dataset
+
+        def index_dataset_and_cache_old_name(*args):
+            index_dataset(*args)
+            # As if another request had read the dataset before the commit
+            ogdch_identifier_utils._get_name_cache().set(
+                "test@test-org", "test-dataset"
+            )
+
+        with patch.object(
+            ogdch_identifier_utils,
+            "index_dataset",
+            side_effect=index_dataset_and_cache_old_name,
+        ):
+            tk.get_action("package_patch")(
+                get_context(), {"id": dataset["id"], "name": "new-name"}
+            )
+
+        assert ogdch_identifier_utils.get_dataset_name("test@test-org") == ("new-name")
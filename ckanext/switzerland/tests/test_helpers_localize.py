@@ -1,4 +1,6 @@
+import json
 import unittest
+from unittest.mock import patch
 
 import ckanext.switzerland.helpers.localize_utils as ogdch_localize_utils
 
@@ -49,3 +51,199 @@ class TestHelpers(unittest.TestCase):
     def test_parse_json_number_string(self):
         value = "6"
         self.assertEqual(ogdch_localize_utils.parse_json(value), value)
+
+
+class TestParseJsonCached(unittest.TestCase):
+    def setUp(self):
+        ogdch_localize_utils.parsed_json_cache_clear()
+
+    def test_parsed_value_is_cached(self):
+        first = ogdch_localize_utils.parse_json_cached(organization_title)
+        second = ogdch_localize_utils.parse_json_cached(organization_title)
+
+        self.assertIs(first, second)
+        self.assertEqual(json.loads(organization_title), dict(first))
+        cache_info = ogdch_localize_utils.parsed_json_cache_info()
+        self.assertEqual(1, cache_info.hits)
+        self.assertEqual(1, cache_info.misses)
+
+    def test_parsed_value_is_immutable(self):
+        value = ogdch_localize_utils.parse_json_cached('{"de": ["a", {"b": 1}]}')
+
+        with self.assertRaises(TypeError):
+            value["de"] = "changed"
+        self.assertEqual(("a", {"b": 1}), value["de"])
+        with self.assertRaises(TypeError):
+            value["de"][1]["b"] = 2
+
+    def test_same_result_as_parse_json(self):
+        for value in ["5", "plain text", "{not json", '"quoted"', None, {"de": "x"}]:
+            self.assertEqual(
+                ogdch_localize_utils.parse_json(value),
+                ogdch_localize_utils.parse_json_cached(value),
+            )
+
+    def test_get_localized_value_from_json(self):
+        for _ in range(3):
+            value = ogdch_localize_utils.get_localized_value_from_json(
+                organization_title, "it"
+            )
+
+        self.assertEqual("Swisstopo IT", value)
+        self.assertEqual(2, ogdch_localize_utils.parsed_json_cache_info().hits)
+
+    def test_get_localized_value_from_json_not_a_language_dict(self):
+        value = ogdch_localize_utils.get_localized_value_from_json(
+            '{"name": "value", "list": [1]}', "de"
+        )
+        value["name"] = "changed"
+
+        self.assertEqual({"name": "changed", "list": [1]}, value)
+        self.assertEqual(
+            {"name": "value", "list": [1]},
+            ogdch_localize_utils.get_localized_value_from_json(
+                '{"name": "value", "list": [1]}', "de"
+            ),
+        )
+
+
+class TestParseJsonField(unittest.TestCase):
+    def test_json_field(self):
+        self.assertEqual(
+            ["CSV"],
+            ogdch_localize_utils.parse_json_field(
+                "format", '["CSV"]', {"format": True}
+            ),
+        )
+
+    def test_field_without_json(self):
+        self.assertEqual(
+            '["CSV"]',
+            ogdch_localize_utils.parse_json_field(
+                "format", '["CSV"]', {"format": False}
+            ),
+        )
+
+    def test_unknown_field(self):
+        json_fields = {"title": True}
+        for value, expected in [
+            (organization_title, json.loads(organization_title)),
+            ("[1, 2]", [1, 2]),
+            ("1.0", "1.0"),
+            ("true", "true"),
+            ("https://example.com", "https://example.com"),
+            ("{not json", "{not json"),
+            (None, None),
+        ]:
+            self.assertEqual(
+                expected,
+                ogdch_localize_utils.parse_json_field("notes", value, json_fields),
+            )
+            self.assertEqual(
+                expected, ogdch_localize_utils.parse_json_field("notes", value)
+            )
+
+
+class TestDatasetLocalizer(unittest.TestCase):
+    def _dataset(self):
+        return {
+            "name": "dataset",
+            "title": organization_title,
+            "version": "1.0",
+            "keywords": {"de": ["wald"], "fr": ["foret"], "it": [], "en": []},
+            "resources": [{"title": organization_title, "format": '["CSV"]'}],
+            "groups": [{"name": "group", "display_name": organization_title}],
+            "organization": {"name": "org", "title": organization_title},
+        }
+
+    def test_localize_json_fields(self):
+        localizer = ogdch_localize_utils.DatasetLocalizer(
+            dataset_fields={"title": True, "keywords": True},
+            resource_fields={"title": True},
+            group_fields={"display_name": True},
+            organization_fields={"title": True},
+        )
+
+        pkg_dict = localizer.localize(localizer.parse(self._dataset()), "fr")
+
+        self.assertEqual("Swisstopo FR", pkg_dict["title"])
+        self.assertEqual(["foret"], pkg_dict["keywords"])
+        self.assertEqual("Swisstopo FR", pkg_dict["resources"][0]["title"])
+        self.assertEqual("Swisstopo FR", pkg_dict["groups"][0]["display_name"])
+        self.assertEqual("Swisstopo FR", pkg_dict["organization"]["title"])
+
+    def test_fields_without_json_are_not_parsed(self):
+        localizer = ogdch_localize_utils.DatasetLocalizer(
+            dataset_fields={"title": True, "version": False},
+            resource_fields={"title": True, "format": False},
+            group_fields={"display_name": False},
+            organization_fields={},
+        )
+
+        pkg_dict = localizer.localize(localizer.parse(self._dataset()), "fr")
+
+        self.assertEqual("1.0", pkg_dict["version"])
+        self.assertEqual('["CSV"]', pkg_dict["resources"][0]["format"])
+        self.assertEqual(organization_title, pkg_dict["groups"][0]["display_name"])
+        self.assertEqual("Swisstopo FR", pkg_dict["organization"]["title"])
+
+    def test_unknown_fields_are_parsed_if_they_look_like_json(self):
+        localizer = ogdch_localize_utils.DatasetLocalizer()
+
+        pkg_dict = localizer.localize(localizer.parse(self._dataset()), "de")
+
+        self.assertEqual("Swisstopo DE", pkg_dict["title"])
+        self.assertEqual("1.0", pkg_dict["version"])
+        self.assertEqual(["CSV"], pkg_dict["resources"][0]["format"])
+        self.assertEqual("Swisstopo DE", pkg_dict["groups"][0]["display_name"])
+        self.assertEqual("Swisstopo DE", pkg_dict["organization"]["title"])
+
+    def test_same_result_as_localize_ckan_sub_dict(self):
+        localizer = ogdch_localize_utils.DatasetLocalizer()
+        expected = ogdch_localize_utils.parse_json_attributes(self._dataset())
+        expected = ogdch_localize_utils.localize_ckan_sub_dict(expected, "it")
+        for key in ["resources", "groups"]:
+            expected[key] = [
+                ogdch_localize_utils.localize_ckan_sub_dict(d, "it")
+                for d in expected[key]
+            ]
+        expected["organization"] = ogdch_localize_utils.localize_ckan_sub_dict(
+            expected["organization"], "it"
+        )
+
+        pkg_dict = localizer.localize(localizer.parse(self._dataset()), "it")
+
+        self.assertEqual(expected, pkg_dict)
+
+
+class TestCollationKey(unittest.TestCase):
+    titles = ["Zürich", "ärzte", "Aargau", "Émile", "eve", "Bern"]
+
+    def test_sort_without_accents(self):
+        with patch.object(ogdch_localize_utils, "icu", None):
+            ogdch_localize_utils.get_collation_key.cache_clear()
+            result = sorted(
+                self.titles,
+                key=lambda s: ogdch_localize_utils.get_collation_key(s, "de"),
+            )
+
+        self.assertEqual(["Aargau", "ärzte", "Bern", "Émile", "eve", "Zürich"], result)
+
+    def test_keys_are_cached(self):
+        ogdch_localize_utils.get_collation_key.cache_clear()
+        for _ in range(3):
+            ogdch_localize_utils.get_collation_key("Zürich", "de")
+        ogdch_localize_utils.get_collation_key("Zürich", "fr")
+
+        cache_info = ogdch_localize_utils.collation_key_cache_info()
+        self.assertEqual(2, cache_info.hits)
+        self.assertEqual(2, cache_info.misses)
+
+    @unittest.skipIf(ogdch_localize_utils.icu is None, "PyICU is not installed")
+    def test_sort_with_icu(self):
+        ogdch_localize_utils.get_collation_key.cache_clear()
+        result = sorted(
+            self.titles, key=lambda s: ogdch_localize_utils.get_collation_key(s, "de")
+        )
+
+        self.assertEqual(["Aargau", "ärzte", "Bern", "Émile", "eve", "Zürich"], result)
@@ -0,0 +1,100 @@
+"""Tests for helpers.ratelimit_utils.py."""
+
+from unittest import TestCase
+from unittest.mock import patch
+
+import pytest
+
+from ckanext.switzerland.helpers.ratelimit_utils import (
+    MemoryRateLimiter,
+    RedisRateLimiter,
+    get_rate_limiter,
+)
+
+
+class TestMemoryRateLimiter(TestCase):
+    @patch("ckanext.switzerland.helpers.ratelimit_utils.time.monotonic")
+    def test_calls_are_counted_in_sliding_window(self, mock_monotonic):
+        limiter = MemoryRateLimiter("test", limit=2, interval=60)
+
+        for now, expected_count in [(1000, 1), (1030, 2), (1060, 2), (1080, 3)]:
+            mock_monotonic.return_value = now
+            self.assertEqual(expected_count, limiter.hit("a"), now)
+
+        mock_monotonic.return_value = 1200
+        self.assertEqual(1, limiter.hit("a"))
+
+    def test_keys_are_counted_separately(self):
+        limiter = MemoryRateLimiter("test", limit=2, interval=60)
+        limiter.hit("a")
+        limiter.hit("a")
+
+        self.assertEqual(1, limiter.hit("b"))
+        self.assertEqual(3, limiter.hit("a"))
+
+    def test_only_limit_plus_one_calls_are_kept(self):
+        limiter = MemoryRateLimiter("test", limit=2, interval=60)
+        counts = [limiter.hit("a") for _ in range(1000)]
+
+        self.assertEqual([1, 2, 3, 3], counts[:4])
+        self.assertEqual(3, len(limiter._calls["a"]))
+
+    def test_least_recently_used_key_is_dropped(self):
+        limiter = MemoryRateLimiter("test", limit=1, interval=60, max_keys=2)
+        limiter.hit("a")
+        limiter.hit("b")
+        limiter.hit("a")
+        limiter.hit("c")
+
+        self.assertEqual(["a", "c"], list(limiter._calls))
+
+    def test_clear(self):
+        limiter = MemoryRateLimiter("test", limit=1, interval=60)
+        limiter.hit("a")
+        limiter.clear()
+
+        self.assertEqual(1, limiter.hit("a"))
+
+
+class TestGetRateLimiter(TestCase):
+    def test_limiter_is_reused(self):
+        limiter = get_rate_limiter("test-reuse", 2, 60, backend="memory")
+
+        self.assertIs(limiter, get_rate_limiter("test-reuse", 2, 60, backend="memory"))
+        self.assertIsNot(limiter, get_rate_limiter("test-reuse", 3, 60, "memory"))
+
+
+@pytest.mark.usefixtures("clean_redis")
+class TestRedisRateLimiter(object):
+    def test_calls_are_counted(self):
+        limiter = RedisRateLimiter("test", limit=2, interval=60)
+
+        assert [limiter.hit("a") for _ in range(4)] == [1, 2, 3, 3]
+        assert limiter.hit("b") == 1
+
+    def test_calls_are_shared_between_limiters(self):
+        # As in two worker processes
+        first = RedisRateLimiter("test", limit=2, interval=60)
+        second = RedisRateLimiter("test", limit=2, interval=60)
+
+        first.hit("a")
+        first.hit("a")
+
+        assert second.hit("a") == 3
+
+    @patch("ckanext.switzerland.helpers.ratelimit_utils.time.time")
+    def test_calls_expire(self, mock_time):
+        limiter = RedisRateLimiter("test", limit=2, interval=60)
+        mock_time.return_value = 1000
+        limiter.hit("a")
+        limiter.hit("a")
+
+        mock_time.return_value = 1061
+        assert limiter.hit("a") == 1
+
+    def test_clear(self):
+        limiter = RedisRateLimiter("test", limit=1, interval=60)
+        limiter.hit("a")
+        limiter.clear()
+
+        assert limiter.hit("a") == 1
@@ -0,0 +1,100 @@
+"""Tests for helpers.request_utils.py."""
+
+from unittest import TestCase
+from unittest.mock import MagicMock, patch
+
+import ckan.plugins.toolkit as tk
+import flask
+
+import ckanext.switzerland.helpers.request_utils as ogdch_request_utils
+
+
+class TestRequestCache(TestCase):
+    def setUp(self):
+        self.app = flask.Flask(__name__)
+        self.factory = MagicMock(side_effect=lambda: object())
+
+    def test_value_is_cached_within_request(self):
+        with self.app.test_request_context():
+            first = ogdch_request_utils.get_request_cached("key", self.factory)
+            second = ogdch_request_utils.get_request_cached("key", self.factory)
+
+        self.assertIs(first, second)
+        self.assertEqual(1, self.factory.call_count)
+
+    def test_value_is_not_shared_between_requests(self):
+        with self.app.test_request_context():
+            first = ogdch_request_utils.get_request_cached("key", self.factory)
+        with self.app.test_request_context():
+            second = ogdch_request_utils.get_request_cached("key", self.factory)
+
+        self.assertIsNot(first, second)
+        self.assertEqual(2, self.factory.call_count)
+
+    def test_no_caching_outside_of_request(self):
+        ogdch_request_utils.get_request_cached("key", self.factory)
+        ogdch_request_utils.get_request_cached("key", self.factory)
+
+        self.assertEqual(2, self.factory.call_count)
+
+    def test_value_is_cached_within_job(self):
+        with ogdch_request_utils.job_cache():
+            first = ogdch_request_utils.get_request_cached("key", self.factory)
+            second = ogdch_request_utils.get_request_cached("key", self.factory)
+        with ogdch_request_utils.job_cache():
+            third = ogdch_request_utils.get_request_cached("key", self.factory)
+
+        self.assertIs(first, second)
+        self.assertIsNot(first, third)
+        self.assertEqual(2, self.factory.call_count)
+
+    def test_clear_request_cache(self):
+        with self.app.test_request_context():
+            ogdch_request_utils.get_request_cached("key", self.factory)
+            ogdch_request_utils.clear_request_cache()
+            ogdch_request_utils.get_request_cached("key", self.factory)
+
+        self.assertEqual(2, self.factory.call_count)
+
+    @patch("ckan.plugins.toolkit.get_action")
+    def test_get_site_user(self, mock_get_action):
+        mock_get_action.return_value.return_value = {"name": "site-user"}
+
+        with self.app.test_request_context():
+            for _ in range(3):
+                user = ogdch_request_utils.get_site_user()
+
+        self.assertEqual({"name": "site-user"}, user)
+        mock_get_action.assert_called_once_with("get_site_user")
+
+
+class TestGetClientIp(TestCase):
+    def setUp(self):
+        self.app = flask.Flask(__name__)
+
+    def _get_client_ip(self, forwarded_for=None, proxy_count=0):
+        headers = {"X-Forwarded-For": forwarded_for} if forwarded_for else {}
+        with patch.dict(
+            tk.config, {"ckanext.switzerland.trusted_proxy_count": proxy_count}
+        ), self.app.test_request_context(
+            headers=headers, environ_base={"REMOTE_ADDR": "10.0.0.1"}
+        ):
+            return ogdch_request_utils.get_client_ip()
+
+    def test_remote_address(self):
+        self.assertEqual("10.0.0.1", self._get_client_ip())
+
+    def test_forwarded_for_is_ignored_without_proxy(self):
+        self.assertEqual("10.0.0.1", self._get_client_ip("1.2.3.4"))
+
+    def test_address_added_by_proxy(self):
+        self.assertEqual(
+            "1.2.3.4", self._get_client_ip("5.6.7.8, 1.2.3.4", proxy_count=1)
+        )
+        self.assertEqual(
+            "5.6.7.8", self._get_client_ip("5.6.7.8, 1.2.3.4", proxy_count=2)
+        )
+        self.assertEqual("1.2.3.4", self._get_client_ip("1.2.3.4", proxy_count=3))
+
+    def test_no_request(self):
+        self.assertIsNone(ogdch_request_utils.get_client_ip())
@@ -0,0 +1,64 @@
+"""Tests for helpers.schema_utils.py."""
+
+import json
+import os
+from unittest import TestCase
+
+import ckanext.switzerland.helpers.schema_utils as ogdch_schema_utils
+
+__location__ = os.path.realpath(os.path.join(os.getcwd(), os.path.dirname(__file__)))
+
+
+def _load_fields(filename, section):
+    """Load the fields of one of our schemas, with their presets expanded
+    like scheming does it.
+    """
+    path = os.path.join(__location__, "..", filename)
+    with open(os.path.join(__location__, "..", "presets.json")) as f:
+        presets = {p["preset_name"]: p["values"] for p in json.load(f)["presets"]}
+    with open(path) as f:
+        fields = json.load(f)[section]
+    return [dict(presets.get(field.get("preset"), {}), **field) for field in fields]
+
+
+class TestGetJsonFields(TestCase):
+    def test_dataset_fields(self):
+        json_fields = ogdch_schema_utils.get_json_fields(
+            _load_fields("dcat-ap-switzerland_scheming.json", "dataset_fields")
+        )
+
+        for field_name in [
+            "title",
+            "description",
+            "keywords",
+            "temporals",
+            "contact_points",
+            "language",
+        ]:
+            self.assertTrue(json_fields[field_name], field_name)
+        for field_name in ["name", "identifier", "issued", "accrual_periodicity"]:
+            self.assertFalse(json_fields[field_name], field_name)
+        self.assertNotIn("version", json_fields)
+
+    def test_resource_fields(self):
+        json_fields = ogdch_schema_utils.get_json_fields(
+            _load_fields("dcat-ap-switzerland_scheming.json", "resource_fields")
+        )
+
+        self.assertTrue(json_fields["title"])
+        self.assertTrue(json_fields["documentation"])
+        self.assertFalse(json_fields["format"])
+        self.assertFalse(json_fields["byte_size"])
+
+    def test_organization_fields(self):
+        json_fields = ogdch_schema_utils.get_json_fields(
+            _load_fields("multilingual_organization_scheming.json", "fields")
+        )
+
+        self.assertEqual(
+            {"title", "display_name", "description"},
+            {field_name for field_name, is_json in json_fields.items() if is_json},
+        )
+
+    def test_no_schema(self):
+        self.assertIsNone(ogdch_schema_utils.get_json_fields(None))
@@ -0,0 +1,193 @@
+"""Tests for helpers.solr_utils.py."""
+
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import TestCase
+from unittest.mock import patch
+
+import ckan.plugins.toolkit as tk
+import pysolr
+import pytest
+
+import ckanext.switzerland.helpers.solr_utils as ogdch_solr_utils
+from ckanext.switzerland.tests.conftest import get_context
+
+
+class _StubSolrHandler(BaseHTTPRequestHandler):
+    """Answers every search with an empty result, after answering with the
+    status codes in server.statuses first. One instance handles all requests
+    that are sent over the same connection.
+    """
+
+    protocol_version = "HTTP/1.1"
+
+    def setup(self):
+        super().setup()
+        self.server.connections += 1
+
+    def do_GET(self):
+        self.server.requests += 1
+        status = self.server.statuses.pop(0) if self.server.statuses else 200
+        body = json.dumps(
+            {"responseHeader": {"status": 0}, "response": {"numFound": 0, "docs": []}}
+        ).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class TestSolrConnection(TestCase):
+    def setUp(self):
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), _StubSolrHandler)
+        self.server.connections = 0
+        self.server.requests = 0
+        self.server.statuses = []
+        thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        thread.start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+
+        solr_url = f"http://127.0.0.1:{self.server.server_address[1]}/solr/ckan"
+        settings_patcher = patch(
+            "ckan.lib.search.common.SolrSettings.get",
+            return_value=(solr_url, None, None),
+        )
+        settings_patcher.start()
+        self.addCleanup(settings_patcher.stop)
+
+        config_patcher = patch.dict(
+            tk.config,
+            {
+                "solr_timeout": 10,
+                "ckanext.switzerland.solr_connect_timeout": 2,
+                "ckanext.switzerland.solr_pool_size": 4,
+                "ckanext.switzerland.solr_retries": 2,
+                "ckanext.switzerland.solr_retry_backoff": "0",
+            },
+        )
+        config_patcher.start()
+        self.addCleanup(config_patcher.stop)
+
+        ogdch_solr_utils.reset_connection()
+        self.addCleanup(ogdch_solr_utils.reset_connection)
+
+    def test_connection_is_reused(self):
+        for _ in range(5):
+            ogdch_solr_utils.get_connection().search("*:*")
+
+        self.assertEqual(5, self.server.requests)
+        self.assertEqual(1, self.server.connections)
+        self.assertEqual(
+            {"requests": 5, "connections": 1, "reused": 4},
+            ogdch_solr_utils.get_connection_stats(),
+        )
+
+    def test_connection_is_shared_by_threads(self):
+        connections = []
+
+        def search():
+            connection = ogdch_solr_utils.get_connection()
+            connection.search("*:*")
+            connections.append(connection)
+
+        threads = [threading.Thread(target=search) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(8, self.server.requests)
+        self.assertEqual(1, len({id(connection) for connection in connections}))
+
+        # Up to pool_size connections are kept open for later requests
+        opened = self.server.connections
+        for _ in range(4):
+            ogdch_solr_utils.get_connection().search("*:*")
+        self.assertEqual(opened, self.server.connections)
+
+    def test_timeouts(self):
+        self.assertEqual((2, 10), ogdch_solr_utils.get_connection().timeout)
+
+    def test_unavailable_solr_is_retried(self):
+        self.server.statuses = [503, 503]
+
+        results = ogdch_solr_utils.get_connection().search("*:*")
+
+        self.assertEqual(0, results.hits)
+        self.assertEqual(3, self.server.requests)
+
+    def test_new_connection_when_settings_change(self):
+        connection = ogdch_solr_utils.get_connection()
+        self.assertIs(connection, ogdch_solr_utils.get_connection())
+
+        with patch.dict(tk.config, {"ckanext.switzerland.solr_retries": 0}):
+            self.assertIsNot(connection, ogdch_solr_utils.get_connection())
+
+    def test_rejected_batch_is_not_sent_again(self):
+        with patch.object(ogdch_solr_utils, "commit") as solr_commit, patch(
+            "pysolr.Solr.add", side_effect=pysolr.SolrError("Bad request")
+        ) as solr_add:
+            with self.assertRaises(pysolr.SolrError):
+                with ogdch_solr_utils.deferred_indexing() as connection:
+                    connection.add([{"id": "dataset-1"}])
+                    connection.flush()
+
+        self.assertEqual(1, solr_add.call_count)
+        solr_commit.assert_called_once()
+
+    def test_discarded_batch(self):
+        with patch.object(ogdch_solr_utils, "commit") as solr_commit, patch(
+            "pysolr.Solr.add", side_effect=[pysolr.SolrError("Bad request"), None]
+        ) as solr_add:
+            with ogdch_solr_utils.deferred_indexing() as connection:
+                connection.add([{"id": "dataset-1"}])
+                with self.assertRaises(pysolr.SolrError):
+                    connection.flush()
+                self.assertEqual(["dataset-1"], connection.pending_ids())
+                connection.discard()
+                connection.add([{"id": "dataset-2"}])
+
+        self.assertEqual(2, solr_add.call_count)
+        self.assertEqual([{"id": "dataset-2"}], solr_add.call_args.kwargs["docs"])
+        solr_commit.assert_called_once()
+
+    def test_no_stats_without_connection(self):
+        self.assertEqual(
+            {"requests": 0, "connections": 0, "reused": 0},
+            ogdch_solr_utils.get_connection_stats(),
+        )
+
+
+@pytest.mark.ckan_config("ckan.plugins", "ogdch ogdch_pkg scheming_datasets fluent")
+@pytest.mark.usefixtures("with_plugins", "clean_db", "clean_index")
+class TestDeferredIndexing(object):
+    def _search_titles(self):
+        results = tk.get_action("package_search")({}, {"q": "*:*"})["results"]
+        return [dataset["title"]["en"] for dataset in results]
+
+    def test_datasets_are_indexed_at_the_end(self, dataset):
+        title = dict(dataset["title"], en="New title")
+
+        with ogdch_solr_utils.deferred_indexing() as connection:
+            tk.get_action("package_patch")(
+                get_context(), {"id": dataset["id"], "title": title}
+            )
+            assert connection.pending_ids() == [dataset["id"]]
+            assert self._search_titles() == [dataset["title"]["en"]]
+
+        assert self._search_titles() == ["New title"]
+        assert connection.pending_count() == 0
+
+    def test_flush(self, dataset):
+        with ogdch_solr_utils.deferred_indexing() as connection:
+            tk.get_action("package_patch")(
+                get_context(), {"id": dataset["id"], "notes": {"en": "New notes"}}
+            )
+            assert connection.flush() == 1
+            assert connection.flush() == 0
@@ -0,0 +1,219 @@
+"""Tests for helpers.suggest_utils.py."""
+
+import random
+import re
+from unittest import TestCase
+from unittest.mock import MagicMock, patch
+
+import ckan.plugins.toolkit as tk
+from unidecode import unidecode
+
+import ckanext.switzerland.helpers.suggest_utils as ogdch_suggest_utils
+
+
+def _solr_response(lang, q, terms):
+    response = MagicMock()
+    response.raw_response = {
+        "suggest": {
+            f"ckanSuggester_{lang}": {
+                q: {
+                    "numFound": len(terms),
+                    "suggestions": [
+                        {"term": term, "weight": 0, "payload": ""} for term in terms
+                    ],
+                }
+            }
+        }
+    }
+    return response
+
+
+class TestNormalizeQuery(TestCase):
+    def test_normalize_query(self):
+        self.assertEqual("wald", ogdch_suggest_utils.normalize_query("Wald"))
+        self.assertEqual("zurich", ogdch_suggest_utils.normalize_query("Zürich"))
+        self.assertEqual(
+            "wald zurich", ogdch_suggest_utils.normalize_query("  Wald   Zürich")
+        )
+
+    def test_trailing_space_is_kept(self):
+        self.assertEqual("wald ", ogdch_suggest_utils.normalize_query("Wald  "))
+        self.assertEqual("", ogdch_suggest_utils.normalize_query("  "))
+
+
+class TestMatchesQuery(TestCase):
+    def test_last_token_is_a_prefix(self):
+        self.assertTrue(ogdch_suggest_utils.matches_query("Wälder", "wal"))
+        self.assertTrue(ogdch_suggest_utils.matches_query("Schweizer Wald", "wal"))
+        self.assertFalse(ogdch_suggest_utils.matches_query("Schweizer Wald", "ald"))
+
+    def test_other_tokens_must_match(self):
+        self.assertTrue(
+            ogdch_suggest_utils.matches_query("Wald in der Schweiz", "wald sch")
+        )
+        self.assertFalse(
+            ogdch_suggest_utils.matches_query("Wälder der Schweiz", "wald sch")
+        )
+        self.assertFalse(ogdch_suggest_utils.matches_query("Walder", "wald "))
+
+    def test_highlighting_is_ignored(self):
+        self.assertTrue(ogdch_suggest_utils.matches_query("<b>Wal</b>d", "wald"))
+
+
+@patch.dict(
+    tk.config,
+    {
+        "ckanext.switzerland.cache_backend": "memory",
+        "ckanext.switzerland.autosuggest_cache_ttl": 300,
+    },
+)
+class TestGetSuggestions(TestCase):
+    def setUp(self):
+        patcher = patch(
+            "ckanext.switzerland.helpers.solr_utils.get_connection",
+            return_value=MagicMock(),
+        )
+        self.solr = patcher.start()()
+        self.addCleanup(patcher.stop)
+        ogdch_suggest_utils.get_suggestion_cache("de").clear()
+
+    def test_suggestions_are_cached(self):
+        self.solr.search.return_value = _solr_response("de", "Wal", ["<b>Wal</b>d"])
+
+        for q in ["Wal", "wal", "Wal"]:
+            terms = ogdch_suggest_utils.get_suggestions(q, "de", "NOT private")
+
+        self.assertEqual(["<b>Wal</b>d"], terms)
+        self.solr.search.assert_called_once_with(
+            "",
+            search_handler="/suggest_de",
+            **{"suggest.q": "Wal", "suggest.count": 10, "suggest.cfq": "NOT private"},
+        )
+
+    def test_suggestions_are_cached_per_filter_query(self):
+        self.solr.search.return_value = _solr_response("de", "Wal", ["<b>Wal</b>d"])
+
+        ogdch_suggest_utils.get_suggestions("Wal", "de", "NOT private")
+        ogdch_suggest_utils.get_suggestions("Wal", "de", "NOT private AND x:y")
+
+        self.assertEqual(2, self.solr.search.call_count)
+
+    def test_suggestions_are_filtered_from_shorter_query(self):
+        self.solr.search.return_value = _solr_response(
+            "de", "wa", ["<b>Wa</b>ld", "<b>Wa</b>sser", "Schweizer <b>Wa</b>ld"]
+        )
+
+        ogdch_suggest_utils.get_suggestions("wa", "de", "NOT private")
+        terms = ogdch_suggest_utils.get_suggestions("wal", "de", "NOT private")
+        more_terms = ogdch_suggest_utils.get_suggestions("wald s", "de", "NOT private")
+
+        self.assertEqual(["Wald", "Schweizer Wald"], terms)
+        self.assertEqual(["Schweizer Wald"], more_terms)
+        self.solr.search.assert_called_once()
+
+    def test_incomplete_suggestions_are_not_filtered(self):
+        terms = [f"<b>Wa</b>ld {i}" for i in range(10)]
+        self.solr.search.side_effect = [
+            _solr_response("de", "wa", terms),
+            _solr_response("de", "wal", terms),
+        ]
+
+        ogdch_suggest_utils.get_suggestions("wa", "de", "NOT private")
+        ogdch_suggest_utils.get_suggestions("wal", "de", "NOT private")
+
+        self.assertEqual(2, self.solr.search.call_count)
+
+    def test_no_caching_with_ttl_0(self):
+        self.solr.search.return_value = _solr_response("de", "wa", ["<b>Wa</b>ld"])
+
+        with patch.dict(tk.config, {"ckanext.switzerland.autosuggest_cache_ttl": 0}):
+            ogdch_suggest_utils.get_suggestions("wa", "de", "NOT private")
+            ogdch_suggest_utils.get_suggestions("wal", "de", "NOT private")
+
+        self.assertEqual(2, self.solr.search.call_count)
+
+
+def _previous_highlight(term, q):
+    """The highlighting before it was done with a Highlighter."""
+    if "<b>" in term:
+        return term
+    clean_q = unidecode(q)
+    clean_term = unidecode(term)
+
+    re_q = re.escape(clean_q)
+    m = re.search(re_q, clean_term, re.I)
+    if m:
+        replace_text = term[m.start() : m.end()]
+        term = term.replace(replace_text, f"<b>{replace_text}</b>")
+    return term
+
+
+class TestHighlighter(TestCase):
+    def test_highlight(self):
+        highlighter = ogdch_suggest_utils.Highlighter("wal")
+
+        self.assertEqual("<b>Wal</b>d", highlighter.highlight("Wald"))
+        self.assertEqual(
+            "Schweizer <b>Wäl</b>der", highlighter.highlight("Schweizer Wälder")
+        )
+        self.assertEqual("Wasser", highlighter.highlight("Wasser"))
+        self.assertEqual("<b>Wa</b>ld", highlighter.highlight("<b>Wa</b>ld"))
+
+    def test_only_the_first_occurrence_is_highlighted(self):
+        highlighter = ogdch_suggest_utils.Highlighter("data")
+
+        self.assertEqual(
+            "Open <b>Data</b> and Data", highlighter.highlight("Open Data and Data")
+        )
+
+    def test_transliterated_characters(self):
+        self.assertEqual(
+            "Stra<b>ß</b>e",
+            ogdch_suggest_utils.Highlighter("ss").highlight("Straße"),
+        )
+        self.assertEqual(
+            "<b>Straße</b>n",
+            ogdch_suggest_utils.Highlighter("strasse").highlight("Straßen"),
+        )
+        self.assertEqual(
+            "Zü<b>rich</b>",
+            ogdch_suggest_utils.Highlighter("rich").highlight("Zürich"),
+        )
+        self.assertEqual(
+            "Straße <b>Cafe\u0301s</b>",
+            ogdch_suggest_utils.Highlighter("cafes").highlight("Straße Cafe\u0301s"),
+        )
+
+    def test_fold_accents(self):
+        self.assertEqual(
+            ("Strasse", (0, 1, 2, 3, 4, 4, 5)),
+            ogdch_suggest_utils.fold_accents("Straße"),
+        )
+        folded, offsets = ogdch_suggest_utils.fold_accents("Wald")
+        self.assertEqual(("Wald", [0, 1, 2, 3]), (folded, list(offsets)))
+
+    def test_same_highlighting_as_before_on_ascii_input(self):
+        rnd = random.Random(19)
+        alphabet = "acdAD .-()*+?[\\"
+        for _ in range(2000):
+            term = "".join(rnd.choices(alphabet, k=rnd.randint(0, 12)))
+            if term and rnd.random() < 0.8:
+                # Mostly queries that occur in the term, in any case
+                start = rnd.randrange(len(term))
+                q = term[start : rnd.randint(start + 1, len(term))]
+                q = "".join(rnd.choice([c.lower(), c.upper()]) for c in q)
+            else:
+                q = "".join(rnd.choices(alphabet, k=rnd.randint(1, 3)))
+
+            highlighted = ogdch_suggest_utils.Highlighter(q).highlight(term)
+            previous = _previous_highlight(term, q)
+
+            m = re.search(re.escape(q), term, re.I)
+            if m is not None and "<b>" not in term:
+                # Previously, every occurrence of the match was highlighted
+                first_end = previous.index("</b>") + len("</b>")
+                match = m.group()
+                previous = previous[:first_end] + previous[first_end:].replace(
+                    f"<b>{match}</b>", match
+                )
+            self.assertEqual(previous, highlighted, (term, q))
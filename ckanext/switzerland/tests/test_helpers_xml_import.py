@@ -0,0 +1,130 @@
+"""Tests for helpers.xml_import_utils.py."""
+
+import io
+import os
+import xml.etree.ElementTree as ET
+from unittest import TestCase
+
+import rdflib
+
+from ckanext.switzerland.helpers.xml_import_utils import iter_datasets
+
+__location__ = os.path.realpath(os.path.join(os.getcwd(), os.path.dirname(__file__)))
+
+DCAT = rdflib.Namespace("http://www.w3.org/ns/dcat#")
+DCT = rdflib.Namespace("http://purl.org/dc/terms/")
+
+CATALOG = """<?xml version="1.0" encoding="UTF-8"?>
+<rdf:RDF xmlns:rdf="http://www.w3.org/1999/02/22-rdf-syntax-ns#"
+         xmlns:dcat="http://www.w3.org/ns/dcat#"
+         xmlns:dct="http://purl.org/dc/terms/">
+  <rdf:Description rdf:about="https://example.org/dataset/1">
+    <rdf:type rdf:resource="http://www.w3.org/ns/dcat#Dataset"/>
+    <dct:identifier>1@test-org</dct:identifier>
+  </rdf:Description>
+  <dcat:Dataset rdf:about="https://example.org/dataset/2">
+    <dct:identifier>2@test-org</dct:identifier>
+    <dct:relation>
+      <dcat:Dataset rdf:about="https://example.org/dataset/3">
+        <dct:identifier>3@test-org</dct:identifier>
+      </dcat:Dataset>
+    </dct:relation>
+  </dcat:Dataset>
+</rdf:RDF>
+"""
+
+SHARED_PUBLISHER_CATALOG = """<?xml version="1.0" encoding="UTF-8"?>
+<rdf:RDF xmlns:rdf="http://www.w3.org/1999/02/22-rdf-syntax-ns#"
+         xmlns:dcat="http://www.w3.org/ns/dcat#"
+         xmlns:dct="http://purl.org/dc/terms/"
+         xmlns:foaf="http://xmlns.com/foaf/0.1/">
+  <dcat:Dataset rdf:about="https://example.org/dataset/1">
+    <dct:identifier>1@test-org</dct:identifier>
+    <dct:publisher>
+      <foaf:Organization rdf:about="https://example.org/publisher">
+        <foaf:name>Publisher</foaf:name>
+      </foaf:Organization>
+    </dct:publisher>
+  </dcat:Dataset>
+  <dcat:Dataset rdf:about="https://example.org/dataset/2">
+    <dct:identifier>2@test-org</dct:identifier>
+    <dct:publisher rdf:resource="https://example.org/publisher"/>
+  </dcat:Dataset>
+</rdf:RDF>
+"""
+
+
+class TestIterDatasets(TestCase):
+    def test_datasets_of_catalog(self):
+        path = os.path.join(__location__, "fixtures", "catalog.xml")
+        whole_graph = rdflib.Graph()
+        whole_graph.parse(path, format="xml")
+
+        datasets = list(iter_datasets(path))
+
+        self.assertEqual(
+            [
+                "346252@bundesamt-fur-statistik-bfs",
+                "346266@bundesamt-fur-statistik-bfs",
+            ],
+            [str(graph.value(ref, DCT.identifier)) for graph, ref in datasets],
+        )
+        for graph, ref in datasets:
+            self.assertEqual(3, len(list(graph.objects(ref, DCAT.distribution))))
+        # Only the triples about the catalog itself are left out
+        self.assertEqual(len(whole_graph) - 5, sum(len(graph) for graph, _ in datasets))
+
+    def test_descriptions_and_nested_datasets(self):
+        datasets = list(iter_datasets(io.BytesIO(CATALOG.encode())))
+
+        self.assertEqual(
+            [
+                rdflib.URIRef("https://example.org/dataset/1"),
+                rdflib.URIRef("https://example.org/dataset/2"),
+            ],
+            [ref for _, ref in datasets],
+        )
+        graph, ref = datasets[1]
+        self.assertEqual(
+            rdflib.URIRef("https://example.org/dataset/3"),
+            graph.value(ref, DCT.relation),
+        )
+
+    def test_flat_catalog(self):
+        path = os.path.join(__location__, "fixtures", "catalog.xml")
+        whole_graph = rdflib.Graph()
+        whole_graph.parse(path, format="xml")
+        flat_catalog = whole_graph.serialize(format="xml", encoding="utf-8")
+
+        datasets = list(iter_datasets(io.BytesIO(flat_catalog)))
+
+        self.assertEqual(
+            [
+                "346252@bundesamt-fur-statistik-bfs",
+                "346266@bundesamt-fur-statistik-bfs",
+            ],
+            sorted(str(graph.value(ref, DCT.identifier)) for graph, ref in datasets),
+        )
+        for graph, ref in datasets:
+            distributions = list(graph.objects(ref, DCAT.distribution))
+            self.assertEqual(3, len(distributions))
+            for distribution in distributions:
+                self.assertIsNotNone(graph.value(distribution, DCAT.accessURL))
+
+    def test_shared_publisher(self):
+        datasets = list(iter_datasets(io.BytesIO(SHARED_PUBLISHER_CATALOG.encode())))
+
+        self.assertEqual(
+            [
+                rdflib.URIRef("https://example.org/dataset/1"),
+                rdflib.URIRef("https://example.org/dataset/2"),
+            ],
+            [ref for _, ref in datasets],
+        )
+        for graph, ref in datasets:
+            publisher = graph.value(ref, DCT.publisher)
+            self.assertEqual("Publisher", str(graph.value(publisher, rdflib.FOAF.name)))
+
+    def test_invalid_xml(self):
+        with self.assertRaises(ET.ParseError):
+            list(iter_datasets(io.BytesIO(b"<rdf:RDF><dcat:Dataset></rdf:RDF>")))
@@ -1,11 +1,30 @@
 import logging
+import os
+import re
+import shutil
+from copy import copy
+from unittest.mock import MagicMock, patch
 
+import ckan.model as model
 import ckan.plugins.toolkit as tk
 import ckan.tests.factories as factories
+import pysolr
 import pytest
+from ckan.lib import jobs
 from ckan.lib.helpers import url_for
+from ckan.lib.search.query import PackageSearchQuery
 
-from ckanext.switzerland.tests.conftest import get_context
+import ckanext.switzerland.helpers.logic_helpers as ogdch_logic_helpers
+import ckanext.switzerland.helpers.plugin_utils as ogdch_plugin_utils
+from ckanext.switzerland import logic as ogdch_logic
+from ckanext.switzerland.helpers.xml_import_utils import (
+    DatasetImporter,
+    _split_repeated_identifiers,
+    iter_datasets,
+)
+from ckanext.switzerland.tests.conftest import dataset_dict, get_context
+
+__location__ = os.path.realpath(os.path.join(os.getcwd(), os.path.dirname(__file__)))
 
 log = logging.getLogger(__name__)
 
@@ -157,3 +176,745 @@ class TestForceResetPasswords(object):
         )
 
         assert len(mail_server.get_smtp_messages()) == 0
+
+
+@pytest.mark.ckan_config(
+    "ckan.plugins",
+    "ogdch ogdch_pkg ogdch_group ogdch_org scheming_datasets fluent",
+)
+@pytest.mark.usefixtures("with_plugins", "clean_db", "clean_index")
+class TestOgdchCounts(object):
+    def setup_method(self):
+        ogdch_logic_helpers.invalidate_counts_cache()
+
+    def test_counts(self, dataset, extra_datasets):
+        counts = tk.get_action("ogdch_counts")({}, {})
+
+        assert counts["total_dataset_count"] == 4
+        assert counts["showcase_count"] == 0
+        assert counts["groups"] == {"group1": 1, "group2": 1}
+        assert counts["organization_count"] == 1
+
+    def test_counts_match_package_search_and_group_list(self, dataset, extra_datasets):
+        private_dataset_dict = copy(dataset_dict)
+        private_dataset_dict["name"] = "private-dataset"
+        private_dataset_dict["identifier"] = "private-dataset@test-org"
+        private_dataset_dict["private"] = True
+        private_dataset_dict["groups"] = [{"name": "group1"}]
+        tk.get_action("package_create")(get_context(), private_dataset_dict)
+        tk.get_action("group_create")(
+            get_context(),
+            {
+                "name": "empty-group",
+                "title": {"de": "DE", "fr": "FR", "it": "IT", "en": "EN"},
+            },
+        )
+
+        counts = tk.get_action("ogdch_counts")({}, {})
+
+        # The numbers as they were computed before ogdch_counts used a
+        # single Solr request
+        req_context = {"user": get_context()["user"]}
+        groups = tk.get_action("group_list")(req_context, {"all_fields": True})
+        expected_groups = {group["name"]: group["package_count"] for group in groups}
+        assert list(counts["groups"].items()) == list(expected_groups.items())
+        assert counts["groups"]["group1"] == 2
+        assert counts["groups"]["empty-group"] == 0
+        assert counts["total_dataset_count"] == 4
+        assert counts["total_dataset_count"] == (
+            ogdch_logic_helpers.get_dataset_count("dataset")
+        )
+        assert counts["showcase_count"] == (
+            ogdch_logic_helpers.get_dataset_count("showcase")
+        )
+        assert counts["organization_count"] == len(
+            tk.get_action("organization_list")(req_context, {})
+        )
+
+    def test_counts_are_cached(self, dataset):
+        with patch(
+            "ckanext.switzerland.logic.get_dataset_and_group_counts",
+            wraps=ogdch_logic_helpers.get_dataset_and_group_counts,
+        ) as get_counts:
+            first = tk.get_action("ogdch_counts")({}, {})
+            second = tk.get_action("ogdch_counts")({}, {})
+
+        assert first == second
+        assert get_counts.call_count == 1
+
+    def test_cache_is_invalidated_by_dataset_changes(self, dataset):
+        assert tk.get_action("ogdch_counts")({}, {})["total_dataset_count"] == 1
+
+        new_dataset_dict = copy(dataset_dict)
+        new_dataset_dict["name"] = "new-dataset"
+        new_dataset_dict["identifier"] = "new-dataset@test-org"
+        new_dataset = tk.get_action("package_create")(get_context(), new_dataset_dict)
+        assert tk.get_action("ogdch_counts")({}, {})["total_dataset_count"] == 2
+
+        tk.get_action("package_delete")(get_context(), {"id": new_dataset["id"]})
+        assert tk.get_action("ogdch_counts")({}, {})["total_dataset_count"] == 1
+
+    def test_cache_is_invalidated_by_organization_changes(self, dataset):
+        assert tk.get_action("ogdch_counts")({}, {})["organization_count"] == 1
+
+        tk.get_action("organization_create")(
+            get_context(),
+            {
+                "name": "new-org",
+                "title": {"de": "DE", "fr": "FR", "it": "IT", "en": "EN"},
+                "political_level": "confederation",
+            },
+        )
+
+        assert tk.get_action("ogdch_counts")({}, {})["organization_count"] == 2
+
+    def test_counts_cached_before_commit_are_invalidated(self, dataset):
+        invalidate_counts_cache = ogdch_logic_helpers.invalidate_counts_cache
+
+        def invalidate_and_count():
+            invalidate_counts_cache()
+            # As if another request had counted the datasets before the commit
+            tk.get_action("ogdch_counts")({}, {})
+
+        new_dataset_dict = copy(dataset_dict)
+        new_dataset_dict["name"] = "new-dataset"
+        new_dataset_dict["identifier"] = "new-dataset@test-org"
+        with patch.object(
+            ogdch_logic_helpers,
+            "invalidate_counts_cache",
+            side_effect=invalidate_and_count,
+        ):
+            tk.get_action("package_create")(get_context(), new_dataset_dict)
+
+        assert tk.get_action("ogdch_counts")({}, {})["total_dataset_count"] == 2
+
+    @pytest.mark.ckan_config("ckanext.switzerland.counts_cache_ttl", 0)
+    def test_caching_can_be_disabled(self, dataset):
+        with patch(
+            "ckanext.switzerland.logic.get_dataset_and_group_counts",
+            wraps=ogdch_logic_helpers.get_dataset_and_group_counts,
+        ) as get_counts:
+            tk.get_action("ogdch_counts")({}, {})
+            tk.get_action("ogdch_counts")({}, {})
+
+        assert get_counts.call_count == 2
+
+
+@pytest.mark.ckan_config(
+    "ckan.plugins",
+    "ogdch ogdch_pkg scheming_datasets fluent",
+)
+@pytest.mark.usefixtures("with_plugins", "clean_db", "clean_index")
+class TestMapRelatedDatasets(object):
+    def _create_dataset_with_relations(self):
+        data = copy(dataset_dict)
+        data["name"] = "dataset-with-relations"
+        data["identifier"] = "dataset-with-relations@test-org"
+        data["see_alsos"] = [
+            {"dataset_identifier": "dataset2@test-org"},
+            {"dataset_identifier": "missing@test-org"},
+            {"dataset_identifier": "test@test-org"},
+        ]
+        data["qualified_relations"] = [
+            {
+                "relation": "https://opendata.swiss/perma/dataset3@test-org",
+                "had_role": "http://www.iana.org/assignments/relation/related",
+            },
+            {
+                "relation": "https://opendata.swiss/perma/missing@test-org",
+                "had_role": "http://www.iana.org/assignments/relation/related",
+            },
+            {
+                "relation": "https://example.com/dataset/dataset4",
+                "had_role": "http://www.iana.org/assignments/relation/related",
+            },
+        ]
+        return tk.get_action("package_create")(get_context(), data)
+
+    def test_related_datasets(self, dataset, extra_datasets):
+        result = self._create_dataset_with_relations()
+
+        ogdch_logic._map_related_datasets(get_context(), result)
+
+        assert result["related_datasets"] == [
+            {
+                "title": {
+                    "de": "DE Test",
+                    "fr": "FR Test",
+                    "it": "IT Test",
+                    "en": "EN Test",
+                },
+                "name": "dataset2",
+                "dataset_identifier": "dataset2@test-org",
+            },
+            {
+                "title": {
+                    "de": "DE Test",
+                    "fr": "FR Test",
+                    "it": "IT Test",
+                    "en": "EN Test",
+                },
+                "name": "test-dataset",
+                "dataset_identifier": "test@test-org",
+            },
+            {
+                "title": {
+                    "de": "DE Test",
+                    "fr": "FR Test",
+                    "it": "IT Test",
+                    "en": "EN Test",
+                },
+                "name": "dataset3",
+                "dataset_identifier": "dataset3@test-org",
+            },
+            {"dataset_identifier": "https://opendata.swiss/perma/missing@test-org"},
+            {"dataset_identifier": "https://example.com/dataset/dataset4"},
+        ]
+
+    def test_related_datasets_are_found_with_one_search(self, dataset, extra_datasets):
+        result = self._create_dataset_with_relations()
+
+        with patch.object(
+            PackageSearchQuery, "run", autospec=True, side_effect=PackageSearchQuery.run
+        ) as run:
+            ogdch_logic._map_related_datasets(get_context(), result)
+
+        assert run.call_count == 1
+        assert len(result["related_datasets"]) == 5
+
+    def test_no_related_datasets(self, dataset):
+        result = tk.get_action("package_show")(get_context(), {"id": dataset["id"]})
+
+        with patch.object(
+            PackageSearchQuery, "run", autospec=True, side_effect=PackageSearchQuery.run
+        ) as run:
+            ogdch_logic._map_related_datasets(get_context(), result)
+
+        assert run.call_count == 0
+        assert result["related_datasets"] == []
+
+
+@pytest.mark.ckan_config(
+    "ckan.plugins",
+    "ogdch ogdch_pkg scheming_datasets fluent image_view",
+)
+@pytest.mark.usefixtures("with_plugins", "clean_db", "clean_index")
+class TestResourceViews(object):
+    def _create_dataset_with_resources(self, count):
+        data = copy(dataset_dict)
+        data["resources"] = [
+            {
+                "url": f"http://example.com/image{n}.png",
+                "title": {"de": f"Bild {n}", "fr": "", "it": "", "en": ""},
+                "license": "https://opendata.swiss/terms-of-use#terms_by",
+            }
+            for n in range(count)
+        ]
+        return tk.get_action("package_create")(get_context(), data)
+
+    def test_resource_ids_with_views(self, org):
+        dataset = self._create_dataset_with_resources(4)
+        resource_ids = [resource["id"] for resource in dataset["resources"]]
+
+        for resource_id in resource_ids[:2]:
+            tk.get_action("resource_view_create")(
+                get_context(),
+                {
+                    "resource_id": resource_id,
+                    "view_type": "image_view",
+                    "title": "Bild",
+                },
+            )
+        # a view whose plugin is not enabled does not count
+        model.Session.add(
+            model.ResourceView(
+                resource_id=resource_ids[2],
+                view_type="disabled_view",
+                title="Disabled",
+                order=0,
+            )
+        )
+        model.Session.commit()
+
+        resource_ids_with_views = ogdch_logic_helpers.get_resource_ids_with_views(
+            resource_ids
+        )
+
+        assert resource_ids_with_views == set(resource_ids[:2])
+        for resource_id in resource_ids:
+            resource_views = tk.get_action("resource_view_list")(
+                get_context(), {"id": resource_id}
+            )
+            assert (resource_id in resource_ids_with_views) == (len(resource_views) > 0)
+
+    def test_no_resources(self):
+        assert ogdch_logic_helpers.get_resource_ids_with_views([]) == set()
+
+
+@pytest.mark.ckan_config(
+    "ckan.plugins",
+    "ogdch ogdch_pkg scheming_datasets fluent",
+)
+@pytest.mark.usefixtures("with_plugins", "clean_db", "clean_index")
+class TestOgdchPackageShow(object):
+    def _ogdch_package_show(self, app, id):
+        url = url_for("api.action", logic_function="ogdch_package_show", ver=3)
+        with patch(
+            "ckanext.switzerland.logic.get_showcases_for_dataset", return_value=[]
+        ):
+            return app.get(url, params={"id": id}).json["result"]
+
+    def test_dataset_is_loaded_once(self, app, dataset):
+        # after_dataset_show is called once for every package_show
+        with patch(
+            "ckanext.switzerland.helpers.plugin_utils.ogdch_prepare_pkg_dict_for_api",
+            wraps=ogdch_plugin_utils.ogdch_prepare_pkg_dict_for_api,
+        ) as prepare_pkg_dict_for_api:
+            result = self._ogdch_package_show(app, dataset["name"])
+
+        assert result["name"] == dataset["name"]
+        assert prepare_pkg_dict_for_api.call_count == 1
+
+    def test_organization_is_loaded_once(self, app, dataset):
+        ogdch_plugin_utils.invalidate_organization_cache()
+        with patch(
+            "ckan.plugins.toolkit.get_action", wraps=tk.get_action
+        ) as get_action:
+            result = self._ogdch_package_show(app, dataset["name"])
+
+        organization_show_calls = [
+            c for c in get_action.call_args_list if c.args == ("organization_show",)
+        ]
+        assert len(organization_show_calls) == 1
+        assert result["organization"]["name"] == "test-org"
+
+    def test_terms_of_use(self, app, dataset):
+        result = self._ogdch_package_show(app, dataset["name"])
+
+        assert result["terms_of_use"] == tk.get_action("ogdch_dataset_terms_of_use")(
+            get_context(), {"id": dataset["id"]}
+        )
+
+
+@pytest.mark.ckan_config(
+    "ckan.plugins",
+    "ogdch ogdch_pkg ogdch_group ogdch_org scheming_datasets fluent",
+)
+@pytest.mark.usefixtures("with_plugins", "clean_db", "clean_index")
+class TestOrganizationCache(object):
+    def setup_method(self):
+        ogdch_plugin_utils.invalidate_organization_cache()
+
+    def _show_organization_of_dataset(self, dataset):
+        pkg_dict = tk.get_action("package_show")({}, {"id": dataset["id"]})
+        return pkg_dict["organization"]
+
+    def test_organization_is_cached(self, dataset):
+        with patch(
+            "ckan.plugins.toolkit.get_action", wraps=tk.get_action
+        ) as get_action:
+            for _ in range(3):
+                self._show_organization_of_dataset(dataset)
+
+        organization_show_calls = [
+            c for c in get_action.call_args_list if c.args == ("organization_show",)
+        ]
+        assert len(organization_show_calls) == 1
+
+    def test_cache_is_invalidated_by_organization_changes(self, dataset):
+        self._show_organization_of_dataset(dataset)
+
+        tk.get_action("organization_patch")(
+            get_context(),
+            {
+                "id": dataset["owner_org"],
+                "title": {"de": "DE", "fr": "FR", "it": "IT", "en": "New EN"},
+            },
+        )
+
+        organization = self._show_organization_of_dataset(dataset)
+        assert organization["title"]["en"] == "New EN"
+
+    def test_cache_is_invalidated_by_dataset_changes(self, dataset):
+        assert self._show_organization_of_dataset(dataset)["package_count"] == 1
+
+        new_dataset_dict = copy(dataset_dict)
+        new_dataset_dict["name"] = "new-dataset"
+        new_dataset_dict["identifier"] = "new-dataset@test-org"
+        tk.get_action("package_create")(get_context(), new_dataset_dict)
+
+        assert self._show_organization_of_dataset(dataset)["package_count"] == 2
+
+    def test_organization_cached_before_commit_is_invalidated(self, dataset):
+        old_organization = self._show_organization_of_dataset(dataset)
+        invalidate_organization_cache = ogdch_plugin_utils.invalidate_organization_cache
+
+        def invalidate_and_show(org_id=None):
+            invalidate_organization_cache(org_id)
+            # As if another request had shown the dataset before the commit
+            ogdch_plugin_utils.get_organization_cache().set(
+                dataset["owner_org"], old_organization
+            )
+
+        with patch.object(
+            ogdch_plugin_utils,
+            "invalidate_organization_cache",
+            side_effect=invalidate_and_show,
+        ):
+            tk.get_action("organization_patch")(
+                get_context(),
+                {
+                    "id": dataset["owner_org"],
+                    "title": {"de": "DE", "fr": "FR", "it": "IT", "en": "New EN"},
+                },
+            )
+
+        organization = self._show_organization_of_dataset(dataset)
+        assert organization["title"]["en"] == "New EN"
+
+    def test_cache_is_invalidated_by_dataset_deletion(self, dataset):
+        organization = ogdch_plugin_utils.get_organization(dataset["owner_org"])
+        assert organization["package_count"] == 1
+
+        tk.get_action("package_delete")(get_context(), {"id": dataset["name"]})
+
+        organization = ogdch_plugin_utils.get_organization(dataset["owner_org"])
+        assert organization["package_count"] == 0
+
+    def test_cache_is_invalidated_for_previous_organization(self, dataset):
+        organization = ogdch_plugin_utils.get_organization(dataset["owner_org"])
+        assert organization["package_count"] == 1
+        other_org = tk.get_action("organization_create")(
+            get_context(),
+            {
+                "name": "other-org",
+                "title": {"de": "DE", "fr": "FR", "it": "IT", "en": "EN"},
+                "political_level": "confederation",
+            },
+        )
+
+        tk.get_action("package_patch")(
+            get_context(), {"id": dataset["id"], "owner_org": other_org["id"]}
+        )
+
+        organization = ogdch_plugin_utils.get_organization(dataset["owner_org"])
+        assert organization["package_count"] == 0
+
+    def test_private_datasets_are_not_counted(self, app, dataset, sysadmin_headers):
+        private_dataset_dict = copy(dataset_dict)
+        private_dataset_dict["name"] = "private-dataset"
+        private_dataset_dict["identifier"] = "private-dataset@test-org"
+        private_dataset_dict["private"] = True
+        tk.get_action("package_create")(get_context(), private_dataset_dict)
+
+        url = url_for("api.action", logic_function="package_show", ver=3)
+        result = app.get(
+            url, params={"id": "private-dataset"}, headers=sysadmin_headers
+        ).json["result"]
+
+        assert result["organization"]["package_count"] == 1
+        assert self._show_organization_of_dataset(dataset)["package_count"] == 1
+
+
+@pytest.mark.ckan_config(
+    "ckan.plugins",
+    "ogdch ogdch_pkg scheming_datasets fluent",
+)
+@pytest.mark.usefixtures("with_plugins", "clean_db", "clean_queues")
+class TestXmlImport(object):
+    def _copy_catalog(self, tmp_path):
+        path = tmp_path / "catalog.xml"
+        shutil.copy(os.path.join(__location__, "fixtures", "catalog.xml"), path)
+        return str(path)
+
+    def _write_catalog(self, tmp_path, datasets):
+        """Write a catalog with copies of the datasets of catalog.xml. For
+        every dataset, the index of the dataset in catalog.xml, the identifier
+        of the copy and a prefix for URIs of its distributions (or None) are
+        given.
+        """
+        with open(os.path.join(__location__, "fixtures", "catalog.xml")) as f:
+            text = f.read()
+        blocks = re.findall(r"<dcat:dataset>.*?</dcat:dataset>", text, flags=re.S)
+        identifiers = [
+            "346252@bundesamt-fur-statistik-bfs",
+            "346266@bundesamt-fur-statistik-bfs",
+        ]
+
+        new_blocks = []
+        for index, identifier, distribution_uri in datasets:
+            block = blocks[index].replace(identifiers[index], identifier)
+            if distribution_uri:
+                parts = block.split("<dcat:Distribution>")
+                block = parts[0] + "".join(
+                    f'<dcat:Distribution rdf:about="{distribution_uri}/{n}">{part}'
+                    for n, part in enumerate(parts[1:])
+                )
+            new_blocks.append(block)
+
+        start = text.index(blocks[0])
+        end = text.rindex(blocks[-1]) + len(blocks[-1])
+        path = tmp_path / f"catalog-{len(list(tmp_path.iterdir()))}.xml"
+        path.write_text(text[:start] + "\n".join(new_blocks) + text[end:])
+        return str(path)
+
+    def _search(self):
+        return tk.get_action("package_search")(
+            get_context(), {"q": "*:*", "include_private": True}
+        )["results"]
+
+    @pytest.mark.ckan_config("ckanext.switzerland.xml_import_workers", 2)
+    @pytest.mark.ckan_config("ckanext.switzerland.xml_import_chunk_size", 2)
+    def test_import_datasets_without_mocks(self, org, tmp_path):
+        path = self._write_catalog(
+            tmp_path, [(0, "existing@test-org", "https://example.org/existing")]
+        )
+        summary = ogdch_logic._import_xml_datasets(path, org["id"])
+        assert summary["created"] == 1
+        existing = tk.get_action("ogdch_dataset_by_identifier")(
+            get_context(), {"identifier": "existing@test-org", "include_private": True}
+        )
+        assert existing["private"]
+        tk.get_action("package_patch")(
+            get_context(), {"id": existing["id"], "private": False}
+        )
+
+        path = self._write_catalog(
+            tmp_path,
+            [
+                (1, "new@test-org", None),
+                (1, "new@test-org", None),
+                (0, "existing@test-org", "https://example.org/existing"),
+                (1, "invalid@other-org", None),
+            ],
+        )
+        summary = ogdch_logic._import_xml_datasets(path, org["id"])
+
+        assert summary["error"] is None
+        assert [result["status"] for result in summary["datasets"]] == [
+            "created",
+            "updated",
+            "updated",
+            "failed",
+        ]
+
+        updated = tk.get_action("package_show")(get_context(), {"id": existing["id"]})
+        assert updated["name"] == existing["name"]
+        assert not updated["private"]
+        assert sorted(r["id"] for r in updated["resources"]) == sorted(
+            r["id"] for r in existing["resources"]
+        )
+
+        results = self._search()
+        assert sorted(d["identifier"] for d in results) == [
+            "existing@test-org",
+            "new@test-org",
+        ]
+        new = [d for d in results if d["identifier"] == "new@test-org"][0]
+        assert new["private"]
+        assert summary["datasets"][0]["name"] == new["name"]
+
+    def test_import_datasets(self, org, tmp_path):
+        path = self._copy_catalog(tmp_path)
+
+        def create_or_update_dataset(dataset, existing_dataset):
+            if dataset["identifier"].startswith("346252"):
+                return {"status": "created", "name": "dataset-1", "message": ""}
+            return {"status": "failed", "name": "dataset-2", "message": ""}
+
+        with patch.object(
+            DatasetImporter,
+            "_create_or_update_dataset",
+            side_effect=create_or_update_dataset,
+        ) as mock_create_or_update:
+            summary = ogdch_logic._import_xml_datasets(path, org["id"])
+
+        datasets = [c.args[0] for c in mock_create_or_update.call_args_list]
+        assert sorted(d["identifier"] for d in datasets) == [
+            "346252@bundesamt-fur-statistik-bfs",
+            "346266@bundesamt-fur-statistik-bfs",
+        ]
+        assert all(d["owner_org"] == org["id"] for d in datasets)
+        assert summary["created"] == 1
+        assert summary["updated"] == 0
+        assert summary["failed"] == 1
+        assert summary["finished"]
+        assert summary["error"] is None
+        # The results are in the order of the file
+        assert [d["name"] for d in summary["datasets"]] == ["dataset-1", "dataset-2"]
+        assert not os.path.exists(path)
+
+    def test_datasets_of_rejected_batch_fail(self, org, tmp_path):
+        path = self._copy_catalog(tmp_path)
+        indexing_connection = MagicMock()
+        indexing_connection.flush.side_effect = pysolr.SolrError("Bad request")
+        indexing_connection.pending_ids.return_value = [
+            "346252@bundesamt-fur-statistik-bfs"
+        ]
+
+        def create_or_update_dataset(dataset, existing_id):
+            dataset["id"] = dataset["name"] = dataset["identifier"]
+            return {"status": "created", "name": dataset["name"], "message": ""}
+
+        importer = DatasetImporter(
+            org["id"], workers=1, indexing_connection=indexing_connection
+        )
+        with patch.object(
+            DatasetImporter,
+            "_create_or_update_dataset",
+            side_effect=create_or_update_dataset,
+        ):
+            results = list(importer.import_datasets(iter_datasets(path), chunk_size=2))
+
+        statuses = {result["name"]: result["status"] for result in results}
+        assert statuses == {
+            "346252@bundesamt-fur-statistik-bfs": "failed",
+            "346266@bundesamt-fur-statistik-bfs": "created",
+        }
+        indexing_connection.discard.assert_called_once()
+
+    def test_existing_datasets_are_found_without_search(self, dataset):
+        importer = DatasetImporter(dataset["owner_org"], workers=2)
+        tk.get_action("package_patch")(
+            get_context(), {"id": dataset["id"], "private": True}
+        )
+
+        with patch("ckan.lib.search.query.PackageSearchQuery.run") as search:
+            existing_ids = importer._get_existing_ids(
+                [dataset["identifier"], "unknown@test-org", None]
+            )
+
+        assert existing_ids == {dataset["identifier"]: dataset["id"]}
+        search.assert_not_called()
+
+    def test_repeated_identifiers_wait_for_first_dataset(self):
+        datasets = [
+            (0, {"identifier": "a@test-org"}),
+            (1, {"identifier": "b@test-org"}),
+            (2, {"identifier": "a@test-org"}),
+            (3, {}),
+            (4, {}),
+        ]
+
+        first, repeated = _split_repeated_identifiers(datasets)
+
+        assert [index for index, _ in first] == [0, 1, 3, 4]
+        assert [index for index, _ in repeated] == [2]
+
+    def test_import_invalid_file(self, org, tmp_path):
+        path = tmp_path / "catalog.xml"
+        path.write_text("<rdf:RDF>")
+
+        summary = ogdch_logic._import_xml_datasets(str(path), org["id"])
+
+        assert summary["finished"]
+        assert "Error parsing the RDF file" in summary["error"]
+        assert not path.exists()
+
+    def test_import_status(self, org, tmp_path):
+        job = jobs.enqueue(
+            ogdch_logic._import_xml_datasets,
+            kwargs={"file_path": self._copy_catalog(tmp_path), "org_id": org["id"]},
+            title="Import of datasets from catalog.xml",
+        )
+
+        status = tk.get_action("ogdch_xml_import_status")(get_context(), {"id": job.id})
+
+        assert status["id"] == job.id
+        assert status["organization"] == org["id"]
+        assert status["job_status"] == "queued"
+        assert status["created"] == 0
+        assert not status["finished"]
+
+    def test_import_status_of_other_job(self):
+        job = jobs.enqueue(jobs.test_job)
+
+        with pytest.raises(tk.ObjectNotFound):
+            tk.get_action("ogdch_xml_import_status")(get_context(), {"id": job.id})
+
+
+@pytest.mark.ckan_config(
+    "ckan.plugins",
+    "ogdch ogdch_pkg ogdch_group ogdch_org scheming_datasets fluent",
+)
+@pytest.mark.usefixtures("with_plugins", "clean_db", "clean_queues")
+class TestAddUsersToGroups(object):
+    def _members(self, group):
+        return sorted(
+            (user_id, capacity)
+            for user_id, _, capacity in tk.get_action("member_list")(
+                get_context(), {"id": group["id"], "object_type": "user"}
+            )
+        )
+
+    def _user_ids(self, users):
+        return sorted(
+            model.User.get(name).id for name in users if name.startswith("user")
+        )
+
+    def test_all_users_are_added_to_all_groups(self, users, groups):
+        result = tk.get_action("ogdch_add_users_to_groups")(get_context(), {})
+
+        assert result == "Added all non-admin users as members to all available groups."
+        for group in groups:
+            assert self._members(group) == [
+                (user_id, "member") for user_id in self._user_ids(users)
+            ]
+
+    def test_only_missing_memberships_are_added(self, users, groups):
+        assert ogdch_logic_helpers.add_users_to_groups() == 6
+        assert ogdch_logic_helpers.add_users_to_groups() == 0
+
+    def test_role_of_existing_members_is_kept(self, users, groups):
+        tk.get_action("group_member_create")(
+            get_context(), {"id": groups[0]["id"], "username": "user0", "role": "admin"}
+        )
+
+        ogdch_logic_helpers.add_users_to_groups()
+
+        assert (model.User.get("user0").id, "admin") in self._members(groups[0])
+
+    def test_removed_member_is_added_again(self, users, groups):
+        ogdch_logic_helpers.add_users_to_groups()
+        tk.get_action("group_member_delete")(
+            get_context(), {"id": groups[0]["id"], "username": "user0"}
+        )
+
+        assert ogdch_logic_helpers.add_users_to_groups() == 1
+        assert (model.User.get("user0").id, "member") in self._members(groups[0])
+
+    def test_sysadmins_are_not_added(self, users, groups):
+        sysadmin = factories.Sysadmin()
+
+        ogdch_logic_helpers.add_users_to_groups()
+
+        for group in groups:
+            assert sysadmin["id"] not in dict(self._members(group))
+
+    def test_one_user_and_one_group(self, users, groups):
+        user_id = model.User.get("user1").id
+        tk.get_action("ogdch_add_users_to_groups")(
+            get_context(), {"user_id": "user1", "group_id": groups[1]["name"]}
+        )
+
+        assert self._members(groups[0]) == []
+        assert self._members(groups[1]) == [(user_id, "member")]
+
+    def test_unknown_group(self, users):
+        with pytest.raises(tk.ObjectNotFound):
+            tk.get_action("ogdch_add_users_to_groups")(
+                get_context(), {"group_id": "unknown"}
+            )
+
+    def test_group_edit_enqueues_job(self, groups):
+        tk.get_action("group_patch")(
+            get_context(),
+            {
+                "id": groups[0]["id"],
+                "title": {"de": "DE", "fr": "FR", "it": "IT", "en": "New EN"},
+            },
+        )
+
+        assert [job.func for job in jobs.get_queue().jobs] == [
+            ogdch_logic_helpers.add_users_to_groups
+        ]
@@ -1,5 +1,9 @@
+from unittest import TestCase
+
 import pytest
 
+from ckanext.switzerland.middleware import CACHE_MAX_AGE_KEY, CacheControlMiddleware
+
 
 @pytest.mark.ckan_config(
     "ckan.plugins",
@@ -25,3 +29,53 @@ class TestMiddleware(object):
 
         assert response.status_code == 200
         assert response.headers.get("X-Robots-Tag"), "noindex == nofollow"
+
+    def test_perma_redirect_can_be_cached(self, app, dataset):
+        response = app.get("/perma/test@test-org", follow_redirects=False)
+
+        assert response.status_code == 302
+        assert response.headers.get("Cache-Control") == "public, max-age=60"
+
+    def test_other_pages_keep_ckan_cache_control(self, app, dataset):
+        response = app.get("/dataset/test-dataset")
+
+        assert "max-age=60" not in response.headers.get("Cache-Control", "")
+
+
+class TestCacheControlMiddleware(TestCase):
+    def _get_headers(self, environ, headers):
+        def app(environ, start_response):
+            start_response("302 FOUND", list(headers))
+            return [b""]
+
+        response_headers = []
+
+        def start_response(status, headers, exc_info=None):
+            response_headers.extend(headers)
+
+        CacheControlMiddleware(app)(environ, start_response)
+        return response_headers
+
+    def test_cache_control_is_replaced(self):
+        headers = self._get_headers(
+            {CACHE_MAX_AGE_KEY: 60},
+            [("Location", "/dataset/test"), ("Cache-Control", "private")],
+        )
+
+        assert headers == [
+            ("Location", "/dataset/test"),
+            ("Cache-Control", "public, max-age=60"),
+        ]
+
+    def test_cache_control_is_kept_without_max_age(self):
+        headers = self._get_headers({}, [("Cache-Control", "private")])
+
+        assert headers == [("Cache-Control", "private")]
+
+    def test_responses_with_cookies_are_not_shared(self):
+        headers = self._get_headers(
+            {CACHE_MAX_AGE_KEY: 60},
+            [("Set-Cookie", "ckan=1"), ("Cache-Control", "private")],
+        )
+
+        assert ("Cache-Control", "private") in headers
@@ -1,6 +1,10 @@
 # Tests for plugin_utils.py
+import json
 import logging
 import unittest
+from unittest.mock import patch
+
+import ckan.plugins.toolkit as tk
 
 import ckanext.switzerland.helpers.plugin_utils as ogdch_plugin_utils
 
@@ -104,3 +108,155 @@ class TestPluginUtils(unittest.TestCase):
                 "https://example.com/documentation-resource-2",
             ],
         )
+
+
+def _get_search_data(name="test-dataset", resources=None):
+    validated_dict = {
+        "name": name,
+        "type": "dataset",
+        "identifier": f"{name}@test-org",
+        "title": {"de": "Titel", "fr": "Titre", "it": "Titolo", "en": "Title"},
+        "description": {"de": "DE", "fr": "FR", "it": "IT", "en": ""},
+        "keywords": {"de": ["wald"], "fr": ["foret"], "it": [], "en": []},
+        "organization": {
+            "name": "test-org",
+            "title": {"de": "Org DE", "fr": "Org FR", "it": "Org IT", "en": ""},
+            "political_level": "confederation",
+        },
+        "groups": [],
+        "resources": resources or [],
+    }
+    return {
+        "name": name,
+        "type": "dataset",
+        "metadata_created": None,
+        "metadata_modified": None,
+        "validated_data_dict": json.dumps(validated_dict),
+    }
+
+
+def _get_resource(format, license, issued=None):
+    resource = {
+        "title": {"de": "Name", "fr": "Nom", "it": "Nome", "en": ""},
+        "description": {"de": "Text", "fr": "", "it": "", "en": ""},
+        "format": format,
+        "download_url": f"http://download.url/data.{format.lower()}",
+        "license": license,
+    }
+    if issued:
+        resource["issued"] = issued
+    return resource
+
+
+class TestPrepareSearchDataForIndex(unittest.TestCase):
+    def test_resource_fields(self):
+        search_data = _get_search_data(
+            resources=[
+                _get_resource(
+                    "CSV",
+                    "https://opendata.swiss/terms-of-use#terms_open",
+                    issued="2020-11-05T00:00:00",
+                ),
+                _get_resource("RDF Turtle", "unknown", issued="2022-10-11T15:30:04"),
+            ]
+        )
+
+        result = ogdch_plugin_utils.ogdch_prepare_search_data_for_index(search_data)
+
+        self.assertEqual(result["res_name"], ["Name - Nom - Nome - "] * 2)
+        self.assertEqual(result["res_name_en"], ["Name", "Name"])
+        self.assertEqual(result["res_description_fr"], ["Text", "Text"])
+        self.assertEqual(sorted(result["res_format"]), ["CSV", "RDF Turtle"])
+        self.assertEqual(result["linked_data"], ["RDF Turtle"])
+        self.assertEqual(
+            result["res_license"],
+            ["https://opendata.swiss/terms-of-use#terms_open", "ClosedData"],
+        )
+        self.assertEqual(result["res_latest_issued"], "2022-10-11T15:30:04Z")
+        self.assertIsNone(result["res_latest_modified"])
+
+    def test_dataset_without_resources(self):
+        result = ogdch_plugin_utils.ogdch_prepare_search_data_for_index(
+            _get_search_data()
+        )
+
+        self.assertEqual(result["res_name"], [])
+        self.assertEqual(result["res_format"], [])
+        self.assertEqual(result["linked_data"], [])
+        self.assertIsNone(result["res_latest_issued"])
+        self.assertEqual(result["title_en"], "Title")
+        self.assertEqual(result["description_en"], "DE")
+
+    def test_batch(self):
+        search_data_list = [
+            _get_search_data(name=f"dataset-{i}", resources=[_get_resource("CSV", "")])
+            for i in range(3)
+        ]
+        search_data_list.append({"name": "showcase", "type": "showcase"})
+
+        results = list(
+            ogdch_plugin_utils.ogdch_prepare_search_data_for_index_batch(
+                iter(search_data_list)
+            )
+        )
+
+        self.assertEqual(len(results), 4)
+        self.assertEqual(
+            [r["identifier"] for r in results[:3]],
+            ["dataset-0@test-org", "dataset-1@test-org", "dataset-2@test-org"],
+        )
+        self.assertEqual(results[3], {"name": "showcase", "type": "showcase"})
+
+
+class TestGetOrganization(unittest.TestCase):
+    def setUp(self):
+        self.config = patch.dict(
+            tk.config, {"ckanext.switzerland.organization_cache_ttl": 300}
+        )
+        self.config.start()
+        self.addCleanup(self.config.stop)
+        ogdch_plugin_utils.invalidate_organization_cache()
+
+        get_action = patch("ckan.plugins.toolkit.get_action")
+        self.organization_show = get_action.start().return_value
+        self.addCleanup(get_action.stop)
+        self.organization_show.side_effect = lambda context, data_dict: {
+            "id": data_dict["id"],
+            "groups": [],
+        }
+
+    def test_organization_is_cached(self):
+        for _ in range(3):
+            organization = ogdch_plugin_utils.get_organization("org-1")
+        ogdch_plugin_utils.get_organization("org-2")
+
+        self.assertEqual({"id": "org-1", "groups": []}, organization)
+        self.assertEqual(2, self.organization_show.call_count)
+
+    def test_organization_is_copied(self):
+        ogdch_plugin_utils.get_organization("org-1")["groups"].append("changed")
+
+        self.assertEqual([], ogdch_plugin_utils.get_organization("org-1")["groups"])
+
+    def test_invalidate_organization(self):
+        ogdch_plugin_utils.get_organization("org-1")
+        ogdch_plugin_utils.get_organization("org-2")
+        ogdch_plugin_utils.invalidate_organization_cache("org-1")
+        ogdch_plugin_utils.get_organization("org-1")
+        ogdch_plugin_utils.get_organization("org-2")
+
+        self.assertEqual(3, self.organization_show.call_count)
+
+    def test_invalidate_all_organizations(self):
+        ogdch_plugin_utils.get_organization("org-1")
+        ogdch_plugin_utils.invalidate_organization_cache()
+        ogdch_plugin_utils.get_organization("org-1")
+
+        self.assertEqual(2, self.organization_show.call_count)
+
+    def test_caching_can_be_disabled(self):
+        tk.config["ckanext.switzerland.organization_cache_ttl"] = 0
+        ogdch_plugin_utils.get_organization("org-1")
+        ogdch_plugin_utils.get_organization("org-1")
+
+        self.assertEqual(2, self.organization_show.call_count)